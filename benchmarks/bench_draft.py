@@ -0,0 +1,366 @@
+"""Benchmarks for the draft engine at scale.
+
+Generates synthetic accounts shaped like sample_accounts_3000.csv (plus a CXP
+Swat Tier column), then times each draft operation and records its peak
+memory. Results can be saved as baselines and later runs compared against
+them, so slowdowns in per-pick latency show up before a live draft does.
+Each operation's slowdown is taken relative to the run's median slowdown,
+so a slower or busier machine doesn't read as a regression.
+
+    python benchmarks/bench_draft.py                         # 3k, 30k and 300k accounts
+    python benchmarks/bench_draft.py --sizes 3000 1000000
+    python benchmarks/bench_draft.py --save-baseline         # record benchmarks/baselines.json
+    python benchmarks/bench_draft.py --check                 # exit 1 on a regression
+"""
+import argparse
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import draft_engine  # noqa: E402
+from draft_engine import (  # noqa: E402
+    ROOM_COMMISSIONER, TIER_1, AccountFamilies, AccountPool, DraftLog, DraftRooms, DraftState, SearchIndex,
+    assignments_frame, auto_complete, draft_account, draft_config, draft_history, get_current_ae, load_accounts,
+    parse_book_rules, picks_frame, set_queue, set_stage, start_draft, tier_counts, undo_last_pick
+)
+
+SAMPLE_CSV = ROOT / 'sample_accounts_3000.csv'
+BASELINES = Path(__file__).resolve().parent / 'baselines.json'
+
+# Default account counts, and the draft run at every size
+DEFAULT_SIZES = [3_000, 30_000, 300_000]
+NUM_AES = 20
+ACCOUNTS_PER_AE = 20
+
+# Picks (and undos) timed one by one for the per-pick latency percentiles
+TIMED_PICKS = 200
+
+# Autodraft queue length per AE in the queued auto-complete benchmark
+QUEUE_LENGTH = 2_000
+
+# Book rules applied to every AE in the rule-bound auto-complete benchmark
+BOOK_RULES = 'Industry <= 4\nBilling_State <= 3\nRevenue_Range in <$10M >= 2'
+
+# Seats following the draft room in the room pick benchmark
+ROOM_SEATS = 4
+
+# Timed samples per operation (the fastest counts); quick operations are repeated within a
+# sample until it covers MIN_SAMPLE_SECONDS, so timer resolution and jitter wash out
+REPEATS = 7
+MIN_SAMPLE_SECONDS = 0.05
+
+# Slower than baseline by this factor, relative to the median operation of the run, counts as a regression
+REGRESSION_FACTOR = 2.0
+
+# Rows the board renders per page (BOARD_PAGE_SIZE in the app)
+BOARD_PAGE_ROWS = 50
+
+SEARCH_QUERIES = ['tech', 'Quantum Systems', 'ACC0001', 'group - west', 'zz']
+
+COLUMNS = {'Account_Name': 'Account_Name', 'Account_ID': 'Account_ID', 'ICP_score': 'Account_Score', 'CXP_Swat_Tier': 'CXP Swat Tier'}
+EXTRA_COLUMNS = {col: col for col in ['Parent_Account_ID', 'Parent_Account_Name', 'Billing_State', 'Industry', 'Revenue_Range']}
+
+def generate_accounts(n, seed=0):
+    """n synthetic accounts with the sample CSV's columns and value mix, plus a CXP Swat Tier"""
+    rng = np.random.default_rng(seed)
+    sample = pd.read_csv(SAMPLE_CSV, dtype=str)
+
+    def draw(col):
+        values = sample[col].dropna().unique()
+        return values[rng.integers(0, len(values), n)]
+
+    ids = np.char.add('ACC', np.char.zfill(np.arange(1, n + 1).astype(str), 7))
+    base_names = sample.loc[sample['Parent_Account_ID'].isna(), 'Account_Name'].unique()
+    names = base_names[rng.integers(0, len(base_names), n)]
+
+    # About 30% are children of one of the first 10% of accounts, named after the parent
+    parent = np.where(rng.random(n) < 0.3, rng.integers(0, max(n // 10, 1), n), -1)
+    has_parent = parent >= 0
+    regions = np.array([' - North', ' - South', ' - East', ' - West', ' - Central'])
+    names = np.where(has_parent, np.char.add(names[np.maximum(parent, 0)].astype(str), regions[rng.integers(0, 5, n)]), names)
+
+    owners = sample[['Account_Owner_ID', 'Account_Owner_Name']].drop_duplicates().to_numpy()
+    owner = owners[rng.integers(0, len(owners), n)]
+    sdrs = sample[['SDR_Owner_ID', 'SDR_Owner_Name']].dropna().drop_duplicates().to_numpy()
+    sdr = sdrs[rng.integers(0, len(sdrs), n)]
+    no_sdr = rng.random(n) < 0.2
+
+    return pd.DataFrame({
+        'Account_ID': ids,
+        'Account_Name': names,
+        'Parent_Account_ID': np.where(has_parent, ids[np.maximum(parent, 0)], None),
+        'Parent_Account_Name': np.where(has_parent, names[np.maximum(parent, 0)], None),
+        'Account_Owner_ID': owner[:, 0],
+        'Account_Owner_Name': owner[:, 1],
+        'SDR_Owner_ID': np.where(no_sdr, None, sdr[:, 0]),
+        'SDR_Owner_Name': np.where(no_sdr, None, sdr[:, 1]),
+        'Billing_City': draw('Billing_City'),
+        'Billing_State': draw('Billing_State'),
+        'Industry': draw('Industry'),
+        'Sub_Industry': draw('Sub_Industry'),
+        'NAICS_Code': rng.integers(111110, 928121, n),
+        'Account_Score': np.round(np.clip(rng.gamma(3.2, 9.1, n), 0.5, 99.9), 2),
+        'Revenue_Range': draw('Revenue_Range'),
+        'Employee_Count': rng.integers(1, 20_000, n),
+        'CXP Swat Tier': rng.choice(['Tier 1', 'Tier 2', ''], n, p=[0.05, 0.15, 0.8]),
+    })
+
+def sample(run, setup=None):
+    """Seconds per run(setup()), repeating run (each time after a fresh, untimed setup()) for MIN_SAMPLE_SECONDS"""
+    elapsed, calls = 0.0, 0
+    while elapsed < MIN_SAMPLE_SECONDS:
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        run(arg)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    return elapsed / calls
+
+def measure(ops):
+    """{name: fastest of REPEATS samples' seconds and peak traced memory (MB)} for {name: (run, setup)}
+
+    Samples are taken round-robin, one per operation per pass, so a burst of
+    load on the machine spoils one sample of several operations rather than
+    every sample of one.
+    """
+    best = dict.fromkeys(ops, float('inf'))
+    for _ in range(REPEATS):
+        for name, (run, setup) in ops.items():
+            best[name] = min(best[name], sample(run, setup))
+
+    results = {}
+    for name, (run, setup) in ops.items():
+        arg = setup() if setup else None
+        tracemalloc.start()
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {'seconds': best[name], 'peak_mb': peak / 2**20}
+    return results
+
+def per_call(run, calls):
+    """p50/p95 seconds of run() over calls individually timed calls"""
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return np.percentile(times, [50, 95])
+
+def picks_and_undos(new_draft, pick, undo):
+    """(pick p50/p95, undo p50/p95): TIMED_PICKS picks then their undos, the best of REPEATS rounds
+
+    Each round runs on a fresh new_draft(), as per-call times also vary with
+    where one draft's arrays happen to sit in memory.
+    """
+    picks, undos = [], []
+    for _ in range(REPEATS):
+        state = new_draft()
+        picks.append(per_call(lambda: pick(state, state.account_pool.best()), TIMED_PICKS))
+        undos.append(per_call(lambda: undo(state), TIMED_PICKS))
+    return np.min(picks, axis=0), np.min(undos, axis=0)
+
+def bench_size(n, seed=0):
+    """Time every draft operation on n synthetic accounts; returns {operation: result}"""
+    csv = generate_accounts(n, seed).to_csv(index=False).encode()
+    accounts = load_accounts(io.BytesIO(csv), COLUMNS, EXTRA_COLUMNS)
+    ae_list = [f'AE {i + 1}' for i in range(NUM_AES)]
+    index = SearchIndex(accounts)
+
+    def fresh_draft(_=None):
+        state = DraftState(accounts, ae_list, ACCOUNTS_PER_AE, 'Snake')
+        start_draft(state, ae_list)
+        return state
+
+    tier_ranks = accounts['tier_rank'].to_numpy()
+
+    def board(state):
+        """The app's board_handles path: unsearched and searched, Tier 1 filter, tier counts and one page of rows"""
+        limits = state.book_limits
+        for query in ('', SEARCH_QUERIES[0]):
+            handles = state.account_pool.available_handles(index.search(query) if query else None)
+            if limits is not None:
+                handles = handles[limits.allowed_mask(handles, state.pick_schedule.ae_at(state.current_pick))]
+            ranks = tier_ranks[handles]
+            tier_counts(ranks)
+            accounts.take(handles[ranks == TIER_1][:BOARD_PAGE_ROWS])
+
+    def results(state):
+        picks = picks_frame(state)
+        assignments_frame(picks, state.ae_list).to_csv(index=False)
+        draft_history(picks).to_csv(index=False)
+
+    def queued_draft(_=None):
+        state = fresh_draft()
+        for i, ae in enumerate(ae_list):
+            set_queue(state, ae, np.random.default_rng(i).choice(n, min(QUEUE_LENGTH, n), replace=False))
+        return state
+
+    def ruled_draft(_=None):
+        state = DraftState(accounts, ae_list, ACCOUNTS_PER_AE, 'Snake')
+        state.book_rules = parse_book_rules(BOOK_RULES, ae_list, accounts.columns)[0]
+        start_draft(state, ae_list)
+        return state
+
+    def completed(balanced=False):
+        state = fresh_draft()
+        auto_complete(state, balanced)
+        return state
+
+    results_by_op = measure({
+        'load_csv': (lambda _: load_accounts(io.BytesIO(csv), COLUMNS, EXTRA_COLUMNS), None),
+        'build_pool': (lambda _: AccountPool(accounts), None),
+        'build_search_index': (lambda _: SearchIndex(accounts), None),
+        'search': (lambda _: [index.search(query) for query in SEARCH_QUERIES], None),
+        'board_filter': (board, fresh_draft),
+        'board_filter_rules': (board, ruled_draft),
+        'auto_complete': (auto_complete, fresh_draft),
+        'auto_complete_balanced': (lambda state: auto_complete(state, balanced=True), fresh_draft),
+        'auto_complete_queued': (auto_complete, queued_draft),
+        'auto_complete_rules': (auto_complete, ruled_draft),
+        'results_export': (results, completed),
+        'build_families': (lambda _: AccountFamilies(accounts), None),
+    })
+
+    # Per-pick latency over a live-draft-sized run of single picks, then the undos
+    def timed_draft(families=None):
+        state = DraftState(accounts, ae_list, max(ACCOUNTS_PER_AE, TIMED_PICKS // NUM_AES + 1), 'Snake')
+        if families is not None:
+            state.families = families
+            state.accounts_df = families.frame
+        start_draft(state, ae_list)
+        return state
+
+    (pick_p50, pick_p95), (undo_p50, undo_p95) = picks_and_undos(timed_draft, draft_account, undo_last_pick)
+    results_by_op['pick'] = {'seconds': pick_p50, 'p95_seconds': pick_p95}
+    results_by_op['undo'] = {'seconds': undo_p50, 'p95_seconds': undo_p95}
+    room_p50, room_p95 = room_pick_latency(accounts, ae_list)
+    results_by_op['room_pick'] = {'seconds': room_p50, 'p95_seconds': room_p95}
+
+    # The same, drafting whole parent/child families
+    families = AccountFamilies(accounts)
+    (pick_p50, pick_p95), (undo_p50, undo_p95) = picks_and_undos(
+        lambda: timed_draft(families), draft_account, undo_last_pick
+    )
+    results_by_op['family_pick'] = {'seconds': pick_p50, 'p95_seconds': pick_p95}
+    results_by_op['family_undo'] = {'seconds': undo_p50, 'p95_seconds': undo_p95}
+    return results_by_op
+
+def room_pick_latency(accounts, ae_list):
+    """p50/p95 seconds from a seat submitting a pick to every seat's copy showing it (log write included)"""
+    default_log_dir = draft_engine.DRAFT_LOG_DIR
+    with tempfile.TemporaryDirectory() as log_dir:
+        draft_engine.DRAFT_LOG_DIR = Path(log_dir)
+        rooms = DraftRooms()
+        room, seats = None, []
+
+        def new_room():
+            """A fresh draft room with ROOM_SEATS seats joined; returns the first seat's replica"""
+            nonlocal room, seats
+            if room is not None:
+                room.close()
+            state = DraftState(accounts, ae_list, max(ACCOUNTS_PER_AE, TIMED_PICKS // NUM_AES + 1), 'Snake')
+            start_draft(state, ae_list)
+            state.draft_log = DraftLog.create(accounts, draft_config(state, None))
+            set_stage(state, 'draft')
+            room = rooms.open(state.draft_log, accounts)
+            seats = [(seat, room.join(seat)) for seat in (DraftState() for _ in range(ROOM_SEATS))]
+            return seats[0][0]
+
+        def submit(seat, action, *args):
+            room.submit(room.tokens[seat], action, *args)
+            for seat_state, subscription in seats:
+                room.sync(seat_state, subscription)
+
+        latency = picks_and_undos(
+            new_room,
+            lambda state, handle: submit(get_current_ae(state), draft_account, handle),
+            lambda state: submit(ROOM_COMMISSIONER, undo_last_pick)
+        )[0]
+        room.close()
+    draft_engine.DRAFT_LOG_DIR = default_log_dir
+    return latency
+
+def machine_factor(ops, base_ops):
+    """The median of ops' times over their baselines: how much slower this run's machine is overall"""
+    ratios = [result['seconds'] / base_ops[op]['seconds'] for op, result in ops.items() if base_ops.get(op, {}).get('seconds')]
+    return float(np.median(ratios)) if ratios else 1.0
+
+def relative_slowdowns(ops, base_ops):
+    """{operation: time over its baseline, relative to machine_factor} for the operations with a baseline
+
+    Per-call latencies (pick, undo, ...) are microseconds and speed up or
+    slow down together from one process to the next, so they are taken
+    relative to each other, and whole operations relative to each other.
+    """
+    slowdowns = {}
+    for per_call_op in (False, True):
+        kind = {op: result for op, result in ops.items() if ('p95_seconds' in result) == per_call_op}
+        factor = machine_factor(kind, base_ops)
+        slowdowns.update((op, result['seconds'] / base_ops[op]['seconds'] / factor)
+                         for op, result in kind.items() if base_ops.get(op, {}).get('seconds'))
+    return {op: slowdowns[op] for op in ops if op in slowdowns}
+
+def compare(results, baselines):
+    """[(size, operation, baseline seconds, current seconds, relative slowdown)] for every regression"""
+    regressions = []
+    for size, ops in results.items():
+        base_ops = baselines.get(size, {})
+        for op, ratio in relative_slowdowns(ops, base_ops).items():
+            if ratio > REGRESSION_FACTOR:
+                regressions.append((size, op, base_ops[op]['seconds'], ops[op]['seconds'], ratio))
+    return regressions
+
+def print_results(results, baselines):
+    for size, ops in results.items():
+        base_ops = baselines.get(size, {})
+        slowdowns = relative_slowdowns(ops, base_ops)
+        machine = f" (machine {machine_factor(ops, base_ops):.2f}x vs base)" if slowdowns else ''
+        print(f"\n{int(size):,} accounts{machine}")
+        print(f"  {'operation':<24}{'seconds':>11}{'p95':>11}{'peak MB':>10}{'vs base':>9}")
+        for op, result in ops.items():
+            ratio = f"{slowdowns[op]:.2f}x" if op in slowdowns else ''
+            p95 = f"{result['p95_seconds']:.6f}" if 'p95_seconds' in result else ''
+            peak = f"{result['peak_mb']:.1f}" if 'peak_mb' in result else ''
+            print(f"  {op:<24}{result['seconds']:>11.6f}{p95:>11}{peak:>10}{ratio:>9}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time draft operations on synthetic accounts.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="account counts to benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', type=Path, default=BASELINES, help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="write these results into the baseline file")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 if anything regressed")
+    args = parser.parse_args(argv)
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = {}
+    for n in args.sizes:
+        print(f"benchmarking {n:,} accounts...", file=sys.stderr)
+        results[str(n)] = bench_size(n, args.seed)
+    print_results(results, baselines)
+
+    if args.save_baseline:
+        baselines.update(results)
+        args.baseline.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+        print(f"\nsaved baselines to {args.baseline}")
+
+    regressions = compare(results, baselines) if not args.save_baseline else []
+    for size, op, base, now, ratio in regressions:
+        print(f"REGRESSION {op} at {int(size):,} accounts: {base:.6f}s -> {now:.6f}s ({ratio:.2f}x relative to the run)",
+              file=sys.stderr)
+    if args.check and regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2149 @@
+"""Headless GTM Fantasy Draft engine.
+
+Everything a draft needs except the UI: loading accounts, the available pool,
+pick schedules, picks/undo/redo, auto-complete, results, exports and the
+event log. The Streamlit app (gtm_fantasy_draft.py) is a thin layer on top;
+batch runs use the engine directly or through the CLI:
+
+    python draft_engine.py accounts.csv --ae "Alexa Pass" --ae "Paul Kellum" --out assignments.csv
+"""
+import argparse
+import heapq
+import json
+import re
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import weakref
+import zipfile
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime
+from importlib.util import find_spec
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Draft types offered in setup (see PickSchedule)
+DRAFT_TYPES = ["Snake", "Linear", "Third-Round Reversal"]
+
+# Rows parsed per chunk when streaming an uploaded CSV
+CSV_CHUNK_ROWS = 50_000
+
+# Extra CSV columns kept by default when present (hierarchy, territory and segment data)
+DEFAULT_EXTRA_COLUMNS = ['Parent_Account_ID', 'Parent_Account_Name', 'Billing_State', 'Industry', 'Revenue_Range']
+
+# Keywords that identify each standard column in an uploaded header (all must appear)
+COLUMN_HINTS = {
+    'Account_Name': ('company', 'name'),
+    'Account_ID': ('salesforce', 'id'),
+    'ICP_score': ('icp', 'score'),
+    'CXP_Swat_Tier': ('cxp', 'tier'),
+    'ICP_Reasoning': ('reasoning',),
+}
+
+# Extra columns offered as exclusion rules in the blacklist stage
+EXCLUSION_COLUMNS = ['Industry', 'Billing_State', 'Revenue_Range']
+
+# Extra columns per-AE book rules (caps and quotas) can constrain; see BookLimits
+BOOK_RULE_COLUMNS = ['Billing_State', 'Industry', 'Revenue_Range']
+# One book rule per line: '[AE:] COLUMN [in V1, V2] <= N' caps, '... >= N' quotas
+BOOK_RULE_PATTERN = re.compile(r'(?:([^:]+):\s*)?(\w+)(?:\s+in\s+(.+?))?\s*(<=|>=)\s*(\d+)')
+
+# Export formats: name -> (file extension, MIME type, modules any one of which it needs)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv', ()),
+    'Salesforce CSV splits': ('zip', 'application/zip', ()),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet', ('pyarrow', 'fastparquet')),
+    'XLSX': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', ('openpyxl', 'xlsxwriter')),
+}
+
+# Rows per file of a split export (a Salesforce Bulk API batch holds at most 10,000 records),
+# and rows serialized at a time when streaming a CSV
+SALESFORCE_BULK_ROWS = 10_000
+EXPORT_CHUNK_ROWS = 50_000
+
+# The draft room seat that may run every action (AE seats may only make their own picks)
+ROOM_COMMISSIONER = 'Commissioner'
+
+# A draft room nobody has followed for this long is closed (its draft stays in its log)
+ROOM_IDLE_SECONDS = 10 * 60
+
+# Where draft event logs live, and how often (in events) a state snapshot is written
+DRAFT_LOG_DIR = Path('drafts')
+SNAPSHOT_EVERY = 200
+
+# AE SALESFORCE ID MAPPING
+AE_SFDC_IDS = {
+    'Alexa Pass': '005Vr00000QYPh1IAH',
+    'Lindsay Kelvie': '005Vr00000QYQWVIA5',
+    'Paul Kellum': '005Vr00000QYQWqIAP',
+    'Travis Pederson': '005Vr00000QYQXDIA5'
+}
+
+# =============================================================================
+# ACCOUNT DATA
+# =============================================================================
+
+# Tier ranks (higher = better), used as indexes into the lookups below
+TIER_UNRANKED, TIER_2, TIER_1 = 0, 1, 2
+TIER_NAMES = ['Unranked', 'Tier 2', 'Tier 1']
+TIER_BADGES = ['⚪', '🟢', '🟡']
+
+def read_csv_header(source):
+    """Map normalized column names (stripped, spaces → underscores) to the file's own names"""
+    source.seek(0)
+    raw_columns = pd.read_csv(source, nrows=0).columns
+    source.seek(0)
+    return dict(zip(raw_columns.str.strip().str.replace(' ', '_'), raw_columns))
+
+def guess_column(header, std_name):
+    """First header name containing every COLUMN_HINTS keyword for std_name, or ''"""
+    return next((c for c in header if all(word in c.lower() for word in COLUMN_HINTS[std_name])), '')
+
+def load_accounts(source, columns, extra_columns=(), on_progress=None):
+    """Stream an accounts CSV in chunks, keeping only the mapped columns.
+
+    columns maps standard names (Account_Name, Account_ID, ICP_score,
+    CXP_Swat_Tier and optionally ICP_Reasoning) to the file's column names;
+    extra_columns maps kept extra columns the same way. Unused columns are
+    never materialized, ICP_score is float32 and tiers are categorical, so
+    peak memory is about one chunk plus the compact result. on_progress is
+    called with the fraction of the file read after each chunk.
+    """
+    extra_columns = dict(extra_columns)
+    wanted = list(columns.values()) + list(extra_columns.values())
+    score_col = columns['ICP_score']
+    source.seek(0)
+    total_bytes = getattr(source, 'size', 0)
+    reader = pd.read_csv(
+        source,
+        usecols=lambda col: col in wanted,
+        dtype={col: str for col in wanted if col != score_col},
+        chunksize=CSV_CHUNK_ROWS
+    )
+
+    parts = []
+    for chunk in reader:
+        part = pd.DataFrame({name: chunk[col] for name, col in {**columns, **extra_columns}.items()})
+        part['ICP_score'] = pd.to_numeric(part['ICP_score'], errors='coerce').astype(np.float32)
+        part = part.dropna(subset=['ICP_score'])
+        part['CXP_Swat_Tier'] = part['CXP_Swat_Tier'].fillna('').astype('category')
+        parts.append(part)
+        if on_progress and total_bytes:
+            on_progress(min(source.tell() / total_bytes, 1.0))
+
+    # Chunks can see different tier labels; merge the categories instead of falling back to object
+    tiers = union_categoricals([part.pop('CXP_Swat_Tier') for part in parts])
+    # Row positions double as account handles everywhere downstream
+    accounts = pd.concat(parts, ignore_index=True)
+    accounts.insert(3, 'CXP_Swat_Tier', tiers)
+    if 'ICP_Reasoning' not in accounts.columns:
+        accounts['ICP_Reasoning'] = ''
+    for name in extra_columns:
+        # Low-cardinality text (states, industries, bands) is much smaller as a category
+        if accounts[name].nunique() <= len(accounts) // 2:
+            accounts[name] = accounts[name].astype('category')
+    accounts['tier_rank'] = classify_tiers(accounts['CXP_Swat_Tier'])
+    return accounts
+
+def get_tier_rank(tier_value):
+    """Return numeric rank for sorting (higher = better)"""
+    if pd.isna(tier_value) or tier_value == '' or tier_value == 'nan':
+        return TIER_UNRANKED
+    tier_str = str(tier_value).lower()
+    if 'tier 1' in tier_str:
+        return TIER_1
+    elif 'tier 2' in tier_str:
+        return TIER_2
+    return TIER_UNRANKED
+
+def classify_tiers(tier_series):
+    """Vectorized get_tier_rank: one pass over the distinct tier labels, int8 codes per row"""
+    codes, labels = pd.factorize(tier_series, use_na_sentinel=False)
+    label_ranks = np.array([get_tier_rank(label) for label in labels], dtype=np.int8)
+    return pd.Series(label_ranks[codes], index=tier_series.index, name='tier_rank')
+
+def tier_counts(tier_ranks):
+    """Return (Tier 1, Tier 2, Unranked) counts for a tier_rank column"""
+    counts = np.bincount(np.asarray(tier_ranks, dtype=np.int64), minlength=3)
+    return int(counts[TIER_1]), int(counts[TIER_2]), int(counts[TIER_UNRANKED])
+
+def tier_sort_order(accounts_df):
+    """Row positions sorted by Tier (1 > 2 > Unranked), then by ICP Score (descending)"""
+    tier_ranks = accounts_df['tier_rank'].to_numpy()
+    scores = pd.to_numeric(accounts_df['ICP_score'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    # lexsort is stable, so ties keep their upload order
+    return np.lexsort((-scores, -tier_ranks.astype(np.int64)))
+
+def tier_badge(tier_rank):
+    """Return visual badge for a tier rank"""
+    return TIER_BADGES[int(tier_rank)]
+
+def tier_name(tier_rank):
+    """Return tier name for a tier rank"""
+    return TIER_NAMES[int(tier_rank)]
+
+# AccountFamilies per accounts table, keyed by id(), shared while any draft uses them; see account_families
+_account_families = weakref.WeakValueDictionary()
+
+def parent_handles(accounts_df):
+    """Each account's parent handle (via Parent_Account_ID), or -1 for none, unknown or itself"""
+    num_rows = len(accounts_df)
+    parents = np.full(num_rows, -1, dtype=np.int64)
+    if 'Parent_Account_ID' in accounts_df.columns:
+        # One hash pass over IDs and parent IDs together; a code's first ID row is its handle
+        codes, uniques = pd.factorize(np.concatenate([
+            accounts_df['Account_ID'].to_numpy(dtype=object), accounts_df['Parent_Account_ID'].to_numpy(dtype=object)
+        ]))
+        handle_of_code = np.full(len(uniques) + 1, -1, dtype=np.int64)
+        handle_of_code[codes[num_rows - 1::-1]] = np.arange(num_rows - 1, -1, -1)
+        parents = handle_of_code[codes[num_rows:]]
+        parents[parents == np.arange(num_rows)] = -1
+    return parents
+
+def descendant_mask(parents, roots):
+    """Bool array: accounts in roots (a bool array) or anywhere below one of them
+
+    Each round also checks the ancestor twice as far up (pointer jumping),
+    so deep hierarchies take a logarithmic number of rounds, and parent
+    cycles stop once every ancestor has been checked.
+    """
+    matched = roots.copy()
+    ancestors = parents.copy()
+    for _ in range(max(len(parents), 1).bit_length() + 1):
+        linked = np.flatnonzero(ancestors >= 0)
+        if not len(linked):
+            break
+        matched[linked] |= matched[ancestors[linked]]
+        ancestors[linked] = ancestors[ancestors[linked]]
+    return matched
+
+def family_labels(parents):
+    """Union-find over parent links: each account's family label (the family's lowest handle).
+
+    parents holds each account's parent handle, or -1. Each round hooks the
+    root of every link's higher end under the lower root, then jumps
+    pointers until every account points straight at its root, all
+    vectorized. Merging roots (not just the linked accounts) lets whole
+    subtrees join at once, so a chain in any row order takes a logarithmic
+    number of rounds, and parent cycles in messy CRM data still terminate.
+    """
+    labels = np.arange(len(parents))
+    children = np.flatnonzero(parents >= 0)
+    links = parents[children]
+    while True:
+        child_roots, link_roots = labels[children], labels[links]
+        lowest = np.minimum(child_roots, link_roots)
+        merged = labels.copy()
+        np.minimum.at(merged, child_roots, lowest)
+        np.minimum.at(merged, link_roots, lowest)
+        while True:
+            jumped = merged[merged]
+            if np.array_equal(jumped, merged):
+                break
+            merged = jumped
+        if np.array_equal(merged, labels):
+            return labels
+        labels = merged
+
+class AccountFamilies:
+    """Parent/child account families (linked by Parent_Account_ID), drafted as single units.
+
+    frame has one row per family, indexed by family number: the head
+    account's name (with "(+N)" for its N other members), ID and extra
+    columns, ICP_score summed over the family and its best member tier. The
+    pool, board and every draft action run on that frame unchanged, so a
+    family is picked or undone in one step. Members are a group index
+    (handles grouped by family, plus each family's start), so expanding
+    families back to accounts costs only their size.
+    """
+
+    def __init__(self, accounts_df):
+        self.accounts = accounts_df
+        num_rows = len(accounts_df)
+        parents = parent_handles(accounts_df)
+        labels = family_labels(parents)
+        scores = accounts_df['ICP_score'].to_numpy(dtype=np.float64)
+        tier_ranks = accounts_df['tier_rank'].to_numpy()
+
+        # Family by family, head first: the top of the hierarchy (else the best account)
+        order = np.lexsort((-scores, parents >= 0, labels))
+        sorted_labels = labels[order]
+        starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+        self.sizes = np.diff(np.r_[starts, num_rows]).astype(np.int32)
+        self.family_of = np.empty(num_rows, dtype=np.int32)
+        self.family_of[order] = np.repeat(np.arange(len(starts), dtype=np.int32), self.sizes)
+        self._members = order.astype(np.int32)
+        self._starts = starts
+
+        frame = accounts_df.take(order[starts]).reset_index(drop=True)
+        grouped = np.flatnonzero(self.sizes > 1)
+        frame.loc[grouped, 'Account_Name'] = [
+            f"{name} (+{others})" for name, others in zip(frame['Account_Name'].to_numpy()[grouped], self.sizes[grouped] - 1)
+        ]
+        frame['ICP_score'] = np.add.reduceat(scores[order], starts).astype(np.float32)
+        # Family numbers follow the labels, so grouping by family again keeps the same starts
+        best = np.lexsort((-tier_ranks, self.family_of))[starts]
+        frame['CXP_Swat_Tier'] = accounts_df['CXP_Swat_Tier'].take(best).to_numpy()
+        frame['tier_rank'] = tier_ranks[best]
+        frame['Family_Size'] = self.sizes
+        self.frame = frame
+
+    def members(self, families):
+        """(account handles of families, family by family, each family's size)"""
+        families = np.asarray(families, dtype=np.int64)
+        sizes = self.sizes[families]
+        ends = np.cumsum(sizes)
+        offsets = np.repeat(self._starts[families] - ends + sizes, sizes) + np.arange(ends[-1] if len(ends) else 0)
+        return self._members[offsets], sizes
+
+    def families_for_ids(self, ids):
+        """Families with a member among these Account_IDs, in the order given"""
+        return pd.unique(self.family_of[handles_for_ids(self.accounts, ids)])
+
+def account_families(accounts_df):
+    """The AccountFamilies of an accounts table, built once and shared by every draft using it"""
+    key = id(accounts_df)
+    families = _account_families.get(key)
+    if families is None:
+        families = _account_families[key] = AccountFamilies(accounts_df)
+    return families
+
+# =============================================================================
+# POOL, SEARCH, BOOKS AND SCHEDULE
+# =============================================================================
+
+# (handles in draft order, rank of each handle) per accounts table, keyed by id(); see draft_ranking
+_draft_rankings = {}
+
+def draft_ranking(accounts_df):
+    """Read-only (handles in draft order, rank of each handle) for an accounts table.
+
+    Computed once per table object and shared by every pool built on it, so
+    sessions drafting the same cached upload share one copy.
+    """
+    key = id(accounts_df)
+    if key not in _draft_rankings:
+        order = tier_sort_order(accounts_df).astype(np.int32)
+        rank_of_handle = np.empty_like(order)
+        rank_of_handle[order] = np.arange(len(order), dtype=np.int32)
+        order.flags.writeable = rank_of_handle.flags.writeable = False
+        _draft_rankings[key] = (order, rank_of_handle)
+        weakref.finalize(accounts_df, _draft_rankings.pop, key, None)
+    return _draft_rankings[key]
+
+class BitSet:
+    """Set of integers in range(size) (account handles or pool ranks), one bit each.
+
+    Bits live in a bytearray for fast single-bit tests; _view is a numpy view
+    of the same bytes for the batch operations.
+    """
+
+    def __init__(self, size, full=False):
+        self.size = size
+        self._bits = bytearray(b'\xff' if full else b'\x00') * ((size + 7) // 8)
+        if full and size % 8:
+            self._bits[-1] = (1 << (size % 8)) - 1
+        self._view = np.frombuffer(self._bits, dtype=np.uint8)
+        self._count = size if full else 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, i):
+        i = int(i)
+        return bool(self._bits[i >> 3] >> (i & 7) & 1)
+
+    def __getstate__(self):
+        return {'size': self.size, 'bits': bytes(self._bits), 'count': self._count}
+
+    def __setstate__(self, state):
+        self.size, self._count = state['size'], state['count']
+        self._bits = bytearray(state['bits'])
+        self._view = np.frombuffer(self._bits, dtype=np.uint8)
+
+    def __iter__(self):
+        return iter(np.flatnonzero(self.mask()).tolist())
+
+    def mask(self, start=0, stop=None):
+        """Membership of every integer in range(start, stop) (default: all) as a bool array; start must be a multiple of 8"""
+        stop = self.size if stop is None else min(stop, self.size)
+        return np.unpackbits(self._view[start >> 3:(stop + 7) >> 3], count=stop - start, bitorder='little').view(bool)
+
+    def contains_many(self, items):
+        items = np.asarray(items, dtype=np.int64)
+        return (self._view[items >> 3] >> (items & 7) & 1).astype(bool)
+
+    def add(self, i):
+        """Add i; False if it was already present"""
+        if i in self:
+            return False
+        self._bits[i >> 3] |= 1 << (i & 7)
+        self._count += 1
+        return True
+
+    def discard(self, i):
+        """Remove i; False if it was not present"""
+        if i not in self:
+            return False
+        self._bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+        self._count -= 1
+        return True
+
+    def update(self, items):
+        """Add many at once; returns the ones that were not already present"""
+        items = np.unique(np.asarray(items, dtype=np.int64))
+        items = items[~self.contains_many(items)]
+        np.bitwise_or.at(self._view, items >> 3, np.left_shift(1, items & 7).astype(np.uint8))
+        self._count += len(items)
+        return items
+
+    def difference_update(self, items):
+        """Remove many at once; returns the ones that were present"""
+        items = np.unique(np.asarray(items, dtype=np.int64))
+        items = items[self.contains_many(items)]
+        np.bitwise_and.at(self._view, items >> 3, ~np.left_shift(1, items & 7).astype(np.uint8))
+        self._count -= len(items)
+        return items
+
+class AccountPool:
+    """Available accounts in draft order, keyed by account handle.
+
+    A handle is an account's row position in accounts_df. The draft order
+    comes from draft_ranking (shared between pools on the same table); per
+    pool there is only an availability bitset over the sorted positions and a
+    Fenwick tree of counts, so remove, restore and best-available are
+    O(log N). version changes with every removal or restore, so views of
+    the pool can be memoized on it.
+    """
+
+    def __init__(self, accounts_df):
+        self.accounts_df = accounts_df
+        self._handles, self._rank_of_handle = draft_ranking(accounts_df)
+        self._available = BitSet(len(accounts_df), full=True)
+        self.version = 0
+        self._rebuild_tree()
+
+    def __len__(self):
+        return len(self._available)
+
+    def __contains__(self, handle):
+        return self._rank_of_handle[handle] in self._available
+
+    def _rebuild_tree(self):
+        """Rebuild the Fenwick tree of availability counts (1-based) from the bitset"""
+        prefix = np.concatenate(([0], np.cumsum(self._available.mask(), dtype=np.int32)))
+        i = np.arange(1, self._available.size + 1)
+        self._tree = array('i', np.concatenate(([0], prefix[i] - prefix[i - (i & -i)])).astype(np.int32).tobytes())
+
+    def _update(self, rank, delta):
+        i = rank + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _find(self, k):
+        """Return the sorted position of the k-th available account (1-based k)"""
+        pos = 0
+        size = len(self._tree)
+        step = 1 << (size - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < size and self._tree[nxt] < k:
+                pos = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return pos
+
+    def best(self):
+        """Return the handle of the best available account, or None if the pool is empty"""
+        if len(self._available) == 0:
+            return None
+        return int(self._handles[self._find(1)])
+
+    def available_mask(self):
+        """Availability of every handle as a bool array"""
+        return self._available.mask()[self._rank_of_handle]
+
+    def contains_many(self, handles):
+        """Availability of each of handles as a bool array"""
+        return self._available.contains_many(self._rank_of_handle[handles])
+
+    def remove(self, handle):
+        """Take an account out of the pool; False if it was not available"""
+        rank = int(self._rank_of_handle[handle])
+        if not self._available.discard(rank):
+            return False
+        self._update(rank, -1)
+        self.version += 1
+        return True
+
+    def remove_many(self, handles):
+        """Take a batch of accounts out of the pool in one vectorized step"""
+        self._available.difference_update(self._rank_of_handle[np.asarray(handles, dtype=np.int64)])
+        self._rebuild_tree()
+        self.version += 1
+
+    def take_best(self, k):
+        """Remove the k best available accounts in one step; return their handles in draft order"""
+        ranks = np.flatnonzero(self._available.mask())[:k]
+        self._available.difference_update(ranks)
+        self._rebuild_tree()
+        self.version += 1
+        return self._handles[ranks]
+
+    def restore(self, handle):
+        """Put a previously removed account back in its original position"""
+        rank = int(self._rank_of_handle[handle])
+        if self._available.add(rank):
+            self._update(rank, 1)
+            self.version += 1
+
+    def head(self, n):
+        """The n best available accounts as a DataFrame (indexed by handle)"""
+        return self.accounts_df.take(self._handles[np.flatnonzero(self._available.mask())[:n]])
+
+    def available_handles(self, handles=None):
+        """Handles of the available accounts, in draft order
+
+        handles optionally restricts the result, e.g. to the hits from
+        SearchIndex.search.
+        """
+        if handles is None:
+            ranks = np.flatnonzero(self._available.mask())
+        else:
+            ranks = np.sort(self._rank_of_handle[handles])
+            ranks = ranks[self._available.contains_many(ranks)]
+        return self._handles[ranks]
+
+    def iter_available(self, block=1024):
+        """Handles of the available accounts in draft order, a block of ranks at a time, starting at the best.
+
+        For walks that usually stop near the top (e.g. the best account an AE
+        may still take), so only the blocks actually reached are unpacked.
+        """
+        if len(self._available) == 0:
+            return
+        for start in range(self._find(1) & ~7, self._available.size, block):
+            ranks = np.flatnonzero(self._available.mask(start, start + block))
+            if len(ranks):
+                yield self._handles[ranks + start]
+
+    def to_frame(self, handles=None):
+        """Available accounts as a DataFrame (indexed by handle), in draft order (see available_handles)"""
+        return self.accounts_df.take(self.available_handles(handles))
+
+class SearchIndex:
+    """Lowercased name/ID n-gram index for the draft board search box.
+
+    Built once per upload. Every 1-, 2- and 3-byte gram maps to the sorted
+    handles of the accounts containing it (int32 arrays, about 300 bytes per
+    account), so a substring query intersects a few posting lists instead of
+    scanning the table: about 0.5-2 ms at 50k accounts and 10 ms at 300k for
+    common words, which match the most accounts. Each row is indexed
+    as NUL + name + NUL + ID: no gram spans two fields, and grams that start
+    on a NUL mark the start of a name or ID, which answers prefix queries.
+    Availability is left to AccountPool.available_handles, which keeps the
+    hits still in the pool. unit_of, if given, maps each row to the handle it
+    is drafted as (its family, see AccountFamilies), and searches return
+    those handles.
+    """
+
+    def __init__(self, accounts_df, unit_of=None):
+        self._unit_of = unit_of
+        names = accounts_df['Account_Name'].fillna('').astype(str).str.lower().tolist()
+        ids = accounts_df['Account_ID'].fillna('').astype(str).str.lower().tolist()
+        self._num_rows = len(names)
+
+        encoded = [b'\x00' + name.encode('utf-8') + b'\x00' + id_.encode('utf-8') for name, id_ in zip(names, ids)]
+        del names, ids
+        self._row_starts = np.zeros(self._num_rows + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=self._num_rows), out=self._row_starts[1:])
+        # One bytes object holds every row, for verifying candidates without a Python string per account
+        self._text = b''.join(encoded)
+        del encoded
+        buf = np.frombuffer(self._text, dtype=np.uint8)
+        row_of_byte = np.repeat(np.arange(self._num_rows, dtype=np.int32), np.diff(self._row_starts))
+        self._postings = {n: self._build_postings(buf, row_of_byte, n) for n in (1, 2, 3)}
+
+    @staticmethod
+    def _build_postings(buf, row_of_byte, n):
+        """Return (gram codes, slice starts, row positions) for all n-byte grams"""
+        count = len(buf) - n + 1
+        if count <= 0:
+            return np.empty(0, dtype=np.int32), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32)
+        codes = np.zeros(count, dtype=np.int32)
+        valid = np.ones(count, dtype=bool)
+        for k in range(n):
+            window = buf[k:k + count]
+            codes = (codes << 8) | window
+            if k or n == 1:
+                # Only a gram's first byte may be a NUL (the start of a name or ID)
+                valid &= window != 0
+        # One (gram, row) key per byte, sorted in place, then one entry per distinct key
+        keys = codes[valid].astype(np.int64) << 32
+        del codes
+        keys |= row_of_byte[:count][valid]
+        keys.sort()
+        keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+        codes = (keys >> 32).astype(np.int32)
+        rows = keys.astype(np.int32)  # the low 32 bits
+        del keys
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        return codes[starts], np.append(starts, len(rows)), rows
+
+    def _posting(self, gram):
+        gram_codes, starts, rows = self._postings[len(gram)]
+        code = int.from_bytes(gram, 'big')
+        i = np.searchsorted(gram_codes, code)
+        if i == len(gram_codes) or gram_codes[i] != code:
+            return rows[:0]
+        return rows[starts[i]:starts[i + 1]]
+
+    def search(self, query, prefix=False):
+        """Return sorted handles of accounts whose name or ID contains query
+
+        With prefix=True, only names or IDs that start with query match.
+        """
+        encoded = query.lower().encode('utf-8')
+        if not encoded:
+            return self._units(np.arange(self._num_rows))
+        if prefix:
+            encoded = b'\x00' + encoded
+        n = min(3, len(encoded))
+        grams = {encoded[i:i + n] for i in range(len(encoded) - n + 1)}
+        postings = sorted((self._posting(gram) for gram in grams), key=len)
+        hits = postings[0]
+        for other in postings[1:]:
+            # Once the candidates are few, verifying them beats intersecting a long list
+            if len(hits) * 16 < len(other):
+                break
+            hits = np.intersect1d(hits, other, assume_unique=True)
+        if len(encoded) > n:
+            # Grams can match out of order; confirm the survivors
+            hits = hits[self._contains(hits, encoded)]
+        return self._units(hits)
+
+    def _contains(self, rows, encoded):
+        """Bool array: whether each row's indexed bytes contain encoded
+
+        Compares the query against every window of the rows' bytes laid end
+        to end. Only a query's first byte may be a NUL, so no match can run
+        into the next row, whose bytes start with one.
+        """
+        starts = self._row_starts[rows]
+        lengths = (self._row_starts[rows + 1] - starts).astype(np.int32)
+        total = int(lengths.sum())
+        width = total - len(encoded) + 1
+        if width <= 0:
+            return np.zeros(len(rows), dtype=bool)
+        ends = np.cumsum(lengths, dtype=np.int64)
+        segment = np.frombuffer(self._text, dtype=np.uint8)[np.arange(total) + np.repeat(starts - ends + lengths, lengths)]
+        found = segment[:width] == encoded[0]
+        for k in range(1, len(encoded)):
+            found &= segment[k:k + width] == encoded[k]
+        matched = np.zeros(len(rows), dtype=bool)
+        matched[np.searchsorted(ends, np.flatnonzero(found), side='right')] = True
+        return matched
+
+    def _units(self, rows):
+        if self._unit_of is None:
+            return rows
+        return np.unique(self._unit_of[rows])
+
+class BookStats:
+    """Running totals for one AE's book, updated on every pick and undo.
+
+    Entries are kept sorted by ICP score so top() never rescans the book;
+    add and remove are a bisect plus a short list shift.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.score_sum = 0.0
+        self.tier_counts = [0, 0, 0]
+        self._by_score = []  # (-score, handle, name, tier_rank)
+        self._entries = {}
+
+    @property
+    def avg(self):
+        return self.score_sum / self.count if self.count else 0
+
+    def add(self, handle, name, score, tier_rank):
+        entry = (-float(score), handle, name, int(tier_rank))
+        self._entries[handle] = entry
+        insort(self._by_score, entry)
+        self.count += 1
+        self.score_sum += float(score)
+        self.tier_counts[int(tier_rank)] += 1
+
+    def add_many(self, handles, names, scores, tier_ranks):
+        """Bulk add (auto-complete): one sort instead of an insort per account"""
+        entries = [(-float(score), handle, name, int(rank))
+                   for handle, name, score, rank in zip(handles, names, scores, tier_ranks)]
+        self._entries.update((entry[1], entry) for entry in entries)
+        self._by_score = sorted(self._by_score + entries)
+        self.count += len(entries)
+        self.score_sum += sum(-entry[0] for entry in entries)
+        for rank, n in enumerate(np.bincount(np.asarray(tier_ranks, dtype=np.int64), minlength=3)):
+            self.tier_counts[rank] += int(n)
+
+    def remove(self, handle):
+        entry = self._entries.pop(handle, None)
+        if entry is None:
+            return
+        del self._by_score[bisect_left(self._by_score, entry)]
+        self.count -= 1
+        self.score_sum += entry[0]
+        self.tier_counts[entry[3]] -= 1
+
+    def handles(self):
+        """Handles of the book's accounts (or families, when drafting by family), in no particular order"""
+        return np.fromiter(self._entries, dtype=np.int64, count=len(self._entries))
+
+    def top(self, n=5):
+        """Highest-scoring (name, score, tier_rank) tuples"""
+        return [(name, -neg_score, rank) for neg_score, _, name, rank in self._by_score[:n]]
+
+def category_codes(column):
+    """(int code per row, -1 where missing; the distinct values as strings)
+
+    Categorical columns hand back their own codes, so this is free for
+    load_accounts tables.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories.astype(str)
+    codes, uniques = pd.factorize(column)
+    return codes, pd.Index(uniques).astype(str)
+
+def parse_book_rules(text, ae_list, columns):
+    """Parse '[AE:] COLUMN [in V1, V2] <= N' (cap) or '... >= N' (quota) lines into BookLimits rules, plus any errors"""
+    rules, errors = [], []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = BOOK_RULE_PATTERN.fullmatch(line)
+        if not match:
+            errors.append(f"'{line}' (expected e.g. 'Industry <= 3' or 'Paul Kellum: Billing_State in NY, NJ >= 5')")
+            continue
+        ae, column, values, op, limit = match.groups()
+        values = [value.strip() for value in (values or '').split(',') if value.strip()]
+        if ae and ae.strip() not in ae_list:
+            errors.append(f"'{line}' ({ae.strip()} is not drafting)")
+        elif column not in columns:
+            errors.append(f"'{line}' ({column} is not loaded)")
+        elif op == '>=' and not values:
+            errors.append(f"'{line}' (a quota needs values: '{column} in A, B >= {limit}')")
+        else:
+            rules.append({'column': column, 'kind': 'max' if op == '<=' else 'min', 'limit': int(limit),
+                          'values': values, 'ae': ae.strip() if ae else None})
+    return rules, errors
+
+def book_rule_label(rule):
+    """Short description of a book rule, e.g. 'Industry ≤ 3 each' or 'Billing_State in NY, NJ ≥ 5 (Paul Kellum)'"""
+    column, values, limit = rule['column'], rule.get('values') or [], rule['limit']
+    if rule['kind'] == 'max':
+        label = f"{column} ≤ {limit} each" + (f" of {', '.join(values)}" if values else '')
+    else:
+        label = f"{column} in {', '.join(values)} ≥ {limit}"
+    return label + (f" ({rule['ae']})" if rule.get('ae') else '')
+
+# (group of each handle, group codes, handles by group in draft order, group bounds) per accounts
+# table and rule columns, keyed by (id(), columns); see rule_groups
+_rule_groups = {}
+
+def rule_groups(accounts_df, columns):
+    """Read-only grouping of an accounts table by its combination of values in columns.
+
+    Returns (group of each handle, each group's category code per column
+    (-1: missing), handles sorted by group and then draft order, each
+    group's start in that array plus a final end). Built once per table and
+    column list, so every session with the same rule columns shares it.
+    """
+    key = (id(accounts_df), tuple(columns))
+    if key not in _rule_groups:
+        codes = np.stack([category_codes(accounts_df[column])[0] for column in columns], axis=1)
+        # Fold in one column at a time, refactorizing so the combined key stays below rows x categories
+        group_of = np.zeros(len(accounts_df), dtype=np.int64)
+        for column_codes in codes.T:
+            group_of = pd.factorize(group_of * (int(column_codes.max(initial=-1)) + 2) + column_codes + 1)[0]
+        group_of = group_of.astype(np.int32)
+        _, rank_of_handle = draft_ranking(accounts_df)
+        handles = np.lexsort((rank_of_handle, group_of)).astype(np.int32)
+        bounds = np.searchsorted(group_of[handles], np.arange(group_of.max(initial=-1) + 2))
+        group_codes = codes[handles[bounds[:-1]]]
+        group_of.flags.writeable = group_codes.flags.writeable = handles.flags.writeable = bounds.flags.writeable = False
+        _rule_groups[key] = (group_of, group_codes, handles, bounds)
+        weakref.finalize(accounts_df, _rule_groups.pop, key, None)
+    return _rule_groups[key]
+
+class BookLimits:
+    """Per-AE caps and quotas on account attributes (state, industry, revenue band).
+
+    rules are dicts with column, kind, limit and optionally values and ae. A
+    'max' rule lets an AE hold at most limit accounts per value of column
+    (every value, or just the listed ones). A 'min' rule makes an AE end up
+    with at least limit accounts whose column is one of values: once the
+    AE's remaining picks only just cover the shortfall, only those accounts
+    are allowed. ae restricts a rule to one AE (default: every AE).
+
+    Rules that can no longer all be met give way one at a time instead of
+    leaving the AE nothing: caps and then quotas are applied in the order
+    given, each only if some account in the pool still satisfies it along
+    with the rules already applied. An unmeetable rule is relaxed on its
+    own and the others still hold.
+
+    The pool's accounts are grouped by their values in the rule columns
+    (see rule_groups), and each rule keeps an AE x slot counter matrix
+    (slots: the counted values). Which groups an AE may take is then one
+    mask over the groups, so checks and board filters are a single gather.
+    Each group also keeps a cursor at its best available account, moved
+    lazily past taken accounts as DraftQueue does, so the best account an
+    AE may take is the best allowed group's cursor: no pick scans the pool.
+    """
+
+    def __init__(self, pool, draft_order, schedule, rules):
+        num_aes = len(draft_order)
+        self.pool = pool
+        self.rules = list(rules)
+        columns = list(dict.fromkeys(rule['column'] for rule in self.rules))
+        self._group_of, group_codes, self._handles, bounds = rule_groups(pool.accounts_df, columns)
+        self._starts, self._ends = bounds[:-1], bounds[1:]
+        self._heads = self._starts.copy()  # position in _handles of each group's best available account
+        self._heads_version = None
+        self._picks = schedule.picks_per_ae()
+        self._held = np.zeros(num_aes, dtype=np.int32)
+        self._changes = 0
+        self._memo_key = self._memo = None
+        self._rules = []
+        for rule in self.rules:
+            categories = category_codes(pool.accounts_df[rule['column']])[1]
+            counted = categories.isin([str(value) for value in rule.get('values') or []])
+            if rule['kind'] == 'max' and not rule.get('values'):
+                slots = np.arange(len(categories))
+            elif rule['kind'] == 'max':
+                slots = np.where(counted, np.cumsum(counted) - 1, -1)
+            else:
+                slots = np.where(counted, 0, -1)
+            # One extra slot entry so missing values (code -1) are never counted
+            slots = np.append(slots, -1).astype(np.int32)
+            counts = np.zeros((num_aes, max(int(slots.max()) + 1, 1)), dtype=np.int32)
+            applies = np.ones(num_aes, dtype=bool)
+            if rule.get('ae'):
+                applies[:] = False
+                applies[draft_order.index(rule['ae'])] = True
+            group_slots = slots[group_codes[:, columns.index(rule['column'])]]
+            self._rules.append((rule['kind'] == 'max', group_slots, counts, int(rule['limit']), applies))
+        # Caps are applied before quotas, so a clash relaxes the quota
+        self._order = sorted(range(len(self.rules)), key=lambda i: not self._rules[i][0])
+
+    def count(self, handle, ae_idx, delta=1):
+        """Add (or with delta=-1, take back) one of ae_idx's picks"""
+        self._held[ae_idx] += delta
+        self._changes += 1
+        group = self._group_of[handle]
+        for _, group_slots, counts, _, _ in self._rules:
+            slot = group_slots[group]
+            if slot >= 0:
+                counts[ae_idx, slot] += delta
+
+    def count_many(self, handles, ae_idx):
+        """count() for a batch of picks (handles and their draft_order indexes)"""
+        np.add.at(self._held, ae_idx, 1)
+        self._changes += 1
+        groups = self._group_of[handles]
+        for _, group_slots, counts, _, _ in self._rules:
+            slot = group_slots[groups]
+            hit = slot >= 0
+            np.add.at(counts, (ae_idx[hit], slot[hit]), 1)
+
+    def rewind(self, handle):
+        """Move handle's group cursor back to it if the cursor already passed it (handle is back in the pool)"""
+        group = self._group_of[handle]
+        begin, head = self._starts[group], self._heads[group]
+        _, rank_of_handle = draft_ranking(self.pool.accounts_df)
+        passed = rank_of_handle[self._handles[begin:head]]
+        self._heads[group] = begin + np.searchsorted(passed, rank_of_handle[handle])
+
+    def _advance_heads(self):
+        """Move each group's cursor past the accounts taken since the last call; each account is passed once"""
+        if self._heads_version == self.pool.version:
+            return
+        live = np.flatnonzero(self._heads < self._ends)
+        for group in live[~self.pool.contains_many(self._handles[self._heads[live]])]:
+            head, end = self._heads[group] + 1, self._ends[group]
+            while head < end and self._handles[head] not in self.pool:
+                head += 1
+            self._heads[group] = head
+        self._heads_version = self.pool.version
+
+    def _allowed_groups(self, ae_idx):
+        """(bool per group: ae_idx may take its accounts now, indexes of the rules relaxed), memoized until a pick"""
+        key = (ae_idx, self.pool.version, self._changes)
+        if self._memo_key == key:
+            return self._memo
+        self._advance_heads()
+        allowed = self._heads < self._ends  # groups with an account left in the pool
+        relaxed = []
+        picks_left = self._picks[ae_idx] - self._held[ae_idx]
+        for i in self._order if allowed.any() else ():
+            is_cap, group_slots, counts, limit, applies = self._rules[i]
+            if not applies[ae_idx]:
+                continue
+            if is_cap:
+                rule_ok = (group_slots < 0) | (counts[ae_idx][np.maximum(group_slots, 0)] < limit)
+            elif limit - counts[ae_idx, 0] >= picks_left:
+                rule_ok = group_slots >= 0
+            else:
+                continue
+            kept = allowed & rule_ok
+            if kept.any():
+                allowed = kept
+            else:
+                relaxed.append(i)
+        self._memo_key, self._memo = key, (allowed, relaxed)
+        return self._memo
+
+    def allows(self, handle, ae_idx):
+        """Whether ae_idx may take handle (an available account) under the rules still enforced"""
+        return bool(self._allowed_groups(ae_idx)[0][self._group_of[handle]])
+
+    def allowed_mask(self, handles, ae_idx):
+        """allows() for many available handles at once, as one gather"""
+        return self._allowed_groups(ae_idx)[0][self._group_of[handles]]
+
+    def best(self, ae_idx):
+        """The best available account ae_idx may take, or None once the pool is empty"""
+        groups = np.flatnonzero(self._allowed_groups(ae_idx)[0])
+        if not len(groups):
+            return None
+        _, rank_of_handle = draft_ranking(self.pool.accounts_df)
+        heads = self._handles[self._heads[groups]]
+        return int(heads[np.argmin(rank_of_handle[heads])])
+
+    def status(self, ae_idx):
+        """ae_idx's binding rules, one line each: caps some value has reached, unmet quotas and relaxed rules"""
+        relaxed = self._allowed_groups(ae_idx)[1]
+        lines = []
+        for i, (rule, (is_cap, _, counts, limit, applies)) in enumerate(zip(self.rules, self._rules)):
+            if not applies[ae_idx]:
+                continue
+            if i in relaxed:
+                lines.append(f"{book_rule_label(rule)}: can't be met, relaxed")
+            elif is_cap and (counts[ae_idx] >= limit).any():
+                lines.append(f"{book_rule_label(rule)}: {int((counts[ae_idx] >= limit).sum())} full")
+            elif not is_cap and counts[ae_idx, 0] < limit:
+                lines.append(f"{book_rule_label(rule)}: {counts[ae_idx, 0]} so far")
+        return lines
+
+def round_reversals(draft_type, rounds):
+    """Boolean mask of rounds (0-based) that pick in reverse draft order"""
+    if draft_type == 'Snake':
+        return rounds % 2 == 1
+    if draft_type == 'Third-Round Reversal':
+        # 1→N, N→1, N→1, then alternate again from round 4
+        return (rounds == 1) | ((rounds >= 2) & (rounds % 2 == 0))
+    return np.zeros(len(rounds), dtype=bool)
+
+class PickSchedule:
+    """Which AE makes every pick of the draft, computed once.
+
+    ae_index[pick] is the draft_order index of the AE making that (0-based)
+    pick. custom_slots maps pick indexes to draft_order indexes for keeper or
+    traded slots that override the normal order.
+    """
+
+    def __init__(self, num_aes, num_rounds, draft_type='Snake', custom_slots=None):
+        self.num_aes = num_aes
+        picks = np.arange(num_aes * num_rounds)
+        pick_in_round = picks % num_aes
+        reverse = round_reversals(draft_type, picks // num_aes)
+        self.ae_index = np.where(reverse, num_aes - 1 - pick_in_round, pick_in_round).astype(np.int32)
+        for pick, ae_idx in (custom_slots or {}).items():
+            self.ae_index[pick] = ae_idx
+        # Picks grouped by AE: _ae_picks[_ae_bounds[i]:_ae_bounds[i + 1]] are AE i's picks
+        self._ae_picks = np.argsort(self.ae_index, kind='stable')
+        self._ae_bounds = np.searchsorted(self.ae_index[self._ae_picks], np.arange(num_aes + 1))
+
+    def __len__(self):
+        return len(self.ae_index)
+
+    def ae_at(self, pick):
+        """draft_order index of the AE making this pick, or None once the draft is over"""
+        if pick >= len(self.ae_index):
+            return None
+        return int(self.ae_index[pick])
+
+    def next_picks(self, start, k):
+        """Return (pick indexes, draft_order indexes) for the next k picks from start"""
+        stop = min(start + k, len(self.ae_index))
+        return np.arange(start, stop), self.ae_index[start:stop]
+
+    def picks_per_ae(self):
+        """Number of picks each AE makes in the whole draft, by draft_order index"""
+        return np.diff(self._ae_bounds).astype(np.int32)
+
+    def picks_for(self, ae_idx):
+        """All pick indexes belonging to one AE, in draft order"""
+        return self._ae_picks[self._ae_bounds[ae_idx]:self._ae_bounds[ae_idx + 1]]
+
+def parse_custom_slots(text, draft_order, total_picks):
+    """Parse 'pick#: AE name' lines into {pick index: draft_order index}, plus any errors"""
+    slots, errors = {}, []
+    for line in text.split('\n'):
+        if not line.strip():
+            continue
+        pick_text, _, ae = line.partition(':')
+        ae = ae.strip()
+        if not pick_text.strip().isdigit() or not 1 <= int(pick_text) <= total_picks:
+            errors.append(f"'{line.strip()}': pick must be a number from 1 to {total_picks}")
+        elif ae not in draft_order:
+            errors.append(f"'{line.strip()}': unknown AE '{ae}'")
+        else:
+            slots[int(pick_text) - 1] = draft_order.index(ae)
+    return slots, errors
+
+class DraftQueue:
+    """An AE's pre-ranked autodraft wishlist (handles, most wanted first).
+
+    Accounts taken by anyone stay in the queue and are skipped lazily:
+    resolve moves a cursor past unavailable entries, checking each against
+    the pool's availability bitset, and never revisits them. Every entry is
+    passed at most once, so resolution is amortized O(1). An undo that
+    returns a queued account to the pool rewinds the cursor to it.
+    """
+
+    def __init__(self, handles):
+        self.handles = np.asarray(handles, dtype=np.int32)
+        self._cursor = 0
+
+    def __len__(self):
+        return len(self.handles)
+
+    def resolve(self, pool, allows=None):
+        """The first queued account still in pool, or None once the queue is used up
+
+        allows, if given, is a predicate on handles (e.g. the AE's book
+        rules); available entries it rejects are skipped but stay queued, as
+        an undo can make them allowed again.
+        """
+        while self._cursor < len(self.handles):
+            handle = int(self.handles[self._cursor])
+            if handle in pool:
+                break
+            self._cursor += 1
+        else:
+            return None
+        if allows is None or allows(handle):
+            return handle
+        return next((int(h) for h in self.handles[self._cursor + 1:] if h in pool and allows(h)), None)
+
+    def rewind(self, handle):
+        """Make handle (back in the pool) reachable again if the cursor already passed it"""
+        passed = np.flatnonzero(self.handles[:self._cursor] == handle)
+        if len(passed):
+            self._cursor = int(passed[0])
+
+# =============================================================================
+# DRAFT STATE AND ACTIONS
+# =============================================================================
+
+class DraftState:
+    """Everything one draft needs, as plain attributes.
+
+    Engine functions take any object with these attributes: the Streamlit app
+    passes st.session_state, headless callers pass a DraftState.
+    """
+
+    def __init__(self, accounts_df=None, ae_list=(), accounts_per_ae=20, draft_type='Snake'):
+        self.stage = 'setup'
+        self.accounts_df = accounts_df
+        self.ae_list = list(ae_list)
+        self.accounts_per_ae = accounts_per_ae
+        self.draft_type = draft_type
+        self.draft_order = []
+        self.pick_schedule = None
+        self.account_pool = None
+        self.draft_picks = array('i')  # account handles, in pick order
+        self.pick_owners = array('B')  # draft_order index of the AE for each pick
+        self.redo_stack = []  # undone handles, most recent last
+        self.blacklisted_accounts = BitSet(0)
+        self.ae_queues = {}  # AE -> DraftQueue
+        self.book_rules = []  # per-AE caps and quotas (see BookLimits)
+        self.book_limits = None
+        self.ae_books = {}
+        self.ae_stats = {}
+        self.current_pick = 0
+        self.families = None  # AccountFamilies when whole families are drafted (accounts_df is then their frame)
+        self.draft_log = None
+
+def start_draft(state, draft_order, custom_slots=None):
+    """Set the pick schedule for draft_order and start from an empty board"""
+    state.draft_order = list(draft_order)
+    state.pick_schedule = PickSchedule(len(state.draft_order), state.accounts_per_ae, state.draft_type, custom_slots)
+    reset_draft(state)
+
+def reset_draft(state):
+    """Fresh pool, picks, books and stats for the configured draft.
+
+    Picks and books are int32 handle arrays, owners uint8 draft_order indexes
+    (uint16 past 256 AEs) and the blacklist a bitset, so a session's draft
+    state stays small next to the shared accounts table.
+    """
+    state.account_pool = AccountPool(state.accounts_df)
+    state.draft_picks = array('i')
+    state.pick_owners = array('B' if len(state.draft_order) <= 256 else 'H')
+    state.redo_stack = []
+    state.blacklisted_accounts = BitSet(len(state.accounts_df))
+    state.ae_queues = {}
+    state.ae_books = {ae: array('i') for ae in state.ae_list}
+    state.ae_stats = {ae: BookStats() for ae in state.ae_list}
+    state.book_limits = BookLimits(state.account_pool, state.draft_order, state.pick_schedule, state.book_rules) if state.book_rules else None
+    state.current_pick = 0
+
+def source_accounts(state):
+    """The uploaded accounts behind the draft (accounts_df holds families when drafting by family)"""
+    return state.accounts_df if state.families is None else state.families.accounts
+
+def get_current_ae(state):
+    """Determine which AE is picking now"""
+    if state.pick_schedule is None:
+        return None
+    ae_index = state.pick_schedule.ae_at(state.current_pick)
+    if ae_index is None:
+        return None
+    return state.draft_order[ae_index]
+
+def draft_account(state, handle, clear_redo=True):
+    """Assign an account to the AE on the clock and take it out of the pool"""
+    handle = int(handle)
+    ae_idx = state.pick_schedule.ae_at(state.current_pick)
+    ae = state.draft_order[ae_idx]
+    accounts = state.accounts_df
+    state.draft_picks.append(handle)
+    state.pick_owners.append(ae_idx)
+    state.ae_books[ae].append(handle)
+    state.ae_stats[ae].add(
+        handle, accounts['Account_Name'].iat[handle], accounts['ICP_score'].iat[handle], accounts['tier_rank'].iat[handle]
+    )
+    state.account_pool.remove(handle)
+    if state.book_limits is not None:
+        state.book_limits.count(handle, ae_idx)
+    state.current_pick += 1
+    if clear_redo:
+        # A fresh pick invalidates anything that was undone
+        state.redo_stack = []
+        log_event(state, 'pick', h=handle)
+
+def undo_last_pick(state):
+    """Take back the most recent pick and return its account to the pool"""
+    handle = state.draft_picks.pop()
+    ae_idx = state.pick_owners.pop()
+    ae = state.draft_order[ae_idx]
+    state.ae_books[ae].remove(handle)
+    state.ae_stats[ae].remove(handle)
+    state.account_pool.restore(handle)
+    if state.book_limits is not None:
+        state.book_limits.count(handle, ae_idx, -1)
+        state.book_limits.rewind(handle)
+    for queue in state.ae_queues.values():
+        queue.rewind(handle)
+    state.current_pick -= 1
+    state.redo_stack.append(handle)
+    log_event(state, 'undo')
+
+def redo_pick(state):
+    """Re-make the most recently undone pick"""
+    draft_account(state, state.redo_stack.pop(), clear_redo=False)
+    log_event(state, 'redo')
+
+def blacklist_accounts(state, handles):
+    """Exclude accounts from the draft"""
+    handles = state.blacklisted_accounts.update(handles)
+    if len(handles):
+        state.account_pool.remove_many(handles)
+        log_event(state, 'blacklist', h=handles.tolist())
+
+def column_matches(column, values):
+    """Bool array: rows of column whose value is one of values
+
+    Categorical columns are matched on their categories and broadcast through
+    the codes, so the cost is per distinct value rather than per row.
+    """
+    values = [str(value) for value in values]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        hits = np.append(column.cat.categories.astype(str).isin(values), False)
+        return hits[column.cat.codes.to_numpy()]
+    return column.isin(values).to_numpy()
+
+def rule_matches(accounts_df, column, values):
+    """Bool array: rows of accounts_df matched by one exclusion rule"""
+    matched = column_matches(accounts_df[column], values)
+    if column == 'Parent_Account_ID':
+        matched |= column_matches(accounts_df['Account_ID'], values)
+        matched = descendant_mask(parent_handles(accounts_df), matched)
+    return matched
+
+def exclusion_mask(accounts_df, rules, families=None):
+    """Rows matched by each exclusion rule, and by any of them.
+
+    rules is a list of (column, values) pairs; a row matches when its column
+    is one of values. A Parent_Account_ID rule also matches the parent
+    accounts themselves and every account below them at any depth, so it
+    excludes whole subtrees, and an Account_ID rule is an uploaded
+    exclusion list. When drafting by family, accounts_df is families.frame:
+    ID rules are matched on the member accounts and a family matches when
+    any of its members does, while other columns are the head account's.
+    Returns (bool array over all rows, [bool array per rule]).
+    """
+    per_rule = []
+    for column, values in rules:
+        if families is not None and column in ('Account_ID', 'Parent_Account_ID'):
+            matched = np.zeros(len(accounts_df), dtype=bool)
+            matched[families.family_of[rule_matches(families.accounts, column, values)]] = True
+        else:
+            matched = rule_matches(accounts_df, column, values)
+        per_rule.append(matched)
+    combined = np.logical_or.reduce(per_rule) if per_rule else np.zeros(len(accounts_df), dtype=bool)
+    return combined, per_rule
+
+def exclusion_rule_label(column, values):
+    shown = ', '.join(map(str, values[:3]))
+    return f"{column}: {shown}" + (f" (+{len(values) - 3} more)" if len(values) > 3 else '')
+
+def exclusion_impact(state, rules):
+    """(handles the rules would newly exclude, impact table) for the blacklist preview
+
+    The table has a row per rule plus the deduplicated total, counting only
+    accounts still in the pool, split by tier.
+    """
+    combined, per_rule = exclusion_mask(state.accounts_df, rules, state.families)
+    available = state.account_pool.available_mask()
+    tier_ranks = state.accounts_df['tier_rank'].to_numpy()
+    labels = [exclusion_rule_label(column, list(values)) for column, values in rules] + ['All rules']
+    rows = []
+    for label, matched in zip(labels, per_rule + [combined]):
+        hit = matched & available
+        tier1, tier2, _ = tier_counts(tier_ranks[hit])
+        rows.append({'Rule': label, 'Accounts': int(hit.sum()), 'Tier 1': tier1, 'Tier 2': tier2})
+    return np.flatnonzero(combined & available), pd.DataFrame(rows)
+
+def read_id_list(source):
+    """Account IDs from an exclusion list: the first column of a CSV, or one ID per line"""
+    try:
+        ids = pd.read_csv(source, header=None, usecols=[0], dtype=str).iloc[:, 0]
+    except pd.errors.EmptyDataError:
+        return []
+    return ids.dropna().str.strip().unique().tolist()
+
+def handles_for_ids(accounts_df, ids):
+    """Handles of the accounts with these Account_IDs, in the order given (unknown IDs dropped)
+
+    An ID shared by several rows (duplicates in the CRM export) matches all
+    of them, in file order.
+    """
+    handles = pd.Index(accounts_df['Account_ID']).get_indexer_for(pd.Index(ids).unique())
+    return handles[handles >= 0]
+
+def draft_handles_for_ids(state, ids):
+    """handles_for_ids for the draft's units: when drafting by family, any member's ID stands for its family"""
+    if state.families is None:
+        return handles_for_ids(state.accounts_df, ids)
+    return state.families.families_for_ids(ids)
+
+def set_queue(state, ae, handles):
+    """Replace ae's autodraft queue with handles (most wanted first); an empty queue clears it"""
+    handles = pd.unique(np.asarray(handles, dtype=np.int64))
+    if len(handles):
+        state.ae_queues[ae] = DraftQueue(handles)
+    else:
+        state.ae_queues.pop(ae, None)
+    log_event(state, 'queue', ae=ae, h=handles.tolist())
+
+def pick_allowed(state, handle, ae=None):
+    """Whether ae (default: the AE on the clock) may take handle under the draft's book rules"""
+    if state.book_limits is None:
+        return True
+    ae_idx = state.pick_schedule.ae_at(state.current_pick) if ae is None else state.draft_order.index(ae)
+    return state.book_limits.allows(int(handle), ae_idx)
+
+def autodraft_pick(state, ae=None):
+    """What ae (default: the AE on the clock) autodrafts: their first available queued account, else the best available.
+
+    Under book rules both are limited to accounts the AE may take (rules
+    that can no longer be met are relaxed one at a time; see BookLimits).
+    """
+    ae = ae or get_current_ae(state)
+    queue = state.ae_queues.get(ae)
+    limits = state.book_limits
+    if limits is None:
+        handle = queue.resolve(state.account_pool) if queue else None
+    else:
+        ae_idx = state.draft_order.index(ae)
+        handle = queue.resolve(state.account_pool, lambda h: limits.allows(h, ae_idx)) if queue else None
+        if handle is None:
+            handle = limits.best(ae_idx)
+    return state.account_pool.best() if handle is None else handle
+
+def set_stage(state, stage):
+    """Move to another stage, recording it so a resumed draft reopens there"""
+    state.stage = stage
+    log_event(state, 'stage', stage=stage)
+
+def assign_picks(state, handles, ae_idx):
+    """Bulk-append picks (handles and their draft_order indexes) to picks, books and stats"""
+    accounts = state.accounts_df
+    names = accounts['Account_Name'].to_numpy()[handles]
+    scores = accounts['ICP_score'].to_numpy()[handles]
+    tier_ranks = accounts['tier_rank'].to_numpy()[handles]
+
+    state.draft_picks.extend(handles.tolist())
+    state.pick_owners.extend(ae_idx.tolist())
+    if state.book_limits is not None:
+        state.book_limits.count_many(handles, ae_idx)
+    for i in np.unique(ae_idx):
+        ae = state.draft_order[i]
+        mine = ae_idx == i
+        state.ae_books[ae].extend(handles[mine].tolist())
+        state.ae_stats[ae].add_many(handles[mine].tolist(), names[mine].tolist(), scores[mine].tolist(), tier_ranks[mine])
+    state.current_pick += len(handles)
+
+def auto_complete(state, balanced=False):
+    """Draft every remaining pick at once, as clicking Auto-Best until the draft ends would.
+
+    While any AE's autodraft queue can still supply an account, or for the
+    whole draft under book rules, picks are resolved one by one in schedule
+    order (see autodraft_pick). Once every queue is used up, the rest are
+    the top of the pool, taken in one step. With balanced=True those
+    remaining accounts are spread across AEs by balance_books instead (book
+    rules take precedence, so balancing has nothing left to spread under
+    them). Returns the number of picks made.
+    """
+    total_picks = len(state.pick_schedule)
+    start = state.current_pick
+    pool = state.account_pool
+    queued = []
+    live = {ae for ae, queue in state.ae_queues.items() if queue.resolve(pool) is not None}
+    pick = start
+    while live and state.book_limits is None and pick < total_picks and len(pool):
+        ae = state.draft_order[state.pick_schedule.ae_at(pick)]
+        handle = state.ae_queues[ae].resolve(pool) if ae in live else None
+        if handle is None:
+            live.discard(ae)
+            handle = pool.best()
+        pool.remove(handle)
+        queued.append(handle)
+        pick += 1
+    if queued:
+        _, ae_idx = state.pick_schedule.next_picks(start, len(queued))
+        assign_picks(state, np.asarray(queued, dtype=np.int64), ae_idx)
+    # Under book rules every pick depends on the AE's book so far, so each is made in turn
+    while state.book_limits is not None and state.current_pick < total_picks and len(pool):
+        handle = autodraft_pick(state)
+        draft_account(state, handle, clear_redo=False)
+        queued.append(handle)
+
+    handles = pool.take_best(max(total_picks - state.current_pick, 0))
+    if len(handles):
+        _, ae_idx = state.pick_schedule.next_picks(state.current_pick, len(handles))
+        if balanced:
+            handles = balanced_pick_order(state, handles, ae_idx)
+        assign_picks(state, handles, ae_idx)
+    count = len(queued) + len(handles)
+    if count == 0:
+        return 0
+    state.redo_stack = []
+    log_event(state, 'auto_complete', h=queued + handles.tolist())
+    return count
+
+def balanced_pick_order(state, handles, ae_idx):
+    """Reorder handles (best first) across the picks ae_idx so every AE's book evens out"""
+    books = [state.ae_stats[ae] for ae in state.draft_order]
+    accounts = state.accounts_df
+    owner = balance_books(
+        accounts['ICP_score'].to_numpy(dtype=np.float64)[handles],
+        accounts['tier_rank'].to_numpy()[handles],
+        np.bincount(ae_idx, minlength=len(books)),
+        [book.score_sum for book in books],
+        [book.tier_counts for book in books]
+    )
+    # Each AE's accounts fill its own picks best-first (both stable sorts keep draft order)
+    ordered = np.empty_like(handles)
+    ordered[np.argsort(ae_idx, kind='stable')] = handles[np.argsort(owner, kind='stable')]
+    return ordered
+
+def balance_books(scores, tier_ranks, capacity, base_totals, base_tiers, max_swaps=None):
+    """Split accounts across AEs so per-AE score totals end up as even as possible.
+
+    scores and tier_ranks describe the accounts to hand out; capacity[i] is
+    how many AE i takes (the capacities sum to the number of accounts) and
+    base_totals[i] / base_tiers[i] what its book already holds. Each tier is
+    first split into per-AE quotas that even out tier counts. Within a tier,
+    accounts go highest score first to the AE with the lowest total; then
+    same-tier swaps between the highest book and a lower one narrow the
+    spread. Returns the AE index for every account.
+    """
+    num_aes = len(capacity)
+    capacity = np.array(capacity, dtype=np.int64)
+    totals = np.array(base_totals, dtype=np.float64)
+    owner = np.empty(len(scores), dtype=np.int64)
+
+    for rank in (TIER_1, TIER_2, TIER_UNRANKED):
+        members = np.flatnonzero(tier_ranks == rank)
+        members = members[np.argsort(-scores[members], kind='stable')]
+
+        # Quota: each account of this tier goes to the open AE holding the fewest of it
+        quota = np.zeros(num_aes, dtype=np.int64)
+        heap = [(int(base_tiers[i][rank]), i) for i in range(num_aes) if capacity[i] > 0]
+        heapq.heapify(heap)
+        for _ in range(len(members)):
+            held, i = heapq.heappop(heap)
+            quota[i] += 1
+            if quota[i] < capacity[i]:
+                heapq.heappush(heap, (held + 1, i))
+        capacity -= quota
+
+        # Largest score first to the lowest total with quota left
+        heap = [(totals[i], i) for i in np.flatnonzero(quota)]
+        heapq.heapify(heap)
+        for k in members:
+            total, i = heapq.heappop(heap)
+            owner[k] = i
+            totals[i] = total + scores[k]
+            quota[i] -= 1
+            if quota[i]:
+                heapq.heappush(heap, (totals[i], i))
+
+    # groups[i][rank]: AE i's accounts of that tier, sorted by score
+    groups = [[None] * 3 for _ in range(num_aes)]
+    order = np.lexsort((scores, tier_ranks, owner))
+    bounds = np.searchsorted(owner[order] * 3 + tier_ranks[order], np.arange(num_aes * 3 + 1))
+    for i in range(num_aes):
+        for rank in range(3):
+            groups[i][rank] = order[bounds[i * 3 + rank]:bounds[i * 3 + rank + 1]]
+
+    for _ in range(10 * num_aes if max_swaps is None else max_swaps):
+        by_total = np.argsort(totals)
+        high = by_total[-1]
+        for low in by_total[:-1]:
+            swap = best_swap(scores, groups[high], groups[low], totals[high] - totals[low])
+            if swap is not None:
+                break
+        else:
+            break
+        rank, give, take = swap
+        owner[give], owner[take] = low, high
+        totals[high] += scores[take] - scores[give]
+        totals[low] += scores[give] - scores[take]
+        for i, gone, added in ((high, give, take), (low, take, give)):
+            group = groups[i][rank]
+            group = np.append(group[group != gone], added)
+            groups[i][rank] = group[np.argsort(scores[group], kind='stable')]
+    return owner
+
+def best_swap(scores, high_groups, low_groups, gap):
+    """(tier rank, account from high, account from low) whose swap best halves gap, or None"""
+    best, best_left = None, gap * (1 - 1e-9)
+    for rank in range(3):
+        give, take = high_groups[rank], low_groups[rank]
+        if len(give) == 0 or len(take) == 0:
+            continue
+        take_scores = scores[take]
+        # The ideal partner for each account scores gap / 2 less; check both neighbours
+        pos = np.searchsorted(take_scores, scores[give] - gap / 2)
+        for cand in (np.clip(pos - 1, 0, len(take) - 1), np.clip(pos, 0, len(take) - 1)):
+            left = np.abs(gap - 2 * (scores[give] - take_scores[cand]))
+            j = int(np.argmin(left))
+            if left[j] < best_left:
+                best, best_left = (rank, give[j], take[cand[j]]), left[j]
+    return best
+
+# =============================================================================
+# RESULTS
+# =============================================================================
+
+def picks_frame(state, start=0, stop=None):
+    """Picks start..stop (default: every pick) joined to their account rows in one take, indexed by handle"""
+    handles = np.asarray(state.draft_picks[start:stop], dtype=np.int64)
+    owners = np.asarray(state.pick_owners[start:stop], dtype=np.int64)
+    positions = np.arange(start, start + len(handles))
+    picks = state.accounts_df.take(handles)
+    picks.insert(0, 'pick_number', positions + 1)
+    picks.insert(1, 'round', positions // len(state.draft_order) + 1)
+    picks.insert(2, 'ae', np.array(state.draft_order, dtype=object)[owners])
+    return picks
+
+def account_picks(state, picks):
+    """A picks_frame at account level: when drafting by family, every member account of each picked family.
+
+    Members carry their family's pick number, round and AE, and are indexed
+    by account handle, so books and exports treat them like single picks.
+    """
+    if state.families is None:
+        return picks
+    handles, sizes = state.families.members(picks.index.to_numpy())
+    accounts = state.families.accounts.take(handles)
+    for position, column in enumerate(['pick_number', 'round', 'ae']):
+        accounts.insert(position, column, np.repeat(picks[column].to_numpy(), sizes))
+    return accounts
+
+def draft_history(picks):
+    """The Draft History table (and CSV) for a picks_frame"""
+    history = picks[['pick_number', 'round', 'ae', 'Account_Name', 'Account_ID', 'ICP_score', 'CXP_Swat_Tier']]
+    return history.set_axis(['pick_number', 'round', 'ae', 'account_name', 'account_id', 'icp_score', 'tier'], axis=1)
+
+def assignments_frame(picks, ae_list):
+    """Owner assignment rows for the Salesforce upload, grouped by AE in ae_list order"""
+    ae_position = picks['ae'].map({ae: i for i, ae in enumerate(ae_list)}).to_numpy()
+    picks = picks.iloc[np.lexsort((picks.index.to_numpy(), ae_position))]
+    return pd.DataFrame({
+        'Account_ID': picks['Account_ID'].to_numpy(),
+        'Account_Name': picks['Account_Name'].to_numpy(),
+        'New_Owner': picks['ae'].to_numpy(),
+        # Salesforce ID for each AE (if it exists in our mapping)
+        'Owner_SFDC_ID': picks['ae'].map(AE_SFDC_IDS).fillna('').to_numpy(),
+        'ICP_Score': picks['ICP_score'].to_numpy(),
+        'CXP_Swat_Tier': picks['CXP_Swat_Tier'].to_numpy()
+    })
+
+def export_formats():
+    """The EXPORT_FORMATS whose writer is installed here"""
+    return [name for name, (_, _, modules) in EXPORT_FORMATS.items()
+            if not modules or any(find_spec(module) for module in modules)]
+
+def iter_csv_chunks(frame, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield frame as CSV bytes, chunk_rows rows at a time (header with the first)"""
+    for start in range(0, max(len(frame), 1), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0).encode()
+
+def write_export(frame, fmt, out):
+    """Write frame to the binary file object out in one of EXPORT_FORMATS
+
+    CSVs are streamed in chunks; 'Salesforce CSV splits' is a zip of CSVs of
+    at most SALESFORCE_BULK_ROWS rows each, every one with the header.
+    """
+    if fmt == 'CSV':
+        for chunk in iter_csv_chunks(frame):
+            out.write(chunk)
+    elif fmt == 'Salesforce CSV splits':
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for part, start in enumerate(range(0, max(len(frame), 1), SALESFORCE_BULK_ROWS), 1):
+                with archive.open(f"part_{part:03d}.csv", 'w') as member:
+                    for chunk in iter_csv_chunks(frame.iloc[start:start + SALESFORCE_BULK_ROWS]):
+                        member.write(chunk)
+    elif fmt == 'Parquet':
+        frame.to_parquet(out, index=False)
+    elif fmt == 'XLSX':
+        frame.to_excel(out, index=False)
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+
+# =============================================================================
+# EVENT LOG
+# =============================================================================
+
+class DraftLogConflict(RuntimeError):
+    """Raised by DraftLog.append when another writer moved the draft on since this one last saw it"""
+
+class DraftLog:
+    """Append-only event log for one draft, kept on local disk.
+
+    Each draft gets DRAFT_LOG_DIR/<draft_id>/ holding the accounts table
+    (accounts.pkl) and an SQLite database in WAL mode with the draft config,
+    the events (pick, undo, redo, blacklist, auto_complete, stage) and a
+    snapshot of the compact draft state every SNAPSHOT_EVERY events. Resuming
+    loads the newest snapshot and replays only the events after it.
+
+    Several DraftLogs (sessions, processes) may open the same draft, but only
+    one copy of the draft can move it on: see append.
+    """
+
+    def __init__(self, draft_id):
+        self.draft_id = draft_id
+        self.path = DRAFT_LOG_DIR / draft_id
+        # Streamlit reruns can land on different threads
+        self._db = sqlite3.connect(self.path / 'events.sqlite', check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS config (id INTEGER PRIMARY KEY CHECK (id = 0), body TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS snapshots (seq INTEGER PRIMARY KEY, state TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS seats (seat TEXT PRIMARY KEY, token TEXT NOT NULL);
+        """)
+        self._seq = self._db.execute('SELECT COALESCE(MAX(seq), 0) FROM events').fetchone()[0]
+
+    @classmethod
+    def create(cls, accounts_df, config):
+        """Start a new log for a draft about to begin"""
+        draft_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        (DRAFT_LOG_DIR / draft_id).mkdir(parents=True)
+        accounts_df.to_pickle(DRAFT_LOG_DIR / draft_id / 'accounts.pkl')
+        log = cls(draft_id)
+        with log._db:
+            log._db.execute('INSERT INTO config (id, body) VALUES (0, ?)', (json.dumps(config),))
+        return log
+
+    @staticmethod
+    def saved_drafts():
+        """Draft ids on disk, newest first"""
+        if not DRAFT_LOG_DIR.is_dir():
+            return []
+        return sorted((p.name for p in DRAFT_LOG_DIR.iterdir() if (p / 'events.sqlite').exists()), reverse=True)
+
+    def append(self, kind, payload, draft_state):
+        """Record one event; every SNAPSHOT_EVERY events also store a state snapshot.
+
+        The event's seq is read inside the write transaction, and if another
+        DraftLog has appended since this one last loaded or appended, nothing
+        is written and DraftLogConflict is raised: two diverging copies of a
+        draft (say, resumed in two sessions) never interleave their events.
+        """
+        with self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            seq = self._db.execute('SELECT COALESCE(MAX(seq), 0) FROM events').fetchone()[0]
+            if seq != self._seq:
+                raise DraftLogConflict(f"draft {self.draft_id} has events this copy hasn't seen")
+            seq += 1
+            self._db.execute('INSERT INTO events VALUES (?, ?, ?)', (seq, kind, json.dumps(payload)))
+            if seq % SNAPSHOT_EVERY == 0:
+                self._db.execute('INSERT INTO snapshots VALUES (?, ?)', (seq, json.dumps(draft_snapshot(draft_state))))
+        self._seq = seq
+
+    def config(self):
+        return json.loads(self._db.execute('SELECT body FROM config').fetchone()[0])
+
+    def seat_tokens(self, seats):
+        """{seat: secret token} for a draft room's seats, minted on first use and kept so invite links outlive the room"""
+        with self._db:
+            self._db.executemany('INSERT OR IGNORE INTO seats VALUES (?, ?)', [(seat, secrets.token_urlsafe(12)) for seat in seats])
+        return dict(self._db.execute('SELECT seat, token FROM seats'))
+
+    def accounts(self):
+        return pd.read_pickle(self.path / 'accounts.pkl')
+
+    def load(self, writer=True):
+        """Return (config, newest snapshot or None, [(kind, payload)] after it)
+
+        writer=True means the loaded draft will append here, so the log notes
+        how far it has read for append's conflict check.
+        """
+        config = self.config()
+        row = self._db.execute('SELECT seq, state FROM snapshots ORDER BY seq DESC LIMIT 1').fetchone()
+        since, snapshot = (row[0], json.loads(row[1])) if row else (0, None)
+        rows = self._db.execute('SELECT seq, kind, payload FROM events WHERE seq > ? ORDER BY seq', (since,)).fetchall()
+        if writer:
+            self._seq = rows[-1][0] if rows else since
+        return config, snapshot, [(kind, json.loads(payload)) for _, kind, payload in rows]
+
+    def close(self):
+        self._db.close()
+
+def log_event(state, kind, **payload):
+    """Append an event to the draft's log, if one is open"""
+    if state.draft_log is not None:
+        state.draft_log.append(kind, payload, state)
+
+def draft_snapshot(state):
+    """The compact, JSON-ready state a DraftLog snapshot stores"""
+    return {
+        'stage': state.stage,
+        'draft_picks': list(state.draft_picks),
+        'pick_owners': list(state.pick_owners),
+        'blacklisted': list(state.blacklisted_accounts),
+        'redo_stack': list(state.redo_stack),
+        'queues': {ae: queue.handles.tolist() for ae, queue in state.ae_queues.items()},
+    }
+
+def draft_config(state, custom_slots, **extra):
+    """The config a DraftLog stores for a draft started with start_draft"""
+    return {
+        'ae_list': state.ae_list,
+        'draft_order': state.draft_order,
+        'accounts_per_ae': state.accounts_per_ae,
+        'draft_type': state.draft_type,
+        'custom_slots': {str(pick): ae_idx for pick, ae_idx in (custom_slots or {}).items()},
+        'families': state.families is not None,
+        'book_rules': state.book_rules,
+        **extra,
+    }
+
+def restore_draft(state, log, accounts_df=None, replica=False):
+    """Rebuild a draft from its log: newest snapshot in bulk, then replay the events after it.
+
+    accounts_df, if given, is used instead of the log's own copy of the
+    accounts (the app passes one shared by every session on the same upload).
+    The rebuilt draft logs its own events to log, unless it is a replica (a
+    draft room seat's read-only copy). Returns the stored config (the app
+    keeps its own keys there).
+    """
+    config, snapshot, events = log.load(writer=not replica)
+    accounts_df = log.accounts() if accounts_df is None else accounts_df
+    state.families = account_families(accounts_df) if config.get('families') else None
+    state.accounts_df = accounts_df if state.families is None else state.families.frame
+    state.ae_list = config['ae_list']
+    state.accounts_per_ae = config['accounts_per_ae']
+    state.draft_type = config['draft_type']
+    state.book_rules = config.get('book_rules', [])
+    state.draft_log = None  # replay must not re-log
+    start_draft(state, config['draft_order'], {int(pick): ae_idx for pick, ae_idx in config['custom_slots'].items()})
+    state.stage = 'cleanup'
+
+    if snapshot:
+        state.stage = snapshot['stage']
+        state.blacklisted_accounts.update(snapshot['blacklisted'])
+        state.account_pool.remove_many(snapshot['blacklisted'] + snapshot['draft_picks'])
+        assign_picks(state, np.asarray(snapshot['draft_picks'], dtype=np.int64), np.asarray(snapshot['pick_owners'], dtype=np.int64))
+        state.redo_stack = snapshot['redo_stack']
+        state.ae_queues = {ae: DraftQueue(handles) for ae, handles in snapshot.get('queues', {}).items()}
+
+    for kind, payload in events:
+        apply_event(state, kind, payload)
+    state.draft_log = None if replica else log
+    return config
+
+def apply_event(state, kind, payload):
+    """Apply one logged event to state (replaying a log, or following a draft room)"""
+    if kind == 'pick':
+        draft_account(state, payload['h'])
+    elif kind == 'undo':
+        undo_last_pick(state)
+    elif kind == 'redo':
+        redo_pick(state)
+    elif kind == 'blacklist':
+        blacklist_accounts(state, payload['h'])
+    elif kind == 'auto_complete':
+        handles = np.asarray(payload['h'], dtype=np.int64)
+        state.account_pool.remove_many(handles)
+        _, ae_idx = state.pick_schedule.next_picks(state.current_pick, len(handles))
+        assign_picks(state, handles, ae_idx)
+        state.redo_stack = []
+    elif kind == 'queue':
+        set_queue(state, payload['ae'], payload['h'])
+    elif kind == 'stage':
+        state.stage = payload['stage']
+
+# =============================================================================
+# DRAFT ROOMS
+# =============================================================================
+class RoomSubscription:
+    """One seat's queue of (kind, payload) events published by its room"""
+
+    def __init__(self):
+        self._events = deque()
+
+    def __len__(self):
+        return len(self._events)
+
+    def put(self, event):
+        self._events.append(event)
+
+    def drain(self):
+        while self._events:
+            yield self._events.popleft()
+
+    def clear(self):
+        self._events.clear()
+
+class DraftRoom:
+    """One authoritative draft shared by several seats (one per browser).
+
+    Seats submit actions; the room runs them on its own DraftState under a
+    lock, and the room stands in as that state's draft_log, so each event is
+    written to the real DraftLog and pushed to every seat's subscription in
+    the same step. Seats keep a replica of the draft that they bring up to
+    date by applying the pushed events (see sync), exactly as a resume
+    replays the log. If a session that resumed the draft on its own wrote to
+    the log first, the room reloads the draft from the log and so do its
+    seats.
+
+    Each seat (the commissioner and every AE) has a secret token, handed out
+    in its invite link; actions are submitted with a token, so a browser can
+    only act for the seat whose link it opened.
+    """
+
+    def __init__(self, log, accounts_df=None):
+        self.log = log
+        self.draft_id = log.draft_id
+        self._lock = threading.RLock()
+        # Seats that go away (their session ends) drop out on their own
+        self._subscriptions = weakref.WeakSet()
+        self.state = DraftState()
+        restore_draft(self.state, log, accounts_df)
+        self.state.draft_log = self
+        # Seat -> token; only the commissioner is shown the AEs' invite links
+        self.tokens = log.seat_tokens([ROOM_COMMISSIONER] + self.state.draft_order)
+        self._seats = {token: seat for seat, token in self.tokens.items()}
+        self.last_active = time.monotonic()
+
+    @property
+    def seats(self):
+        return len(self._subscriptions)
+
+    def append(self, kind, payload, draft_state):
+        """DraftLog interface for the room's state: log the event, then publish it"""
+        self.log.append(kind, payload, draft_state)
+        for subscription in list(self._subscriptions):
+            subscription.put((kind, payload))
+
+    def seat_for(self, token):
+        """The seat a token was issued for, or None (the holder may only watch)"""
+        return self._seats.get(token)
+
+    def join(self, state):
+        """Make state a replica of the room's draft; returns the subscription that keeps it current"""
+        with self._lock:
+            self.last_active = time.monotonic()
+            subscription = RoomSubscription()
+            self._subscriptions.add(subscription)
+            # Replicas never log; the room does
+            restore_draft(state, self.log, source_accounts(self.state), replica=True)
+        return subscription
+
+    def submit(self, token, action, *args):
+        """Run an engine action (draft_account, undo_last_pick, ...) on the room's draft for token's seat.
+
+        Returns (accepted, action's result). The commissioner may do anything
+        but send the room back to setup; an AE seat may only pick an available
+        account while that AE is on the clock, and set its own autodraft queue.
+        Every pick must keep to the AE's book rules. Without a seat's token
+        nothing is accepted.
+        """
+        seat = self.seat_for(token)
+        if seat is None:
+            return False, None
+        with self._lock:
+            self.last_active = time.monotonic()
+            state = self.state
+            if action is draft_account:
+                on_clock = get_current_ae(state) if state.stage == 'draft' else None
+                if on_clock is None or args[0] is None or args[0] not in state.account_pool:
+                    return False, None
+                if not pick_allowed(state, args[0]):
+                    return False, None
+                if seat != ROOM_COMMISSIONER and seat != on_clock:
+                    return False, None
+            elif action is set_queue:
+                if seat != ROOM_COMMISSIONER and seat != args[0]:
+                    return False, None
+            elif seat != ROOM_COMMISSIONER or (action is set_stage and args[0] == 'setup'):
+                return False, None
+            try:
+                return True, action(state, *args)
+            except DraftLogConflict:
+                self._reload()
+                return False, None
+
+    def _reload(self):
+        """Take up the draft as the log has it, and have every seat do the same"""
+        restore_draft(self.state, self.log, source_accounts(self.state))
+        self.state.draft_log = self
+        for subscription in list(self._subscriptions):
+            subscription.clear()
+            subscription.put(('reload', {}))
+
+    def sync(self, state, subscription):
+        """Apply a replica's pending events from its subscription; returns how many"""
+        applied = 0
+        for kind, payload in subscription.drain():
+            if kind == 'reload':
+                restore_draft(state, self.log, source_accounts(self.state), replica=True)
+            else:
+                apply_event(state, kind, payload)
+            applied += 1
+        return applied
+
+    def close(self):
+        self.log.close()
+
+class DraftRooms:
+    """The in-process broker: every draft room open in this process, by draft_id.
+
+    Rooms with no seats left that have been idle for ROOM_IDLE_SECONDS are
+    closed whenever a room is looked up, so finished and abandoned drafts do
+    not stay in memory; opening the draft again reopens it from its log.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def _close_idle(self):
+        now = time.monotonic()
+        for draft_id, room in list(self._rooms.items()):
+            if room.seats == 0 and now - room.last_active > ROOM_IDLE_SECONDS:
+                room.close()
+                del self._rooms[draft_id]
+
+    def get(self, draft_id):
+        with self._lock:
+            self._close_idle()
+            room = self._rooms.get(draft_id)
+            if room is not None:
+                # Looked up to be joined: not idle
+                room.last_active = time.monotonic()
+            return room
+
+    def open(self, log, accounts_df=None):
+        """The room for log's draft, opened from log (which the room then owns) unless already open"""
+        with self._lock:
+            self._close_idle()
+            room = self._rooms.get(log.draft_id)
+            if room is None:
+                room = self._rooms[log.draft_id] = DraftRoom(log, accounts_df)
+            elif room.log is not log:
+                log.close()
+            room.last_active = time.monotonic()
+            return room
+
+# =============================================================================
+# HEADLESS RUNS
+# =============================================================================
+
+def run_draft(accounts_df, ae_list, accounts_per_ae=20, draft_type='Snake', draft_order=None,
+              custom_slots=None, blacklist=(), seed=None, log=False, balanced=False, queues=None, families=False,
+              book_rules=()):
+    """Run a whole draft with no UI and return its DraftState.
+
+    draft_order defaults to a shuffle of ae_list (seeded by seed), like
+    Generate Draft Order in the app; blacklist is a collection of Account_IDs
+    kept out of the pool. queues maps AEs to autodraft wishlists of
+    Account_IDs. Every pick goes to the AE's first available queued account,
+    else the best available; with balanced=True the accounts past the queues
+    are spread to even out books. With families=True each pick takes a whole
+    parent/child family (see AccountFamilies), and a blacklisted or queued ID
+    stands for its family. book_rules are per-AE caps and quotas every pick
+    keeps to where it can (see BookLimits and parse_book_rules).
+    With log=True the draft is recorded in a DraftLog the app can resume.
+    """
+    state = DraftState(accounts_df, ae_list, accounts_per_ae, draft_type)
+    state.book_rules = list(book_rules)
+    if families:
+        state.families = account_families(accounts_df)
+        state.accounts_df = state.families.frame
+    if draft_order is None:
+        draft_order = np.random.default_rng(seed).permutation(state.ae_list).tolist()
+    start_draft(state, draft_order, custom_slots)
+    if log:
+        state.draft_log = DraftLog.create(accounts_df, draft_config(state, custom_slots, upload_key=None))
+    if len(blacklist) and families:
+        blacklist_accounts(state, draft_handles_for_ids(state, blacklist))
+    elif len(blacklist):
+        blacklist_accounts(state, np.flatnonzero(accounts_df['Account_ID'].isin(blacklist).to_numpy()))
+    for ae, ids in (queues or {}).items():
+        set_queue(state, ae, draft_handles_for_ids(state, ids))
+    set_stage(state, 'draft')
+    auto_complete(state, balanced)
+    set_stage(state, 'results')
+    return state
+
+def simulate_draft_orders(accounts_df, ae_list, accounts_per_ae=20, draft_type='Snake', custom_slots=None,
+                          blacklist=(), num_sims=2000, seed=None, families=None):
+    """Final standings of num_sims auto-completed drafts, each under a random draft order.
+
+    Auto-complete takes the same accounts in the same sequence whatever the
+    order; only which AE sits in each draft slot changes. So each slot's haul
+    is computed once and the simulations are a vectorized shuffle of slots
+    across AEs. custom_slots maps pick indexes to ae_list indexes; those picks
+    stay with their AE in every simulation. Returns one row per simulation and
+    AE with the results-standings columns plus the AE's draft slot (1-based).
+    When drafting by family, accounts_df is families.frame and, as in the
+    standings, Total, the tier counts and Avg Score count member accounts.
+    """
+    num_aes = len(ae_list)
+    pool = AccountPool(accounts_df)
+    if len(blacklist) and families is not None:
+        pool.remove_many(families.families_for_ids(blacklist))
+    elif len(blacklist):
+        pool.remove_many(np.flatnonzero(accounts_df['Account_ID'].isin(blacklist).to_numpy()))
+    schedule = PickSchedule(num_aes, accounts_per_ae, draft_type)
+    handles = pool.take_best(len(schedule))
+    slots = schedule.ae_index[:len(handles)].astype(np.int64)
+    scores = accounts_df['ICP_score'].to_numpy(dtype=np.float64)[handles]
+    if families is None:
+        tier_ranks = accounts_df['tier_rank'].to_numpy()[handles]
+        sizes, tier_1s, tier_2s = np.ones(len(handles)), tier_ranks == TIER_1, tier_ranks == TIER_2
+    else:
+        # Each picked family's member accounts, and those in Tier 1 and Tier 2
+        member_ranks = families.accounts['tier_rank'].to_numpy()
+        num_families = len(families.sizes)
+        sizes = families.sizes[handles]
+        tier_1s = np.bincount(families.family_of[member_ranks == TIER_1], minlength=num_families)[handles]
+        tier_2s = np.bincount(families.family_of[member_ranks == TIER_2], minlength=num_families)[handles]
+
+    owner = np.full(len(handles), -1)
+    for pick, ae_idx in (custom_slots or {}).items():
+        if pick < len(handles):
+            owner[pick] = ae_idx
+    free = owner < 0
+
+    def haul(keys, mask):
+        """(picks, accounts, score sum, Tier 1, Tier 2) per key for the masked picks"""
+        return tuple(np.bincount(keys[mask], weights[mask], minlength=num_aes)
+                     for weights in (np.ones(len(handles)), sizes, scores, tier_1s, tier_2s))
+
+    slot_haul = haul(slots, free)
+    fixed_haul = haul(np.maximum(owner, 0), ~free)
+
+    # slot_of[sim, ae] = the draft slot that AE drew in that simulation
+    rng = np.random.default_rng(seed)
+    slot_of = rng.permuted(np.tile(np.arange(num_aes), (num_sims, 1)), axis=1)
+    picks, count, total, tier_1, tier_2 = (
+        by_slot[slot_of] + fixed[None, :] for by_slot, fixed in zip(slot_haul, fixed_haul)
+    )
+
+    sims = pd.DataFrame({
+        'Sim': np.repeat(np.arange(1, num_sims + 1), num_aes),
+        'AE': np.tile(np.array(ae_list, dtype=object), num_sims),
+        'Draft Slot': slot_of.ravel() + 1,
+        'Total': count.ravel().astype(np.int64),
+        'Tier 1': tier_1.ravel().astype(np.int64),
+        'Tier 2': tier_2.ravel().astype(np.int64),
+        'Avg Score': np.divide(total, count, out=np.zeros(total.shape), where=count > 0).ravel(),
+        'Total Score': total.ravel(),
+    })
+    if families is not None:
+        sims.insert(4, 'Families', picks.ravel().astype(np.int64))
+    return sims
+
+def simulation_summary(sims, by='AE'):
+    """Mean and 5th/50th/95th percentiles of each standings metric, per AE (or per 'Draft Slot')"""
+    metrics = ['Avg Score', 'Total Score', 'Tier 1', 'Tier 2']
+    summary = sims.groupby(by)[metrics].quantile([0.05, 0.5, 0.95]).unstack()
+    summary.columns = [f"{metric} p{round(q * 100)}" for metric, q in summary.columns]
+    means = sims.groupby(by)[metrics].mean().add_suffix(' mean')
+    columns = [f"{metric} {stat}" for metric in metrics for stat in ('mean', 'p5', 'p50', 'p95')]
+    return means.join(summary)[columns].reset_index()
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run a GTM Fantasy Draft from an accounts CSV without the Streamlit UI.")
+    parser.add_argument('csv', type=Path, help="accounts CSV")
+    parser.add_argument('--ae', action='append', default=[], help="AE name (repeat per AE; default: the default team)")
+    parser.add_argument('--accounts-per-ae', type=int, default=20)
+    parser.add_argument('--draft-type', choices=DRAFT_TYPES, default='Snake')
+    parser.add_argument('--keep-order', action='store_true', help="draft in --ae order instead of a random one")
+    parser.add_argument('--seed', type=int, help="seed for the random draft order")
+    parser.add_argument('--slots', type=Path, help="file of custom pick slots, one 'pick#: AE name' per line")
+    parser.add_argument('--blacklist', type=Path, help="file of Account_IDs to exclude, one per line (or a CSV, first column)")
+    parser.add_argument('--exclude', action='append', default=[], metavar='COLUMN=VALUE',
+                        help="exclude accounts whose COLUMN is VALUE (repeatable; Parent_Account_ID drops whole subtrees, "
+                             "and with --families an Account_ID or Parent_Account_ID drops its whole family)")
+    parser.add_argument('--queue', action='append', default=[], metavar='AE=FILE',
+                        help="AE's autodraft queue: Account_IDs most wanted first, one per line (repeat per AE)")
+    parser.add_argument('--rule', action='append', default=[], metavar='RULE',
+                        help="per-AE cap or quota, e.g. 'Industry <= 3' or 'Paul Kellum: Billing_State in NY, NJ >= 5' "
+                             "(repeatable)")
+    parser.add_argument('--column', action='append', default=[], metavar='NAME=CSV_COLUMN',
+                        help=f"map a standard column ({', '.join(COLUMN_HINTS)}) to a CSV column")
+    parser.add_argument('--out', type=Path, help="write the Salesforce assignments here (default: CSV on stdout); "
+                                                 "the extension picks the format: .csv, .zip (Salesforce CSV splits), "
+                                                 ".parquet or .xlsx")
+    parser.add_argument('--history', type=Path, help="also write the draft history CSV here")
+    parser.add_argument('--balanced', action='store_true', help="spread the drafted accounts to even out each AE's book")
+    parser.add_argument('--families', action='store_true',
+                        help="draft whole parent/child families (by Parent_Account_ID) as single picks")
+    parser.add_argument('--log', action='store_true', help=f"record the draft in {DRAFT_LOG_DIR}/ so the app can resume it")
+    parser.add_argument('--simulate', type=int, metavar='N',
+                        help="instead of drafting, print the standings spread over N random draft orders")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    ae_list = args.ae or list(AE_SFDC_IDS)
+    if len(ae_list) < 2:
+        sys.exit("error: enter at least 2 AEs")
+
+    with open(args.csv, 'rb') as source:
+        header = read_csv_header(source)
+        mapped = dict(arg.split('=', 1) for arg in args.column)
+        columns = {}
+        for std_name in COLUMN_HINTS:
+            col = mapped.get(std_name) or guess_column(header, std_name) or (std_name if std_name in header else '')
+            if col:
+                columns[std_name] = header.get(col, col)
+        missing = [name for name in COLUMN_HINTS if name != 'ICP_Reasoning' and name not in columns]
+        if missing:
+            sys.exit(f"error: map these columns with --column NAME=CSV_COLUMN: {', '.join(missing)}")
+        extras = {col: header[col] for col in DEFAULT_EXTRA_COLUMNS if col in header and header[col] not in columns.values()}
+        accounts_df = load_accounts(source, columns, extras)
+
+    # Drafting by family, rules and simulations see one row per family (its head account's columns);
+    # ID rules match a family through any of its members
+    families = account_families(accounts_df) if args.families else None
+    units = accounts_df if families is None else families.frame
+    blacklist = read_id_list(args.blacklist) if args.blacklist else []
+    if args.exclude:
+        rules = {}
+        for arg in args.exclude:
+            column, value = arg.split('=', 1)
+            if column not in units.columns:
+                sys.exit(f"error: --exclude column {column} is not loaded")
+            rules.setdefault(column, []).append(value)
+        excluded, _ = exclusion_mask(units, list(rules.items()), families)
+        blacklist += units['Account_ID'][excluded].tolist()
+    draft_order = ae_list if args.keep_order else None
+    if args.simulate:
+        # Custom slots follow their AE into every simulated order
+        draft_order = ae_list
+    elif args.slots and draft_order is None:
+        draft_order = np.random.default_rng(args.seed).permutation(ae_list).tolist()
+    custom_slots = None
+    if args.slots:
+        custom_slots, errors = parse_custom_slots(args.slots.read_text(), draft_order, len(ae_list) * args.accounts_per_ae)
+        for error in errors:
+            print(f"warning: ignoring custom slot {error}", file=sys.stderr)
+
+    if args.simulate:
+        sims = simulate_draft_orders(units, ae_list, args.accounts_per_ae, args.draft_type,
+                                     custom_slots, blacklist, args.simulate, args.seed, families)
+        print(simulation_summary(sims).to_string(index=False, float_format='%.1f'))
+        print()
+        print(simulation_summary(sims, by='Draft Slot').to_string(index=False, float_format='%.1f'))
+        return
+
+    book_rules, errors = parse_book_rules('\n'.join(args.rule), ae_list, units.columns)
+    if errors:
+        sys.exit(f"error: bad --rule {errors[0]}")
+    queues = {}
+    for arg in args.queue:
+        ae, path = arg.split('=', 1)
+        if ae not in ae_list:
+            sys.exit(f"error: --queue names {ae}, who is not drafting")
+        queues[ae] = read_id_list(path)
+    state = run_draft(accounts_df, ae_list, args.accounts_per_ae, args.draft_type, draft_order,
+                      custom_slots, blacklist, args.seed, args.log, args.balanced, queues, args.families,
+                      book_rules)
+    if state.draft_log is not None:
+        print(f"logged draft {state.draft_log.draft_id}", file=sys.stderr)
+
+    picks = picks_frame(state)
+    assignments = assignments_frame(account_picks(state, picks), state.ae_list)
+    if args.out:
+        fmt = next((name for name, (extension, _, _) in EXPORT_FORMATS.items()
+                    if args.out.suffix.lower() == f'.{extension}'), 'CSV')
+        with open(args.out, 'wb') as out:
+            write_export(assignments, fmt, out)
+    else:
+        write_export(assignments, 'CSV', sys.stdout.buffer)
+    if args.history:
+        draft_history(picks).to_csv(args.history, index=False)
+
+    unit = 'accounts' if state.families is None else 'families'
+    for ae in state.draft_order:
+        stats = state.ae_stats[ae]
+        print(f"{ae}: {stats.count} {unit}, avg ICP {stats.avg:.1f}, T1 {stats.tier_counts[TIER_1]}, "
+              f"T2 {stats.tier_counts[TIER_2]}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,29 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from array import array
 from datetime import datetime
+from urllib.parse import urlencode
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from draft_engine import (
+    AE_SFDC_IDS, BOOK_RULE_COLUMNS, DEFAULT_EXTRA_COLUMNS, DRAFT_TYPES, EXCLUSION_COLUMNS, EXPORT_FORMATS, ROOM_COMMISSIONER,
+    SALESFORCE_BULK_ROWS, TIER_1, TIER_2, TIER_BADGES, TIER_NAMES, TIER_UNRANKED,
+    BitSet, DraftLog, DraftLogConflict, DraftRooms, SearchIndex,
+    account_families, account_picks, assignments_frame, auto_complete, autodraft_pick, blacklist_accounts,
+    draft_account, draft_config, draft_handles_for_ids, draft_history, exclusion_impact, export_formats,
+    get_current_ae, guess_column, load_accounts, parse_book_rules, parse_custom_slots, pick_allowed, picks_frame,
+    read_csv_header, read_id_list, redo_pick, restore_draft, set_queue, set_stage, simulate_draft_orders, simulation_summary, source_accounts,
+    start_draft, tier_badge, tier_counts, tier_name, undo_last_pick, write_export
+)
 
 # Page config
 st.set_page_config(page_title="GTM Fantasy Draft", layout="wide", page_icon="🏈")
@@ -13,123 +35,661 @@ if 'stage' not in st.session_state:
     st.session_state.stage = 'upload'
 if 'accounts_df' not in st.session_state:
     st.session_state.accounts_df = None
+if 'search_index' not in st.session_state:
+    st.session_state.search_index = None
+if 'families' not in st.session_state:
+    st.session_state.families = None  # AccountFamilies when drafting by family (accounts_df is then their frame)
+if 'draft_families' not in st.session_state:
+    st.session_state.draft_families = False
+if 'upload_hash' not in st.session_state:
+    st.session_state.upload_hash = None
 if 'ae_list' not in st.session_state:
     st.session_state.ae_list = []
 if 'draft_order' not in st.session_state:
     st.session_state.draft_order = []
 if 'draft_picks' not in st.session_state:
-    st.session_state.draft_picks = []
+    st.session_state.draft_picks = array('i')  # account handles, in pick order
+if 'pick_owners' not in st.session_state:
+    st.session_state.pick_owners = array('B')  # draft_order index of the AE for each pick
 if 'current_pick' not in st.session_state:
     st.session_state.current_pick = 0
-if 'available_accounts' not in st.session_state:
-    st.session_state.available_accounts = []
+if 'account_pool' not in st.session_state:
+    st.session_state.account_pool = None
 if 'ae_books' not in st.session_state:
     st.session_state.ae_books = {}
+if 'ae_stats' not in st.session_state:
+    st.session_state.ae_stats = {}
+if 'ae_queues' not in st.session_state:
+    st.session_state.ae_queues = {}  # AE -> DraftQueue (autodraft wishlist)
 if 'blacklisted_accounts' not in st.session_state:
-    st.session_state.blacklisted_accounts = set()
+    st.session_state.blacklisted_accounts = BitSet(0)
 if 'accounts_per_ae' not in st.session_state:
     st.session_state.accounts_per_ae = 20
-if 'is_snake' not in st.session_state:
-    st.session_state.is_snake = True
+if 'draft_type' not in st.session_state:
+    st.session_state.draft_type = 'Snake'
+if 'pick_schedule' not in st.session_state:
+    st.session_state.pick_schedule = None
 if 'filter_tier' not in st.session_state:
     st.session_state.filter_tier = 'all'
-if 'accounts_shown' not in st.session_state:
-    st.session_state.accounts_shown = 50
-
-# AE SALESFORCE ID MAPPING
-AE_SFDC_IDS = {
-    'Alexa Pass': '005Vr00000QYPh1IAH',
-    'Lindsay Kelvie': '005Vr00000QYQWVIA5',
-    'Paul Kellum': '005Vr00000QYQWqIAP',
-    'Travis Pederson': '005Vr00000QYQXDIA5'
-}
+if 'board_page' not in st.session_state:
+    st.session_state.board_page = 0
+if 'board_view' not in st.session_state:
+    st.session_state.board_view = 'Table'
+if 'board_prefix' not in st.session_state:
+    st.session_state.board_prefix = False  # search matches only the start of names and IDs
+if 'board_allowed_only' not in st.session_state:
+    st.session_state.board_allowed_only = False  # hide accounts the AE on the clock may not take
+if 'book_rules' not in st.session_state:
+    st.session_state.book_rules = []  # per-AE caps and quotas (see BookLimits)
+if 'book_limits' not in st.session_state:
+    st.session_state.book_limits = None
+if 'redo_stack' not in st.session_state:
+    st.session_state.redo_stack = []  # undone handles, most recent last
+if 'upload_key' not in st.session_state:
+    st.session_state.upload_key = None
+if 'draft_log' not in st.session_state:
+    st.session_state.draft_log = None
+if 'autocomplete_mode' not in st.session_state:
+    st.session_state.autocomplete_mode = 'Best Available'
+if 'history_cache' not in st.session_state:
+    st.session_state.history_cache = None  # completed rounds' Draft History table
+if 'draft_room' not in st.session_state:
+    st.session_state.draft_room = None  # shared DraftRoom this session follows as a seat
+if 'room_seat' not in st.session_state:
+    st.session_state.room_seat = None  # seat this session's room token opens (None: watching)
+if 'room_token' not in st.session_state:
+    st.session_state.room_token = None
+if 'room_subscription' not in st.session_state:
+    st.session_state.room_subscription = None
+if 'draft_notice' not in st.session_state:
+    st.session_state.draft_notice = None  # one-off toast for the next run (room refusals, reloaded drafts)
+if 'board_cache' not in st.session_state:
+    st.session_state.board_cache = None  # memoized board handles (see board_handles)
+if 'export_format' not in st.session_state:
+    st.session_state.export_format = 'CSV'
+if 'exports' not in st.session_state:
+    st.session_state.exports = {}  # prepared export files, by kind
+if 'perf_enabled' not in st.session_state:
+    st.session_state.perf_enabled = False
+if 'profiler' not in st.session_state:
+    st.session_state.profiler = None
+
+# Parsed uploads kept in the cross-session cache (least recently used evicted first)
+UPLOAD_CACHE_ENTRIES = 4
+
+# How auto-complete hands out the remaining picks (see auto_complete)
+AUTOCOMPLETE_MODES = ["Best Available", "Balanced Books"]
+
+# Reruns kept by the ⏱ Performance panel for its rolling percentiles
+PERF_HISTORY = 200
+
+# How often a draft room seat checks for other seats' events and redraws the live parts of the draft
+# page (bounds their pick-to-visible latency)
+ROOM_POLL_SECONDS = 1.0
+
+# Accounts rendered per draft board page (keeps each rerun's widget count fixed)
+BOARD_PAGE_SIZE = 50
+
+# Draft board tier filters (None: every tier)
+BOARD_FILTERS = {'all': None, 'tier1': TIER_1, 'tier2': TIER_2, 'unranked': TIER_UNRANKED}
 
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
 
-def get_tier_rank(tier_value):
-    """Return numeric rank for sorting (higher = better)"""
-    if pd.isna(tier_value) or tier_value == '' or tier_value == 'nan':
-        return 0
-    tier_str = str(tier_value).lower()
-    if 'tier 1' in tier_str:
-        return 2
-    elif 'tier 2' in tier_str:
-        return 1
-    return 0
-
-def sort_accounts_by_tier(accounts_list):
-    """Sort accounts by Tier (1 > 2 > Unranked), then by ICP Score (descending)"""
-    return sorted(
-        accounts_list,
-        key=lambda x: (-get_tier_rank(x.get('CXP_Swat_Tier', '')), -float(x.get('ICP_score', 0)))
+
+def file_content_hash(source):
+    """blake2b digest of an uploaded file, computed once per upload"""
+    file_id = getattr(source, 'file_id', None)
+    cached = st.session_state.upload_hash
+    if file_id is not None and cached and cached[0] == file_id:
+        return cached[1]
+    digest = hashlib.blake2b(digest_size=20)
+    source.seek(0)
+    for block in iter(lambda: source.read(1 << 20), b''):
+        digest.update(block)
+    source.seek(0)
+    st.session_state.upload_hash = (file_id, digest.hexdigest())
+    return digest.hexdigest()
+
+class UploadCache:
+    """Parsed uploads shared by every session, least recently used evicted first.
+
+    Not st.cache_resource: a miss draws this session's progress bar, and
+    Streamlit would replay that call on every later hit, after the bar is gone.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """The frame cached under key, else load()'s result, cached under it"""
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+        frame = load()
+        with self._lock:
+            self._frames[key] = frame
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+        return frame
+
+@st.cache_resource(show_spinner=False)
+def upload_cache():
+    """The parsed uploads cache, shared by every session"""
+    return UploadCache(UPLOAD_CACHE_ENTRIES)
+
+def load_accounts_cached(content_hash, columns, extra_columns, source, on_progress=None):
+    """load_accounts memoized on file content and mapping, shared by every session.
+
+    on_progress is only called when the file is actually parsed. The same
+    DataFrame object is handed to every caller, so it must never be modified
+    in place.
+    """
+    return upload_cache().get(
+        (content_hash, columns, extra_columns),
+        lambda: load_accounts(source, dict(columns), dict(extra_columns), on_progress)
     )
 
-def get_current_ae():
-    """Determine which AE is picking now"""
-    if not st.session_state.draft_order:
+@st.cache_resource(max_entries=UPLOAD_CACHE_ENTRIES, show_spinner=False)
+def search_index_cached(content_hash, columns, extra_columns, by_family, _accounts_df, _families=None):
+    """SearchIndex for a load_accounts_cached result, under the same key
+
+    With by_family, every account is still indexed but hits are its family.
+    """
+    return SearchIndex(_accounts_df, None if _families is None else _families.family_of)
+
+@st.cache_resource(max_entries=UPLOAD_CACHE_ENTRIES, show_spinner=False)
+def families_cached(content_hash, columns, extra_columns, _accounts_df):
+    """AccountFamilies for a load_accounts_cached result, kept for as long as the upload is"""
+    return account_families(_accounts_df)
+
+@st.cache_resource(max_entries=UPLOAD_CACHE_ENTRIES, show_spinner=False)
+def logged_accounts_cached(draft_id, _log):
+    """A CLI draft log's accounts table, shared by every session resuming that draft"""
+    return _log.accounts()
+
+def logged_upload_key(log):
+    """A draft log's upload cache key, or None if the draft came from the CLI"""
+    upload_key = log.config()['upload_key']
+    if not upload_key:
         return None
-    num_aes = len(st.session_state.draft_order)
-    pick_in_round = st.session_state.current_pick % num_aes
-    round_num = st.session_state.current_pick // num_aes
-    
-    if st.session_state.is_snake and round_num % 2 == 1:
-        ae_index = num_aes - 1 - pick_in_round
+    # JSON turned the cache key's tuples into lists
+    content_hash, columns, extras = upload_key
+    return content_hash, tuple(map(tuple, columns)), tuple(map(tuple, extras))
+
+def logged_accounts(log, upload_key):
+    """A draft log's accounts table, shared by every session using the same upload.
+
+    While the upload is still in the UploadCache its frame is used as is;
+    otherwise the log's pickled copy is read and cached in its place.
+    """
+    if upload_key is None:
+        return logged_accounts_cached(log.draft_id, log)
+    return upload_cache().get(upload_key, log.accounts)
+
+def use_upload(upload_key):
+    """Point a freshly restored draft at its shared search index"""
+    st.session_state.history_cache = None
+    st.session_state.upload_key = upload_key
+    families = st.session_state.families
+    if upload_key:
+        st.session_state.search_index = search_index_cached(
+            *upload_key, families is not None, source_accounts(st.session_state), families
+        )
     else:
-        ae_index = pick_in_round
-    
-    return st.session_state.draft_order[ae_index]
-
-def tier_badge(tier_val):
-    """Return visual badge for tier"""
-    if pd.isna(tier_val) or tier_val == '' or tier_val == 'nan':
-        return '⚪'
-    tier_str = str(tier_val).lower()
-    if 'tier 1' in tier_str:
-        return '🟡'
-    elif 'tier 2' in tier_str:
-        return '🟢'
-    return '⚪'
-
-def tier_name(tier_val):
-    """Return tier name"""
-    if pd.isna(tier_val) or tier_val == '' or tier_val == 'nan':
-        return 'Unranked'
-    tier_str = str(tier_val).lower()
-    if 'tier 1' in tier_str:
-        return 'Tier 1'
-    elif 'tier 2' in tier_str:
-        return 'Tier 2'
-    return 'Unranked'
+        st.session_state.search_index = SearchIndex(
+            source_accounts(st.session_state), None if families is None else families.family_of
+        )
+
+def use_families(enabled):
+    """Draft this session's upload by family (enabled) or account by account"""
+    accounts_df = source_accounts(st.session_state)
+    if not enabled:
+        families = None
+    elif st.session_state.upload_key:
+        families = families_cached(*st.session_state.upload_key, accounts_df)
+    else:
+        families = account_families(accounts_df)
+    units = accounts_df if families is None else families.frame
+    if units is not st.session_state.accounts_df:
+        st.session_state.families = families
+        st.session_state.accounts_df = units
+        use_upload(st.session_state.upload_key)
+
+def resume_draft(draft_id):
+    """Reopen a logged draft in this session, sharing its accounts and search index with other sessions
+
+    A draft open as a draft room is only followed, from no seat: its seats
+    act through their invite links.
+    """
+    if draft_rooms().get(draft_id) is not None:
+        join_room(draft_id, None)
+        return
+    st.query_params['draft'] = draft_id
+    log = DraftLog(draft_id)
+    upload_key = logged_upload_key(log)
+    restore_draft(st.session_state, log, logged_accounts(log, upload_key))
+    use_upload(upload_key)
+
+@st.cache_resource(show_spinner=False)
+def draft_rooms():
+    """The draft rooms open on this server, shared by every session"""
+    return DraftRooms()
+
+def join_room(draft_id, token):
+    """Follow a shared draft room from this session, in the seat token opens (or none), opening the room from its log if needed"""
+    room = draft_rooms().get(draft_id)
+    if room is None:
+        log = DraftLog(draft_id)
+        room = draft_rooms().open(log, logged_accounts(log, logged_upload_key(log)))
+    st.session_state.room_subscription = room.join(st.session_state)
+    st.session_state.draft_room = room
+    st.session_state.room_seat = room.seat_for(token)
+    st.session_state.room_token = token if st.session_state.room_seat else None
+    # The URL keeps the seat across refreshes
+    st.query_params.clear()
+    st.query_params['room'] = draft_id
+    if st.session_state.room_token:
+        st.query_params['token'] = st.session_state.room_token
+    use_upload(logged_upload_key(room.log))
+
+def open_room():
+    """Turn this session's draft into a draft room, with this session in the commissioner's seat"""
+    room = draft_rooms().open(st.session_state.draft_log, source_accounts(st.session_state))
+    st.session_state.draft_log = None
+    join_room(room.draft_id, room.tokens[ROOM_COMMISSIONER])
+
+def sync_room():
+    """Bring this seat's copy of the draft up to date with its room"""
+    return st.session_state.draft_room.sync(st.session_state, st.session_state.room_subscription)
+
+def room_poll_every():
+    """run_every for the live draft fragments: poll the room in a draft room, else only rerun on input"""
+    return ROOM_POLL_SECONDS if st.session_state.draft_room is not None else None
+
+def live_draft_page():
+    """(stage, whether the board is showing): the parts of the draft page outside its live fragments"""
+    state = st.session_state
+    drafting = state.current_pick < len(state.ae_list) * state.accounts_per_ae and len(state.account_pool) > 0
+    return state.stage, state.stage == 'draft' and drafting
+
+def follow_room():
+    """Apply other seats' new events before a live draft fragment redraws.
+
+    Picks and undos redraw only the live fragments (status, board, On the
+    Clock, history), each rerunning itself every ROOM_POLL_SECONDS; an event
+    that changes the page around them (another stage, the last pick) reruns
+    the whole page.
+    """
+    if st.session_state.draft_room is None or not len(st.session_state.room_subscription):
+        return
+    page = live_draft_page()
+    sync_room()
+    if live_draft_page() != page:
+        # Plain st.rerun: the page rerun records its own timings
+        st.rerun()
+
+def act(action, *args):
+    """Run a draft action (draft_account, undo_last_pick, ...) and return its result.
+
+    In a draft room the action runs on the room's shared draft instead; if
+    this seat may not do it now nothing happens and the seat is told why.
+    If another session resumed this draft and moved it on first, the action
+    is dropped and the draft reloaded from its log.
+    """
+    room = st.session_state.draft_room
+    if room is None:
+        try:
+            return action(st.session_state, *args)
+        except DraftLogConflict:
+            log, st.session_state.draft_log = st.session_state.draft_log, None
+            log.close()
+            resume_draft(log.draft_id)
+            st.session_state.draft_notice = "🔄 This draft moved on in another session, so it was reloaded"
+            rerun()
+    accepted, result = room.submit(st.session_state.room_token, action, *args)
+    sync_room()
+    if not accepted:
+        if st.session_state.room_seat is None:
+            st.session_state.draft_notice = "👀 You're watching: open your seat's invite link to draft"
+        elif action is not draft_account:
+            st.session_state.draft_notice = f"🔒 Only the {ROOM_COMMISSIONER.lower()} can do that"
+        elif args[0] is not None and not pick_allowed(st.session_state, args[0]):
+            st.session_state.draft_notice = f"🚧 That pick breaks {get_current_ae(st.session_state)}'s book rules"
+        else:
+            st.session_state.draft_notice = f"⏳ Not your pick, {st.session_state.room_seat}"
+    return result
+
+@st.fragment(run_every=ROOM_POLL_SECONDS)
+def room_status():
+    """Draft room line in the sidebar; shows other seats' moves within ROOM_POLL_SECONDS.
+
+    On the live draft page the events go to the live fragments; on any other
+    page they rerun the page.
+    """
+    room = st.session_state.draft_room
+    if len(st.session_state.room_subscription) and not live_draft_page()[1]:
+        # Plain st.rerun: a fragment run has no profiled rerun to finish
+        st.rerun()
+    follow_room()
+    on_clock = get_current_ae(st.session_state) if st.session_state.stage == 'draft' else None
+    st.caption(f"🏟️ Room `{room.draft_id}` • {room.seats} seats" + (f" • on the clock: **{on_clock}**" if on_clock else ''))
+
+def history_table(picks):
+    """Compact Draft History rows for a picks_frame, most recent first"""
+    picks = picks.iloc[::-1]
+    return pd.DataFrame({
+        '#': picks['pick_number'].to_numpy(),
+        'Round': picks['round'].to_numpy(),
+        'AE': picks['ae'].to_numpy(),
+        'Account': np.array(TIER_BADGES, dtype=object)[picks['tier_rank'].to_numpy()] + ' ' + picks['Account_Name'].astype(str).to_numpy(),
+        'Score': picks['ICP_score'].round(0).to_numpy(),
+    })
+
+def draft_history_view():
+    """(completed rounds table, current round picks_frame) for the live Draft History.
+
+    Round r is simply draft_picks[r * num_aes:(r + 1) * num_aes], so only the
+    current round is joined each rerun. Completed rounds are added to the
+    cached table once, as they complete; an undo back into a completed round
+    (the cached last round no longer matches) rebuilds it.
+    """
+    state = st.session_state
+    num_aes = len(state.draft_order)
+    done = len(state.draft_picks) // num_aes * num_aes
+    cache = state.history_cache
+    if cache is None or cache['picks'] > done or state.draft_picks[max(cache['picks'] - num_aes, 0):cache['picks']] != cache['last_round']:
+        cache = {'picks': 0, 'last_round': state.draft_picks[:0], 'table': history_table(picks_frame(state, 0, 0))}
+    if cache['picks'] < done:
+        cache = {
+            'picks': done,
+            'last_round': state.draft_picks[done - num_aes:done],
+            'table': pd.concat([history_table(picks_frame(state, cache['picks'], done)), cache['table']], ignore_index=True)
+        }
+    state.history_cache = cache
+    return cache['table'], picks_frame(state, done)
+
+def prepare_export(kind, build_frame):
+    """Build an export file in the chosen format, only when asked for, and keep it for the download button"""
+    fmt = st.session_state.export_format
+    extension, mime, _ = EXPORT_FORMATS[fmt]
+    with st.spinner("Preparing export..."):
+        buffer = io.BytesIO()
+        write_export(build_frame(), fmt, buffer)
+    file_name = f"draft_{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    st.session_state.exports[kind] = (fmt, file_name, buffer.getvalue(), mime)
+
+def export_download_button(kind, label):
+    """Download button for a prepared export, while it matches the chosen format"""
+    prepared = st.session_state.exports.get(kind)
+    if prepared and prepared[0] == st.session_state.export_format:
+        _, file_name, data, mime = prepared
+        st.download_button(label=label, data=data, file_name=file_name, mime=mime)
+
+def reset_board_page():
+    """Send the draft board back to page 1 (search or filter changed)"""
+    st.session_state.board_page = 0
+
+def set_board_page(page):
+    st.session_state.board_page = page
+
+def set_board_filter(filter_tier):
+    st.session_state.filter_tier = filter_tier
+    reset_board_page()
+
+def autocomplete_mode_radio():
+    """The Auto-complete mode picker; True if Balanced Books is chosen and can apply.
+
+    Under book rules every pick is the best account its AE may take, so
+    there is nothing for Balanced Books to spread and it is disabled.
+    """
+    ruled = st.session_state.book_limits is not None
+    mode = st.radio(
+        "Auto-complete mode", AUTOCOMPLETE_MODES, index=0 if ruled else AUTOCOMPLETE_MODES.index(st.session_state.autocomplete_mode),
+        horizontal=True, disabled=ruled,
+        help="Balanced Books drafts the same accounts but spreads them to even out each AE's Total Score and tier mix"
+    )
+    if ruled:
+        st.caption("🚧 Balanced Books is off while book rules are set: each pick is the best account its AE may take")
+        return False
+    st.session_state.autocomplete_mode = mode
+    return mode == 'Balanced Books'
+
+def board_handles(search_query, filter_tier, allowed_only=False, prefix=False):
+    """(handles on the board in draft order, search hit count, tier counts of the hits)
+
+    Read off the pool's availability and the tier_rank column without
+    materializing any rows, and memoized until the pool, search or filter
+    changes, so paging and re-renders cost nothing. prefix matches the search
+    against the start of names and IDs only. allowed_only keeps only
+    accounts the AE on the clock may take under the book rules: every hit is
+    filtered (the page count needs them all), with one gather over the hits'
+    rule groups. Without it, only the rows on the page are checked.
+    """
+    pool = st.session_state.account_pool
+    limits = st.session_state.book_limits
+    ae_idx = st.session_state.pick_schedule.ae_at(st.session_state.current_pick)
+    allowed_only = allowed_only and limits is not None and ae_idx is not None
+    key = (id(pool), pool.version, search_query, prefix, filter_tier, allowed_only, ae_idx)
+    cache = st.session_state.board_cache
+    if cache is None or cache[0] != key:
+        hits = st.session_state.search_index.search(search_query, prefix) if search_query else None
+        handles = pool.available_handles(hits)
+        if allowed_only:
+            handles = handles[limits.allowed_mask(handles, ae_idx)]
+        tier_ranks = st.session_state.accounts_df['tier_rank'].to_numpy()[handles]
+        if BOARD_FILTERS[filter_tier] is not None:
+            handles = handles[tier_ranks == BOARD_FILTERS[filter_tier]]
+        cache = st.session_state.board_cache = (key, handles, len(tier_ranks), tier_counts(tier_ranks))
+    return cache[1:]
+
+class RerunProfiler:
+    """Timed spans for each rerun, kept for the ⏱ Performance panel.
+
+    Spans nest and are recorded as offsets from the start of their rerun.
+    finish_rerun closes anything still open and stores the rerun with its
+    widget count; the last PERF_HISTORY reruns feed the rolling p50/p95.
+    """
+
+    def __init__(self):
+        self.reruns = deque(maxlen=PERF_HISTORY)
+        self._open = []  # (name, start) of unfinished spans
+        self._spans = []  # (name, offset, seconds, depth) finished this rerun
+        self._started = None
+
+    @property
+    def in_rerun(self):
+        return self._started is not None
+
+    def start_rerun(self, name='rerun'):
+        self._open, self._spans = [], []
+        self._started = time.perf_counter()
+        self._wall_start = time.time()
+        self.begin(name)
+
+    def begin(self, name):
+        self._open.append((name, time.perf_counter()))
+
+    def end(self):
+        if not self._open:
+            return  # already closed by finish_rerun (st.rerun inside a span)
+        name, start = self._open.pop()
+        self._spans.append((name, start - self._started, time.perf_counter() - start, len(self._open)))
+
+    @contextmanager
+    def span(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def finish_rerun(self, widgets):
+        if self._started is None:
+            return
+        while self._open:
+            self.end()
+        self.reruns.append({
+            'started': self._wall_start,
+            'seconds': time.perf_counter() - self._started,
+            'widgets': widgets,
+            'spans': self._spans
+        })
+        self._started = None
+
+    def stats(self):
+        """Calls, last, p50 and p95 milliseconds per span name over the kept reruns"""
+        spans = pd.DataFrame(
+            [(name, seconds * 1000) for rerun in self.reruns for name, _, seconds, _ in rerun['spans']],
+            columns=['Span', 'ms']
+        )
+        grouped = spans.groupby('Span', sort=False)['ms']
+        return pd.DataFrame({
+            'Calls': grouped.size(),
+            'Last ms': grouped.last(),
+            'p50 ms': grouped.median(),
+            'p95 ms': grouped.quantile(0.95),
+        }).round(2).reset_index()
+
+    def to_json(self):
+        return json.dumps({'reruns': [
+            {'started': rerun['started'], 'ms': rerun['seconds'] * 1000, 'widgets': rerun['widgets'],
+             'spans': [{'name': name, 'offset_ms': offset * 1000, 'ms': seconds * 1000, 'depth': depth}
+                       for name, offset, seconds, depth in rerun['spans']]}
+            for rerun in self.reruns
+        ]}, indent=2)
+
+    def to_chrome_trace(self):
+        """The kept reruns in Chrome trace format (chrome://tracing, Perfetto)"""
+        events = [
+            {'name': name, 'cat': 'rerun', 'ph': 'X', 'pid': 1, 'tid': 1,
+             'ts': (rerun['started'] + offset) * 1e6, 'dur': seconds * 1e6,
+             'args': {'widgets': rerun['widgets']} if name == 'rerun' else {}}
+            for rerun in self.reruns for name, offset, seconds, _ in rerun['spans']
+        ]
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+def perf_span(name):
+    """Time a block for the Performance panel (a no-op unless the panel is switched on)"""
+    if st.session_state.perf_enabled:
+        return st.session_state.profiler.span(name)
+    return nullcontext()
+
+def finish_profiling():
+    """Record this rerun in the Performance panel, if it is switched on"""
+    profiler = st.session_state.get('profiler')
+    if st.session_state.get('perf_enabled') and profiler is not None:
+        ctx = get_script_run_ctx()
+        profiler.finish_rerun(len(ctx.widget_ids_this_run) if ctx else 0)
+
+def profiled_fragment(name, run_every=None):
+    """st.fragment that the Performance panel times as a span of the full rerun,
+    or as its own entry when only the fragment reruns"""
+    def decorate(func):
+        @wraps(func)
+        def run():
+            profiler = st.session_state.profiler
+            if not st.session_state.perf_enabled or profiler is None or profiler.in_rerun:
+                with perf_span(name):
+                    return func()
+            profiler.start_rerun(name)
+            try:
+                return func()
+            finally:
+                finish_profiling()
+        return st.fragment(run, run_every=run_every)
+    return decorate
+
+def rerun():
+    """st.rerun, recording this rerun's timings first"""
+    finish_profiling()
+    st.rerun()
+
+# Per-rerun timing for the ⏱ Performance panel
+if st.session_state.perf_enabled:
+    if st.session_state.profiler is None:
+        st.session_state.profiler = RerunProfiler()
+    st.session_state.profiler.start_rerun()
+
+# Resume the draft named in the URL (browser refresh or a new session after a crash)
+if st.session_state.draft_log is None and 'draft' in st.query_params:
+    if st.query_params['draft'] in DraftLog.saved_drafts():
+        resume_draft(st.query_params['draft'])
+    else:
+        st.query_params.clear()
+
+# Follow the draft room named in the URL (a seat's invite link, or a refresh)
+if st.session_state.draft_room is None and 'room' in st.query_params:
+    if st.query_params['room'] in DraftLog.saved_drafts():
+        join_room(st.query_params['room'], st.query_params.get('token'))
+    else:
+        st.query_params.clear()
+if st.session_state.draft_room is not None:
+    sync_room()
+if st.session_state.draft_notice:
+    st.toast(st.session_state.draft_notice)
+    st.session_state.draft_notice = None
 
 # Sidebar - draft status
-with st.sidebar:
+with st.sidebar, perf_span('sidebar'):
     st.header("📊 Draft Status")
     
     if st.session_state.stage == 'draft':
-        num_aes = len(st.session_state.ae_list)
-        total_picks = num_aes * st.session_state.accounts_per_ae
-        current = st.session_state.current_pick
-        current_round = (current // num_aes) + 1
-        picks_in_round = (current % num_aes) + 1
-        
-        st.metric("Current Pick", f"{current + 1} of {total_picks}")
-        st.metric("Round", current_round)
-        st.metric("Pick in Round", f"{picks_in_round} of {num_aes}")
-        
-        current_ae = get_current_ae()
-        if current_ae:
-            st.info(f"**Now Picking:** {current_ae}")
-            ae_picks = len(st.session_state.ae_books[current_ae])
-            st.metric(f"{current_ae}'s Picks", ae_picks)
-        
-        st.markdown("---")
-        st.metric("Accounts Left", len(st.session_state.available_accounts))
+        @profiled_fragment('draft_status', run_every=room_poll_every())
+        def draft_status():
+            follow_room()
+            num_aes = len(st.session_state.ae_list)
+            total_picks = num_aes * st.session_state.accounts_per_ae
+            current = st.session_state.current_pick
+            current_round = (current // num_aes) + 1
+            picks_in_round = (current % num_aes) + 1
+            
+            st.metric("Current Pick", f"{current + 1} of {total_picks}")
+            st.metric("Round", current_round)
+            st.metric("Pick in Round", f"{picks_in_round} of {num_aes}")
+            
+            current_ae = get_current_ae(st.session_state)
+            if current_ae:
+                st.info(f"**Now Picking:** {current_ae}")
+                ae_picks = len(st.session_state.ae_books[current_ae])
+                st.metric(f"{current_ae}'s Picks", ae_picks)
+            
+            st.markdown("---")
+            st.metric("Accounts Left", len(st.session_state.account_pool))
+
+        draft_status()
     
     if st.session_state.stage in ['draft', 'results']:
         st.metric("AEs", len(st.session_state.ae_list))
-        st.metric("Type", "Snake" if st.session_state.is_snake else "Linear")
+        st.metric("Type", st.session_state.draft_type)
+
+    if st.session_state.draft_room is not None:
+        st.markdown("---")
+        st.subheader("🏟️ Draft Room")
+        room_status()
+        if st.session_state.room_seat is None:
+            st.caption("👀 Watching: open your seat's invite link to draft")
+        else:
+            st.caption(f"Your seat: **{st.session_state.room_seat}**")
+        if st.session_state.room_seat == ROOM_COMMISSIONER:
+            with st.expander("Invite links"):
+                st.caption("Append to this app's URL. Send each AE only their own: the link is their seat.")
+                room = st.session_state.draft_room
+                st.code("\n".join(f"{ae}: ?{urlencode({'room': room.draft_id, 'token': room.tokens[ae]})}"
+                                  for ae in st.session_state.draft_order), language=None)
+    elif st.session_state.draft_log is not None and st.session_state.stage in ['cleanup', 'draft']:
+        st.markdown("---")
+        if st.button("🏟️ Open Draft Room", help="Let each AE follow the draft and make their own picks from their own browser"):
+            open_room()
+            rerun()
+
+if st.session_state.perf_enabled:
+    st.session_state.profiler.begin(f"stage:{st.session_state.stage}")
 
 # =============================================================================
 # STAGE 1: CSV UPLOAD
@@ -145,38 +705,46 @@ if st.session_state.stage == 'upload':
     - **CXP Swat Tier** — Tier (Tier 1, Tier 2, or blank)
     """)
 
+    saved_drafts = DraftLog.saved_drafts()
+    if saved_drafts:
+        with st.expander(f"♻️ Resume a saved draft ({len(saved_drafts)})"):
+            draft_id = st.selectbox("Saved draft", saved_drafts)
+            if st.button("Resume Draft"):
+                resume_draft(draft_id)
+                rerun()
+
     uploaded_file = st.file_uploader("Choose CSV file", type=['csv'])
 
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
-            df.columns = df.columns.str.strip().str.replace(' ', '_')
+            # Only the header is read until every field is mapped
+            header = read_csv_header(uploaded_file)
 
             st.subheader("Map Columns")
-            available_columns = [''] + df.columns.tolist()
+            available_columns = [''] + list(header)
 
             col1, col2 = st.columns(2)
             with col1:
                 account_name_col = st.selectbox(
                     "Account Name",
                     available_columns,
-                    index=next((i for i, c in enumerate(available_columns) if 'company' in c.lower() and 'name' in c.lower()), 0)
+                    index=available_columns.index(guess_column(header, 'Account_Name'))
                 )
                 account_id_col = st.selectbox(
                     "Account ID",
                     available_columns,
-                    index=next((i for i, c in enumerate(available_columns) if 'salesforce' in c.lower() and 'id' in c.lower()), 0)
+                    index=available_columns.index(guess_column(header, 'Account_ID'))
                 )
             with col2:
                 account_score_col = st.selectbox(
                     "ICP Score",
                     available_columns,
-                    index=next((i for i, c in enumerate(available_columns) if 'icp' in c.lower() and 'score' in c.lower()), 0)
+                    index=available_columns.index(guess_column(header, 'ICP_score'))
                 )
                 tier_col = st.selectbox(
                     "CXP Swat Tier",
                     available_columns,
-                    index=next((i for i, c in enumerate(available_columns) if 'cxp' in c.lower() and 'tier' in c.lower()), 0)
+                    index=available_columns.index(guess_column(header, 'CXP_Swat_Tier'))
                 )
             
             col3, col4 = st.columns(2)
@@ -184,7 +752,14 @@ if st.session_state.stage == 'upload':
                 reasoning_col = st.selectbox(
                     "ICP Reasoning (optional)",
                     available_columns,
-                    index=next((i for i, c in enumerate(available_columns) if 'reasoning' in c.lower()), 0)
+                    index=available_columns.index(guess_column(header, 'ICP_Reasoning'))
+                )
+            with col4:
+                extra_cols = st.multiselect(
+                    "Extra columns to keep (optional)",
+                    list(header),
+                    default=[c for c in DEFAULT_EXTRA_COLUMNS if c in header],
+                    help="Everything else in the file is skipped while loading"
                 )
 
             required = {'Account_Name': account_name_col, 'Account_ID': account_id_col, 'ICP_score': account_score_col, 'CXP_Swat_Tier': tier_col}
@@ -193,46 +768,58 @@ if st.session_state.stage == 'upload':
             if missing:
                 st.warning(f"⚠️ Map all fields: {', '.join(missing)}")
             else:
-                df_mapped = df.copy()
-                for std_name, user_col in required.items():
-                    df_mapped[std_name] = df[user_col]
-                
+                columns = {std_name: header[user_col] for std_name, user_col in required.items()}
                 # Map optional reasoning column
                 if reasoning_col:
-                    df_mapped['ICP_Reasoning'] = df[reasoning_col]
-                else:
-                    df_mapped['ICP_Reasoning'] = ''
-
-                df_mapped['ICP_score'] = pd.to_numeric(df_mapped['ICP_score'], errors='coerce')
-                df_mapped = df_mapped.dropna(subset=['ICP_score'])
-                df_mapped['CXP_Swat_Tier'] = df_mapped['CXP_Swat_Tier'].fillna('')
+                    columns['ICP_Reasoning'] = header[reasoning_col]
+                # Skip file columns already mapped above, and names a standard column already uses
+                extras = {col: header[col] for col in extra_cols if header[col] not in columns.values() and col not in columns}
+
+                # Mapping tweaks and re-uploads of the same file reuse the parsed frame
+                cache_key = (file_content_hash(uploaded_file), tuple(columns.items()), tuple(extras.items()))
+                progress = st.progress(0.0, text="Reading accounts...")
+                df_mapped = load_accounts_cached(
+                    *cache_key, uploaded_file,
+                    lambda done: progress.progress(done, text=f"Reading accounts... {done:.0%}")
+                )
+                progress.empty()
 
                 st.session_state.accounts_df = df_mapped
+                st.session_state.families = None
                 st.success(f"✅ Loaded {len(df_mapped)} accounts")
+                duplicate_ids = int(df_mapped['Account_ID'].duplicated().sum())
+                if duplicate_ids:
+                    st.warning(f"⚠️ {duplicate_ids} row(s) repeat an earlier Account_ID. ID lists (retention, blacklists, queues) match every copy.")
 
                 st.subheader("Preview")
                 st.dataframe(df_mapped[['Account_Name', 'Account_ID', 'ICP_score', 'CXP_Swat_Tier']].head(10), use_container_width=True)
 
+                t1, t2, unranked = tier_counts(df_mapped['tier_rank'])
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
                     st.metric("Total", len(df_mapped))
                 with col2:
-                    t1 = (df_mapped['CXP_Swat_Tier'].str.contains('Tier 1', case=False, na=False)).sum()
                     st.metric("Tier 1", t1)
                 with col3:
-                    t2 = (df_mapped['CXP_Swat_Tier'].str.contains('Tier 2', case=False, na=False)).sum()
                     st.metric("Tier 2", t2)
                 with col4:
-                    unranked = len(df_mapped) - t1 - t2
                     st.metric("Unranked", unranked)
 
                 if st.button("➡️ Next: Setup", type="primary"):
+                    st.session_state.search_index = search_index_cached(*cache_key, False, df_mapped)
+                    if 'Parent_Account_ID' in df_mapped.columns:
+                        # Group parent/child families now, so drafting by family starts instantly
+                        families_cached(*cache_key, df_mapped)
+                    st.session_state.upload_key = cache_key
                     st.session_state.stage = 'setup'
-                    st.rerun()
 
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
 
+        # st.rerun raises to stop the script, so it must not run inside the try above
+        if st.session_state.stage == 'setup':
+            rerun()
+
 # =============================================================================
 # STAGE 2: SETUP
 # =============================================================================
@@ -248,7 +835,7 @@ elif st.session_state.stage == 'setup':
         # Default AEs button
         if st.button("📋 Use Default Team (Alexa Pass, Lindsay Kelvie, Paul Kellum, Travis Pederson)", use_container_width=True, key="default_aes"):
             st.session_state.ae_list = list(AE_SFDC_IDS.keys())
-            st.rerun()
+            rerun()
         
         ae_input = st.text_area(
             "AE Names",
@@ -267,8 +854,9 @@ elif st.session_state.stage == 'setup':
 
     with col2:
         st.subheader("Settings")
-        draft_type = st.radio("Draft Type", ["Snake", "Linear"])
-        st.session_state.is_snake = (draft_type == "Snake")
+        # Settings widgets here and below stay unkeyed and copy their value into session_state:
+        # a widget key's state is dropped on runs that don't draw it, and settings must outlive that
+        st.session_state.draft_type = st.radio("Draft Type", DRAFT_TYPES)
         
         st.session_state.accounts_per_ae = st.number_input(
             "Accounts per AE",
@@ -276,18 +864,84 @@ elif st.session_state.stage == 'setup':
             max_value=100,
             value=st.session_state.accounts_per_ae
         )
+        
+        custom_slots_input = st.text_area(
+            "Custom pick slots (optional)",
+            placeholder="12: Paul Kellum",
+            help="Keeper or traded slots, one 'pick#: AE name' per line. Overrides who makes that pick."
+        )
+
+        book_rules_input = st.text_area(
+            "Book rules (optional)",
+            placeholder="Industry <= 3\nPaul Kellum: Billing_State in NY, NJ >= 5",
+            help=f"Per-AE caps ('<= N' per value, or 'in A, B <= N' for listed values) and quotas ('in A, B >= N') "
+                 f"on {', '.join(BOOK_RULE_COLUMNS)}, one per line; prefix 'AE name:' for one AE. "
+                 "Enforced on every pick, Auto-Best and auto-complete."
+        )
+
+        if 'Parent_Account_ID' in source_accounts(st.session_state).columns:
+            st.session_state.draft_families = st.checkbox(
+                "👪 Draft families together", value=st.session_state.draft_families,
+                help="Each pick takes a parent account and all of its children, ranked by the family's total ICP score. "
+                     "Picks per AE and book rules then count families (rules go by the head account's values); "
+                     "standings count every account."
+            )
+        else:
+            st.session_state.draft_families = False
 
     st.markdown("---")
 
+    ae_slots = None
+    if custom_slots_input:
+        ae_slots, slot_errors = parse_custom_slots(
+            custom_slots_input, st.session_state.ae_list, len(st.session_state.ae_list) * st.session_state.accounts_per_ae
+        )
+        for error in slot_errors:
+            st.warning(f"⚠️ Ignoring custom slot {error}")
+
+    book_rules = []
+    if book_rules_input:
+        rule_columns = [column for column in BOOK_RULE_COLUMNS if column in source_accounts(st.session_state).columns]
+        book_rules, rule_errors = parse_book_rules(book_rules_input, st.session_state.ae_list, rule_columns)
+        for error in rule_errors:
+            st.warning(f"⚠️ Ignoring book rule {error}")
+        if book_rules and st.session_state.draft_families:
+            st.caption("👪 Drafting by family, book rules count each family once, by its head account's values.")
+
     if st.session_state.ae_list and len(st.session_state.ae_list) >= 2:
+        with st.expander("🎰 Simulate Draft-Order Luck"):
+            st.caption("Auto-completes the draft under many random orders and shows how each AE's final standings vary.")
+            num_sims = st.number_input("Simulations", min_value=100, max_value=100_000, value=2000, step=100)
+            if st.button("Run Simulation"):
+                use_families(st.session_state.draft_families)
+                sims = simulate_draft_orders(
+                    st.session_state.accounts_df, st.session_state.ae_list, st.session_state.accounts_per_ae,
+                    st.session_state.draft_type, ae_slots, num_sims=num_sims, families=st.session_state.families
+                )
+                st.markdown("**By AE**")
+                st.dataframe(simulation_summary(sims).round(1), use_container_width=True, hide_index=True)
+                st.markdown("**By draft slot**")
+                st.dataframe(simulation_summary(sims, by='Draft Slot').round(1), use_container_width=True, hide_index=True)
+
         if st.button("🎲 Generate Draft Order & Continue", type="primary", use_container_width=True):
-            st.session_state.draft_order = np.random.permutation(st.session_state.ae_list).tolist()
-            accounts_list = st.session_state.accounts_df.to_dict('records')
-            st.session_state.available_accounts = sort_accounts_by_tier(accounts_list)
-            st.session_state.draft_picks = []
-            st.session_state.current_pick = 0
-            st.session_state.stage = 'cleanup'
-            st.rerun()
+            use_families(st.session_state.draft_families)
+            st.session_state.book_rules = book_rules
+            draft_order = np.random.permutation(st.session_state.ae_list).tolist()
+            custom_slots, _ = parse_custom_slots(
+                custom_slots_input, draft_order, len(draft_order) * st.session_state.accounts_per_ae
+            )
+            start_draft(st.session_state, draft_order, custom_slots)
+            st.session_state.history_cache = None
+            if st.session_state.draft_log is not None:
+                st.session_state.draft_log.close()
+            st.session_state.draft_log = DraftLog.create(
+                source_accounts(st.session_state),
+                draft_config(st.session_state, custom_slots, upload_key=st.session_state.upload_key)
+            )
+            # A browser refresh picks the draft back up from its log
+            st.query_params['draft'] = st.session_state.draft_log.draft_id
+            set_stage(st.session_state, 'cleanup')
+            rerun()
     else:
         st.warning("⚠️ Enter at least 2 AEs")
 
@@ -296,22 +950,83 @@ elif st.session_state.stage == 'setup':
 # =============================================================================
 elif st.session_state.stage == 'cleanup':
     st.header("🚫 Step 3: Blacklist Accounts (Optional)")
-    st.markdown("Review top 50 accounts and exclude any with poor data quality. Or skip to start drafting immediately.")
+    st.markdown("Exclude whole segments by rule, review the top 50 accounts for poor data quality, or skip to start drafting immediately.")
 
     # SKIP BUTTON AT TOP
     if st.button("⏭️ Skip Blacklist → Start Draft", type="primary", use_container_width=True):
-        st.session_state.stage = 'draft'
-        st.rerun()
+        act(set_stage, 'draft')
+        rerun()
     
     st.markdown("---")
 
     st.info(f"**Draft Order:** {' → '.join(st.session_state.draft_order)}")
-    st.metric("Available Accounts", len(st.session_state.available_accounts))
+    pool = st.session_state.account_pool
+    st.metric("Available Accounts", len(pool))
+
+    st.markdown("---")
+
+    st.subheader("Exclusion Rules")
+    st.caption("Exclude every account matching any rule. The impact is previewed before anything is removed.")
+    accounts_df = st.session_state.accounts_df
+    rules = []
+    rule_columns = [column for column in EXCLUSION_COLUMNS if column in accounts_df.columns]
+    for rule_col, column in zip(st.columns(max(len(rule_columns), 1)), rule_columns):
+        with rule_col:
+            values = accounts_df[column]
+            options = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else values.dropna().unique()
+            selected = st.multiselect(column.replace('_', ' '), sorted(map(str, options)))
+            if selected:
+                rules.append((column, selected))
+    rule_col1, rule_col2 = st.columns(2)
+    with rule_col1:
+        if 'Parent_Account_ID' in accounts_df.columns:
+            parent_ids = st.text_area("Parent Account IDs", placeholder="One per line or comma-separated",
+                                      help="Excludes each parent account and every account under it, at any depth")
+            parent_ids = parent_ids.replace(',', ' ').split()
+            if parent_ids:
+                rules.append(('Parent_Account_ID', parent_ids))
+    with rule_col2:
+        id_list = st.file_uploader("Exclusion list", type=['csv', 'txt'], help="Account IDs in the first column")
+        if id_list is not None:
+            rules.append(('Account_ID', read_id_list(id_list)))
+
+    if rules:
+        with perf_span('exclusion_preview'):
+            excluded, impact = exclusion_impact(st.session_state, rules)
+        st.dataframe(impact, hide_index=True, use_container_width=True)
+        if st.button(f"🚫 Exclude {len(excluded):,} Accounts", disabled=not len(excluded)):
+            act(blacklist_accounts, excluded)
+            rerun()
 
     st.markdown("---")
 
-    available_df = pd.DataFrame(st.session_state.available_accounts)
-    display_df = available_df[['Account_Name', 'Account_ID', 'ICP_score', 'CXP_Swat_Tier']].head(50).copy()
+    st.subheader("📝 Autodraft Queues")
+    st.caption("Each AE's wishlist, most wanted first. When that AE is on the clock, Auto-Best and auto-complete "
+               "draft their first queued account still available, then fall back to the best available.")
+    draft_order = st.session_state.draft_order
+    queue_col1, queue_col2 = st.columns(2)
+    with queue_col1:
+        seat = st.session_state.room_seat if st.session_state.draft_room is not None else None
+        queue_ae = st.selectbox("AE", draft_order, index=draft_order.index(seat) if seat in draft_order else 0)
+        queue_ids = st.text_area("Account IDs", placeholder="Most wanted first, one per line or comma-separated")
+    with queue_col2:
+        queue_file = st.file_uploader("...or upload a queue", type=['csv', 'txt'], help="Account IDs in the first column, most wanted first")
+    if st.button(f"💾 Save {queue_ae}'s Queue", help="Saving an empty queue clears it"):
+        ids = read_id_list(queue_file) if queue_file is not None else queue_ids.replace(',', ' ').split()
+        act(set_queue, queue_ae, draft_handles_for_ids(st.session_state, ids))
+        rerun()
+    queues = st.session_state.ae_queues
+    if queues:
+        next_up = [autodraft_pick(st.session_state, ae) for ae in queues]
+        st.dataframe(pd.DataFrame({
+            'AE': list(queues),
+            'Queued': [len(queue) for queue in queues.values()],
+            'Next Up': [accounts_df['Account_Name'].iat[handle] if handle is not None else '—' for handle in next_up],
+        }), use_container_width=True, hide_index=True)
+
+    st.markdown("---")
+
+    display_df = pool.head(50)[['Account_Name', 'Account_ID', 'ICP_score', 'CXP_Swat_Tier']].copy()
     display_df['Remove'] = False
 
     st.subheader("Top 50 Accounts (Optional Blacklist)")
@@ -323,14 +1038,9 @@ elif st.session_state.stage == 'cleanup':
         hide_index=True
     )
 
-    for idx, row in edited_df.iterrows():
-        if row['Remove']:
-            st.session_state.blacklisted_accounts.add(row['Account_ID'])
-
-    st.session_state.available_accounts = [
-        acc for acc in st.session_state.available_accounts
-        if acc['Account_ID'] not in st.session_state.blacklisted_accounts
-    ]
+    removed = edited_df.index[edited_df['Remove']]
+    if len(removed):
+        act(blacklist_accounts, removed)
 
     st.metric("Blacklisted", len(st.session_state.blacklisted_accounts))
 
@@ -339,16 +1049,16 @@ elif st.session_state.stage == 'cleanup':
     col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("⬅️ Back"):
-            st.session_state.stage = 'setup'
-            st.rerun()
+            act(set_stage, 'setup')
+            rerun()
     with col2:
         if st.button("⏭️ Skip", use_container_width=True):
-            st.session_state.stage = 'draft'
-            st.rerun()
+            act(set_stage, 'draft')
+            rerun()
     with col3:
         if st.button("▶️ Start Draft", type="primary", use_container_width=True):
-            st.session_state.stage = 'draft'
-            st.rerun()
+            act(set_stage, 'draft')
+            rerun()
 
 # =============================================================================
 # STAGE 4: LIVE DRAFT - SLEEPER/YAHOO STYLE
@@ -360,162 +1070,196 @@ elif st.session_state.stage == 'draft':
     total_picks = num_aes * st.session_state.accounts_per_ae
     current_pick = st.session_state.current_pick
     current_round = (current_pick // num_aes) + 1
-    current_ae = get_current_ae()
+    current_ae = get_current_ae(st.session_state)
+    pool = st.session_state.account_pool
 
     # TOP STATUS BAR - Professional layout with better hierarchy
-    st.markdown(f"""
-    <div style="background-color: #f0f2f6; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-        <div style="display: flex; justify-content: space-between; align-items: center;">
-            <div>
-                <h3 style="margin: 0; color: #1f77b4;">🔴 {current_ae if current_ae else 'TBD'} is Picking</h3>
-                <p style="margin: 5px 0; color: #555; font-size: 14px;">Round {current_round} • Pick {current_pick + 1} of {total_picks}</p>
-            </div>
-            <div style="text-align: right;">
-                <p style="margin: 0; font-size: 24px; font-weight: bold; color: #1f77b4;">{len(st.session_state.available_accounts)}</p>
-                <p style="margin: 5px 0; color: #555; font-size: 14px;">Accounts Available</p>
+    # In a draft room the status bar, board, On the Clock and history redraw on their own as other seats pick
+    @profiled_fragment('draft_banner', run_every=room_poll_every())
+    def draft_banner():
+        follow_room()
+        current_pick = st.session_state.current_pick
+        current_round = (current_pick // num_aes) + 1
+        current_ae = get_current_ae(st.session_state)
+        st.markdown(f"""
+        <div style="background-color: #f0f2f6; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+            <div style="display: flex; justify-content: space-between; align-items: center;">
+                <div>
+                    <h3 style="margin: 0; color: #1f77b4;">🔴 {current_ae if current_ae else 'TBD'} is Picking</h3>
+                    <p style="margin: 5px 0; color: #555; font-size: 14px;">Round {current_round} • Pick {current_pick + 1} of {total_picks}</p>
+                </div>
+                <div style="text-align: right;">
+                    <p style="margin: 0; font-size: 24px; font-weight: bold; color: #1f77b4;">{len(st.session_state.account_pool)}</p>
+                    <p style="margin: 5px 0; color: #555; font-size: 14px;">Accounts Available</p>
+                </div>
             </div>
         </div>
-    </div>
-    """, unsafe_allow_html=True)
+        """, unsafe_allow_html=True)
 
-    if current_pick < total_picks and len(st.session_state.available_accounts) > 0:
+    draft_banner()
+
+    if current_pick < total_picks and len(pool) > 0:
         
         # MAIN DRAFT BOARD
         col_board, col_sidebar = st.columns([3, 1])
         
         # ===== LEFT: MAIN BOARD =====
-        with col_board:
+        # Search, filters, paging and row selection rerun only the board; a pick reruns the page
+        @profiled_fragment('draft_board', run_every=room_poll_every())
+        def draft_board():
+            follow_room()
+            current_pick = st.session_state.current_pick
+            current_ae = get_current_ae(st.session_state)
             st.subheader("📋 Available Accounts", divider="blue")
             
             # SEARCH BOX
-            search_query = st.text_input(
-                "🔍 Search by name or ID",
-                placeholder="e.g., 'Shapellx' or '001Vr000'",
-                label_visibility="collapsed"
-            )
+            col_search, col_prefix, col_view = st.columns([4, 1, 1.2], gap="small")
+            with col_search:
+                search_query = st.text_input(
+                    "🔍 Search by name or ID",
+                    placeholder="e.g., 'Shapellx' or '001Vr000'",
+                    label_visibility="collapsed",
+                    on_change=reset_board_page
+                )
+            with col_prefix:
+                st.toggle("Starts with", key="board_prefix", on_change=reset_board_page,
+                          help="Match only names or IDs that start with the search")
+            with col_view:
+                st.radio("Board view", ["Table", "Cards"], key="board_view", horizontal=True, label_visibility="collapsed")
+            limits = st.session_state.book_limits
+            if limits is not None:
+                st.toggle(f"🚧 Only accounts {current_ae} may take", key="board_allowed_only", on_change=reset_board_page,
+                          help="Hide accounts that would break the book rules")
             
             # FILTER TABS - with better styling
-            available_df = pd.DataFrame(st.session_state.available_accounts)
-            
-            # Apply search first if provided
-            if search_query:
-                search_lower = search_query.lower()
-                search_df = available_df[
-                    (available_df['Account_Name'].str.lower().str.contains(search_lower, na=False)) |
-                    (available_df['Account_ID'].str.lower().str.contains(search_lower, na=False))
-                ]
-            else:
-                search_df = available_df
-            
-            tier1_count = (search_df['CXP_Swat_Tier'].str.contains('Tier 1', case=False, na=False)).sum()
-            tier2_count = (search_df['CXP_Swat_Tier'].str.contains('Tier 2', case=False, na=False)).sum()
-            unranked_count = len(search_df) - tier1_count - tier2_count
+            # Search and tier filter are memoized until the pool changes
+            with perf_span('search'):
+                filtered, search_total, (tier1_count, tier2_count, unranked_count) = board_handles(
+                    search_query, st.session_state.filter_tier, st.session_state.board_allowed_only,
+                    st.session_state.board_prefix
+                )
             
             filter_col1, filter_col2, filter_col3, filter_col4 = st.columns(4, gap="small")
             
             with filter_col1:
-                if st.button(f"📊 All ({len(search_df)})", use_container_width=True, key="filter_all"):
-                    st.session_state.filter_tier = 'all'
+                st.button(f"📊 All ({search_total})", use_container_width=True, key="filter_all",
+                          on_click=set_board_filter, args=('all',))
             with filter_col2:
-                if st.button(f"🟡 Tier 1 ({tier1_count})", use_container_width=True, key="filter_t1"):
-                    st.session_state.filter_tier = 'tier1'
+                st.button(f"🟡 Tier 1 ({tier1_count})", use_container_width=True, key="filter_t1",
+                          on_click=set_board_filter, args=('tier1',))
             with filter_col3:
-                if st.button(f"🟢 Tier 2 ({tier2_count})", use_container_width=True, key="filter_t2"):
-                    st.session_state.filter_tier = 'tier2'
+                st.button(f"🟢 Tier 2 ({tier2_count})", use_container_width=True, key="filter_t2",
+                          on_click=set_board_filter, args=('tier2',))
             with filter_col4:
-                if st.button(f"⚪ Unranked ({unranked_count})", use_container_width=True, key="filter_unr"):
-                    st.session_state.filter_tier = 'unranked'
+                st.button(f"⚪ Unranked ({unranked_count})", use_container_width=True, key="filter_unr",
+                          on_click=set_board_filter, args=('unranked',))
             
             st.markdown("---")
             
-            # Apply tier filter on top of search
-            if st.session_state.filter_tier == 'tier1':
-                filtered_df = search_df[search_df['CXP_Swat_Tier'].str.contains('Tier 1', case=False, na=False)]
-            elif st.session_state.filter_tier == 'tier2':
-                filtered_df = search_df[search_df['CXP_Swat_Tier'].str.contains('Tier 2', case=False, na=False)]
-            elif st.session_state.filter_tier == 'unranked':
-                filtered_df = search_df[
-                    (search_df['CXP_Swat_Tier'].str.contains('Tier 1', case=False, na=False) == False) &
-                    (search_df['CXP_Swat_Tier'].str.contains('Tier 2', case=False, na=False) == False)
-                ]
-            else:
-                filtered_df = search_df
-            
-            # Show first N accounts (growing with Load More button)
-            display_df = filtered_df.head(st.session_state.accounts_shown)
+            # Only one page is ever rendered (and only its rows are read), however deep the user browses
+            num_pages = max(1, -(-len(filtered) // BOARD_PAGE_SIZE))
+            page = min(st.session_state.board_page, num_pages - 1)
+            page_start = page * BOARD_PAGE_SIZE
+            display_df = st.session_state.accounts_df.take(filtered[page_start:page_start + BOARD_PAGE_SIZE])
+            ae_idx = st.session_state.pick_schedule.ae_at(current_pick)
+            allowed = (np.ones(len(display_df), dtype=bool) if limits is None or ae_idx is None
+                       else limits.allowed_mask(display_df.index.to_numpy(), ae_idx))
             
             # Info message
             if search_query:
-                st.caption(f"🔍 Found {len(filtered_df)} account(s) matching '{search_query}'")
-            if len(filtered_df) > st.session_state.accounts_shown:
-                st.caption(f"📌 Showing {len(display_df)} of {len(filtered_df)} accounts")
+                units = "account(s)" if st.session_state.families is None else "family(ies) with an account"
+                match = "starting with" if st.session_state.board_prefix else "matching"
+                st.caption(f"🔍 Found {len(filtered)} {units} {match} '{search_query}'")
             
-            # ACCOUNT TABLE with clickable draft buttons - improved connection
-            for idx, (_, acc) in enumerate(display_df.iterrows()):
-                badge = tier_badge(acc['CXP_Swat_Tier'])
-                tier_text = tier_name(acc['CXP_Swat_Tier'])
-                
-                # Account header with pick button in same row
-                col_rank, col_info, col_button = st.columns([0.5, 4, 1.2], gap="small")
-                
-                with col_rank:
-                    st.markdown(f"<span style='font-size: 16px; font-weight: bold; color: #1f77b4;'>{idx + 1}</span>", unsafe_allow_html=True)
-                
-                with col_info:
-                    st.markdown(f"{badge} **{acc['Account_Name']}**")
-                    st.caption(f"Score: {acc['ICP_score']:.0f} | {tier_text} | ID: {acc['Account_ID']}")
-                
-                with col_button:
-                    if st.button(f"📍 PICK", key=f"draft_{idx}_{acc['Account_ID']}", use_container_width=True):
-                        st.session_state.draft_picks.append({
-                            'pick_number': current_pick + 1,
-                            'round': current_round,
-                            'ae': current_ae,
-                            'account_name': acc['Account_Name'],
-                            'account_id': acc['Account_ID'],
-                            'icp_score': acc['ICP_score'],
-                            'tier': acc.get('CXP_Swat_Tier', '')
-                        })
-                        st.session_state.ae_books[current_ae].append(acc['Account_ID'])
-                        st.session_state.available_accounts = [
-                            a for a in st.session_state.available_accounts
-                            if a['Account_ID'] != acc['Account_ID']
-                        ]
-                        st.session_state.current_pick += 1
-                        st.rerun()
-                
-                # Show ICP reasoning if available
-                if acc.get('ICP_Reasoning', ''):
-                    st.caption(f"💡 {acc['ICP_Reasoning']}")
-                
-                st.divider()
+            with perf_span(f"board_{st.session_state.board_view.lower()}"):
+                if st.session_state.board_view == 'Table':
+                    # ACCOUNT TABLE - one dataframe per page, pick the selected row
+                    board_table = pd.DataFrame({
+                        '#': np.arange(page_start + 1, page_start + len(display_df) + 1),
+                        'Account': np.array(TIER_BADGES, dtype=object)[display_df['tier_rank'].to_numpy()] + ' ' + display_df['Account_Name'].astype(str).to_numpy(),
+                        'Score': display_df['ICP_score'].round(0).to_numpy(),
+                        'Tier': np.array(TIER_NAMES, dtype=object)[display_df['tier_rank'].to_numpy()],
+                        'ID': display_df['Account_ID'].to_numpy(),
+                        'ICP Reasoning': display_df['ICP_Reasoning'].fillna('').to_numpy(),
+                    })
+                    if limits is not None:
+                        board_table.insert(1, 'Rules', np.where(allowed, '', '🚧'))
+                    # Keying on the handles shown clears a stale selection whenever the rows change
+                    # (a pick, page, filter, search or either toggle)
+                    board_event = st.dataframe(
+                        board_table,
+                        use_container_width=True,
+                        hide_index=True,
+                        on_select="rerun",
+                        selection_mode="single-row",
+                        key=f"board_{hash(display_df.index.to_numpy().tobytes())}"
+                    )
+                    selected_rows = board_event.selection.rows
+                    selected = display_df.index[selected_rows[0]] if selected_rows else None
+                    pick_label = f"📍 PICK {display_df.at[selected, 'Account_Name']}" if selected is not None else "📍 PICK (select a row)"
+                    blocked = selected is not None and not allowed[selected_rows[0]]
+                    if blocked:
+                        pick_label = f"🚧 {display_df.at[selected, 'Account_Name']} breaks {current_ae}'s book rules"
+                    if st.button(pick_label, type="primary", use_container_width=True, disabled=selected is None or blocked, key="pick_selected"):
+                        act(draft_account, selected)
+                        rerun()
+                else:
+                    # ACCOUNT CARDS with clickable draft buttons - improved connection
+                    for idx, (handle, acc) in enumerate(display_df.iterrows(), start=page_start):
+                        badge = tier_badge(acc['tier_rank'])
+                        tier_text = tier_name(acc['tier_rank'])
+                    
+                        # Account header with pick button in same row
+                        col_rank, col_info, col_button = st.columns([0.5, 4, 1.2], gap="small")
+                    
+                        with col_rank:
+                            st.markdown(f"<span style='font-size: 16px; font-weight: bold; color: #1f77b4;'>{idx + 1}</span>", unsafe_allow_html=True)
+                    
+                        with col_info:
+                            st.markdown(f"{badge} **{acc['Account_Name']}**")
+                            st.caption(f"Score: {acc['ICP_score']:.0f} | {tier_text} | ID: {acc['Account_ID']}")
+                    
+                        with col_button:
+                            if st.button(f"📍 PICK", key=f"draft_{idx}_{acc['Account_ID']}", use_container_width=True,
+                                         disabled=not allowed[idx - page_start], help=None if allowed[idx - page_start] else "Breaks the book rules"):
+                                act(draft_account, handle)
+                                rerun()
+                    
+                        # Show ICP reasoning if available
+                        if acc.get('ICP_Reasoning', ''):
+                            st.caption(f"💡 {acc['ICP_Reasoning']}")
+                    
+                        st.divider()
             
-            # Load More button if there are more accounts
-            if len(filtered_df) > st.session_state.accounts_shown:
-                col1, col2, col3 = st.columns([1, 2, 1])
-                with col2:
-                    if st.button(f"📂 Load More ({len(filtered_df) - st.session_state.accounts_shown} remaining)", use_container_width=True):
-                        st.session_state.accounts_shown += 50
-                        st.rerun()
+            # PAGINATION
+            if num_pages > 1:
+                col_prev, col_page, col_next = st.columns([1, 2, 1])
+                with col_prev:
+                    st.button("⬅️ Prev", use_container_width=True, disabled=page == 0, key="board_prev",
+                              on_click=set_board_page, args=(page - 1,))
+                with col_page:
+                    st.caption(f"📌 Page {page + 1} of {num_pages} • accounts {page_start + 1}–{page_start + len(display_df)} of {len(filtered)}")
+                with col_next:
+                    st.button("Next ➡️", use_container_width=True, disabled=page == num_pages - 1, key="board_next",
+                              on_click=set_board_page, args=(page + 1,))
+        
+        with col_board:
+            draft_board()
         
         # ===== RIGHT SIDEBAR =====
-        with col_sidebar:
+        @profiled_fragment('draft_clock', run_every=room_poll_every())
+        def draft_clock():
+            follow_room()
+            current_pick = st.session_state.current_pick
+            current_ae = get_current_ae(st.session_state)
+            pool = st.session_state.account_pool
             # ON THE CLOCK - Show upcoming picks
             st.subheader("🕐 On the Clock", divider="orange")
             
-            next_picks_count = 0
-            for upcoming_pick_num in range(current_pick, min(current_pick + 10, total_picks)):
-                if next_picks_count >= 5:  # Show next 5
-                    break
-                
+            schedule = st.session_state.pick_schedule
+            upcoming_picks, upcoming_aes = schedule.next_picks(current_pick, 5)
+            for upcoming_pick_num, ae_idx in zip(upcoming_picks.tolist(), upcoming_aes.tolist()):
                 upcoming_round = (upcoming_pick_num // num_aes) + 1
-                pick_in_round = upcoming_pick_num % num_aes
-                
-                if st.session_state.is_snake and upcoming_round % 2 == 0:
-                    ae_idx = num_aes - 1 - pick_in_round
-                else:
-                    ae_idx = pick_in_round
-                
                 upcoming_ae = st.session_state.draft_order[ae_idx]
                 is_now = (upcoming_pick_num == current_pick)
                 
@@ -523,120 +1267,96 @@ elif st.session_state.stage == 'draft':
                     st.markdown(f"**🔴 NOW: #{upcoming_pick_num + 1} {upcoming_ae}** (Rd {upcoming_round})")
                 else:
                     st.markdown(f"→ #{upcoming_pick_num + 1} {upcoming_ae} (Rd {upcoming_round})")
-                
-                next_picks_count += 1
             
             st.markdown("---")
             st.subheader("📚 Roster", divider="blue")
             
-            if current_ae and current_ae in st.session_state.ae_books:
-                ae_ids = st.session_state.ae_books[current_ae]
+            with perf_span('roster'):
+                if current_ae and current_ae in st.session_state.ae_stats:
+                    stats = st.session_state.ae_stats[current_ae]
                 
-                # Metrics with better styling
-                col_picks, col_avg = st.columns(2)
-                with col_picks:
-                    st.metric("Picks", len(ae_ids))
-                with col_avg:
-                    ae_book_df = st.session_state.accounts_df[
-                        st.session_state.accounts_df['Account_ID'].isin(ae_ids)
-                    ].sort_values('ICP_score', ascending=False)
-                    if len(ae_book_df) > 0:
-                        st.metric("Avg", f"{ae_book_df['ICP_score'].mean():.0f}")
+                    # Metrics with better styling
+                    col_picks, col_avg = st.columns(2)
+                    families = st.session_state.families
+                    with col_picks:
+                        if families is None:
+                            st.metric("Picks", stats.count)
+                            num_accounts = stats.count
+                        else:
+                            # Family scores are member totals, so the per-account average is total / accounts
+                            num_accounts = int(families.sizes[stats.handles()].sum())
+                            st.metric("Accounts", num_accounts, help=f"In {stats.count} families")
+                    with col_avg:
+                        if num_accounts > 0:
+                            st.metric("Avg", f"{stats.score_sum / num_accounts:.0f}")
                 
-                # Drafted accounts list
-                if len(ae_book_df) > 0:
-                    st.markdown("**Recently Drafted:**")
-                    for _, row in ae_book_df.head(5).iterrows():
-                        badge = tier_badge(row['CXP_Swat_Tier'])
-                        st.markdown(f"  {badge} {row['Account_Name'][:18]} — {row['ICP_score']:.0f}")
+                    # Drafted accounts list
+                    if stats.count > 0:
+                        st.markdown("**Recently Drafted:**")
+                        for name, score, rank in stats.top(5):
+                            st.markdown(f"  {tier_badge(rank)} {str(name)[:18]} — {score:.0f}")
                     
-                    if len(ae_book_df) > 5:
-                        st.caption(f"...and {len(ae_book_df) - 5} more")
+                        if stats.count > 5:
+                            st.caption(f"...and {stats.count - 5} more")
+                
+                    queue = st.session_state.ae_queues.get(current_ae)
+                    queued = queue.resolve(pool) if queue else None
+                    if queued is not None:
+                        st.caption(f"📝 Queue next: {st.session_state.accounts_df['Account_Name'].iat[queued]}")
+                    if st.session_state.book_limits is not None:
+                        for line in st.session_state.book_limits.status(st.session_state.draft_order.index(current_ae)):
+                            st.caption(f"🚧 {line}")
+                
+                    ae_picks = schedule.picks_for(st.session_state.draft_order.index(current_ae))
+                    later_picks = ae_picks[ae_picks > current_pick]
+                    if len(later_picks) > 0:
+                        st.caption(f"Next pick after this one: #{later_picks[0] + 1} (Rd {later_picks[0] // num_aes + 1})")
             
             st.markdown("---")
             st.subheader("⚡ Quick Actions", divider="orange")
             
-            col_undo, col_auto = st.columns(2)
+            col_undo, col_redo, col_auto = st.columns(3)
             with col_undo:
                 if current_pick > 0 and st.button("↩️ Undo", use_container_width=True):
-                    last = st.session_state.draft_picks.pop()
-                    st.session_state.ae_books[last['ae']].remove(last['account_id'])
-                    undo_acc = st.session_state.accounts_df[
-                        st.session_state.accounts_df['Account_ID'] == last['account_id']
-                    ].iloc[0].to_dict()
-                    st.session_state.available_accounts.insert(0, undo_acc)
-                    st.session_state.available_accounts = sort_accounts_by_tier(st.session_state.available_accounts)
-                    st.session_state.current_pick -= 1
-                    st.rerun()
+                    act(undo_last_pick)
+                    rerun()
+            
+            with col_redo:
+                if st.session_state.redo_stack and st.button("↪️ Redo", use_container_width=True):
+                    act(redo_pick)
+                    rerun()
             
             with col_auto:
                 if st.button("⚡ Auto-Best", use_container_width=True):
-                    best = st.session_state.available_accounts[0]
-                    st.session_state.draft_picks.append({
-                        'pick_number': current_pick + 1,
-                        'round': current_round,
-                        'ae': current_ae,
-                        'account_name': best['Account_Name'],
-                        'account_id': best['Account_ID'],
-                        'icp_score': best['ICP_score'],
-                        'tier': best.get('CXP_Swat_Tier', '')
-                    })
-                    st.session_state.ae_books[current_ae].append(best['Account_ID'])
-                    st.session_state.available_accounts.pop(0)
-                    st.session_state.current_pick += 1
-                    st.rerun()
+                    act(draft_account, autodraft_pick(st.session_state))
+                    rerun()
+        
+        with col_sidebar:
+            draft_clock()
         
         st.markdown("---")
         
         # ACTION BUTTONS AT BOTTOM
         st.markdown("### ⚙️ Draft Control")
+        balanced = autocomplete_mode_radio()
         col_done, col_complete = st.columns(2, gap="small")
         with col_done:
             if st.button("🏁 Done Picking", use_container_width=True, help="Finish manual picks and review auto-complete"):
-                st.session_state.stage = 'autocomplete'
-                st.rerun()
+                act(set_stage, 'autocomplete')
+                rerun()
         
         with col_complete:
             remaining = total_picks - current_pick
             if st.button(f"🤖 Auto-Complete All {remaining}", type="primary", use_container_width=True, help="Simulate remaining picks instantly"):
                 with st.spinner(f"Auto-drafting {remaining} accounts..."):
-                    temp_pick = current_pick
-                    temp_available = st.session_state.available_accounts.copy()
-
-                    while temp_pick < total_picks and len(temp_available) > 0:
-                        round_num = (temp_pick // num_aes) + 1
-                        pick_in_round = temp_pick % num_aes
-
-                        if st.session_state.is_snake and round_num % 2 == 0:
-                            ae_idx = num_aes - 1 - pick_in_round
-                        else:
-                            ae_idx = pick_in_round
-
-                        ae = st.session_state.draft_order[ae_idx]
-                        best = temp_available[0]
-
-                        st.session_state.draft_picks.append({
-                            'pick_number': temp_pick + 1,
-                            'round': round_num,
-                            'ae': ae,
-                            'account_name': best['Account_Name'],
-                            'account_id': best['Account_ID'],
-                            'icp_score': best['ICP_score'],
-                            'tier': best.get('CXP_Swat_Tier', '')
-                        })
-                        st.session_state.ae_books[ae].append(best['Account_ID'])
-                        temp_available.pop(0)
-                        temp_pick += 1
-
-                    st.session_state.available_accounts = temp_available
-                    st.session_state.current_pick = temp_pick
-                    st.success(f"✅ Auto-drafted {temp_pick - current_pick} accounts!")
+                    drafted = act(auto_complete, balanced)
+                    st.success(f"✅ Auto-drafted {drafted} accounts!")
                     
-                st.session_state.stage = 'results'
-                st.rerun()
+                act(set_stage, 'results')
+                rerun()
         
         st.markdown("---")
-        if len(st.session_state.available_accounts) == 0:
+        if len(pool) == 0:
             st.warning("❌ No more accounts available!")
         if current_pick >= total_picks:
             st.success("✅ All manual picks complete!")
@@ -646,33 +1366,32 @@ elif st.session_state.stage == 'draft':
         # DRAFT PICKS STREAM - Show all picks organized by round
         st.subheader("📜 Draft History", divider="gray")
         
-        if st.session_state.draft_picks:
-            # Group picks by round
-            picks_by_round = {}
-            for pick in st.session_state.draft_picks:
-                round_num = pick['round']
-                if round_num not in picks_by_round:
-                    picks_by_round[round_num] = []
-                picks_by_round[round_num].append(pick)
+        @profiled_fragment('draft_history', run_every=room_poll_every())
+        def draft_history():
+            follow_room()
+            current_round = (st.session_state.current_pick // num_aes) + 1
+            if st.session_state.draft_picks:
+                earlier_rounds, round_picks = draft_history_view()
             
-            # Display rounds in reverse order (most recent at top)
-            for round_num in sorted(picks_by_round.keys(), reverse=True):
-                round_picks = picks_by_round[round_num]
-                is_current = (round_num == current_round)
-                round_label = f"Round {round_num}" + (" ← Currently Picking" if is_current else "")
-                
-                with st.expander(f"**{round_label}** ({len(round_picks)} picks)", expanded=is_current):
-                    for pick in round_picks:
-                        badge = tier_badge(pick['tier'])
-                        st.markdown(
-                            f"**#{pick['pick_number']}** {pick['ae']:15} — {badge} {pick['account_name']} **{pick['icp_score']:.0f}**"
-                        )
-        else:
-            st.info("📭 No picks yet - draft starting soon!")
+                # Only the current round is rendered pick by pick (most recent round at top)
+                if len(round_picks):
+                    with st.expander(f"**Round {current_round} ← Currently Picking** ({len(round_picks)} picks)", expanded=True):
+                        for pick in round_picks.itertuples():
+                            badge = tier_badge(pick.tier_rank)
+                            st.markdown(
+                                f"**#{pick.pick_number}** {pick.ae:15} — {badge} {pick.Account_Name} **{pick.ICP_score:.0f}**"
+                            )
+                if len(earlier_rounds):
+                    with st.expander(f"**Rounds 1–{earlier_rounds['Round'].iat[0]}** ({len(earlier_rounds)} picks)"):
+                        st.dataframe(earlier_rounds, use_container_width=True, hide_index=True)
+            else:
+                st.info("📭 No picks yet - draft starting soon!")
+        
+        draft_history()
         
         if st.button("▶️ Go to Results"):
-            st.session_state.stage = 'results'
-            st.rerun()
+            act(set_stage, 'results')
+            rerun()
 
 # =============================================================================
 # STAGE 4B: AUTO-COMPLETE (kept for flow, but can be skipped)
@@ -684,52 +1403,26 @@ elif st.session_state.stage == 'autocomplete':
     total_picks = num_aes * st.session_state.accounts_per_ae
     current_pick = st.session_state.current_pick
     remaining = total_picks - current_pick
-    available = len(st.session_state.available_accounts)
+    pool = st.session_state.account_pool
+    available = len(pool)
 
     st.info(f"**{remaining} picks remaining** | **{available} accounts available**")
     
     st.markdown("---")
     
+    balanced = autocomplete_mode_radio()
+    
     if st.button("✅ Auto-Complete Draft", type="primary", use_container_width=True):
         with st.spinner(f"Auto-drafting {remaining} picks..."):
-            temp_pick = current_pick
-            temp_available = st.session_state.available_accounts.copy()
-
-            while temp_pick < total_picks and len(temp_available) > 0:
-                round_num = (temp_pick // num_aes) + 1
-                pick_in_round = temp_pick % num_aes
-
-                if st.session_state.is_snake and round_num % 2 == 0:
-                    ae_idx = num_aes - 1 - pick_in_round
-                else:
-                    ae_idx = pick_in_round
-
-                ae = st.session_state.draft_order[ae_idx]
-                best = temp_available[0]
-
-                st.session_state.draft_picks.append({
-                    'pick_number': temp_pick + 1,
-                    'round': round_num,
-                    'ae': ae,
-                    'account_name': best['Account_Name'],
-                    'account_id': best['Account_ID'],
-                    'icp_score': best['ICP_score'],
-                    'tier': best.get('CXP_Swat_Tier', '')
-                })
-                st.session_state.ae_books[ae].append(best['Account_ID'])
-                temp_available.pop(0)
-                temp_pick += 1
-
-            st.session_state.available_accounts = temp_available
-            st.session_state.current_pick = temp_pick
-            st.success(f"✅ Auto-drafted {temp_pick - current_pick} picks!")
+            drafted = act(auto_complete, balanced)
+            st.success(f"✅ Auto-drafted {drafted} picks!")
             
-        st.session_state.stage = 'results'
-        st.rerun()
+        act(set_stage, 'results')
+        rerun()
     
     if st.button("⬅️ Back to Draft"):
-        st.session_state.stage = 'draft'
-        st.rerun()
+        act(set_stage, 'draft')
+        rerun()
 
 # =============================================================================
 # STAGE 5: RESULTS
@@ -737,99 +1430,121 @@ elif st.session_state.stage == 'autocomplete':
 elif st.session_state.stage == 'results':
     st.header("📊 Draft Results")
 
-    df = st.session_state.accounts_df
-
-    results = []
-    for ae in st.session_state.ae_list:
-        ae_ids = st.session_state.ae_books[ae]
-        ae_accounts = df[df['Account_ID'].isin(ae_ids)]
-        
-        tier1 = (ae_accounts['CXP_Swat_Tier'].str.contains('Tier 1', case=False, na=False)).sum()
-        tier2 = (ae_accounts['CXP_Swat_Tier'].str.contains('Tier 2', case=False, na=False)).sum()
-        
-        results.append({
-            'AE': ae,
-            'Total': len(ae_accounts),
-            'Tier 1': tier1,
-            'Tier 2': tier2,
-            'Avg Score': ae_accounts['ICP_score'].mean() if len(ae_accounts) > 0 else 0,
-            'Total Score': ae_accounts['ICP_score'].sum() if len(ae_accounts) > 0 else 0,
-        })
-
-    results_df = pd.DataFrame(results).sort_values('Avg Score', ascending=False)
-
-    st.subheader("🏆 Final Standings")
-    st.dataframe(results_df, use_container_width=True, hide_index=True)
+    with perf_span('standings'):
+        picks = picks_frame(st.session_state)
+        # Drafting by family, standings, books and exports count every member account
+        accounts = account_picks(st.session_state, picks)
+        books = dict(tuple(accounts.groupby('ae', sort=False)))
+        results = {}
+        for ae in st.session_state.ae_list:
+            stats = st.session_state.ae_stats[ae]
+            if st.session_state.families is None:
+                results[ae] = {
+                    'AE': ae,
+                    'Total': stats.count,
+                    'Tier 1': stats.tier_counts[TIER_1],
+                    'Tier 2': stats.tier_counts[TIER_2],
+                    'Avg Score': stats.avg,
+                    'Total Score': stats.score_sum,
+                }
+                continue
+            book = books.get(ae, accounts.iloc[:0])
+            tiers = np.bincount(book['tier_rank'].to_numpy(dtype=np.int64), minlength=3)
+            results[ae] = {
+                'AE': ae,
+                'Total': len(book),
+                'Families': stats.count,
+                'Tier 1': int(tiers[TIER_1]),
+                'Tier 2': int(tiers[TIER_2]),
+                'Avg Score': stats.score_sum / len(book) if len(book) else 0,
+                'Total Score': stats.score_sum,
+            }
+
+        results_df = pd.DataFrame(list(results.values())).sort_values('Avg Score', ascending=False)
+
+        st.subheader("🏆 Final Standings")
+        st.dataframe(results_df, use_container_width=True, hide_index=True)
 
-    st.markdown("---")
+        st.markdown("---")
 
     st.subheader("📚 Account Books")
-    for ae in st.session_state.ae_list:
-        ae_ids = st.session_state.ae_books[ae]
-        ae_accounts = df[df['Account_ID'].isin(ae_ids)].sort_values('ICP_score', ascending=False)
-        avg = ae_accounts['ICP_score'].mean() if len(ae_accounts) > 0 else 0
-        t1 = (ae_accounts['CXP_Swat_Tier'].str.contains('Tier 1', case=False, na=False)).sum()
-        t2 = (ae_accounts['CXP_Swat_Tier'].str.contains('Tier 2', case=False, na=False)).sum()
-
-        with st.expander(f"**{ae}** - {len(ae_accounts)} accounts | Avg: {avg:.0f} | T1: {t1} | T2: {t2}"):
-            display_cols = ['Account_Name', 'ICP_score', 'CXP_Swat_Tier']
-            if 'ICP_Reasoning' in ae_accounts.columns:
-                display_cols.append('ICP_Reasoning')
+    with perf_span('account_books'):
+        for ae in st.session_state.ae_list:
+            row = results[ae]
+            ae_accounts = books.get(ae, accounts.iloc[:0]).sort_values('ICP_score', ascending=False)
+            families = f" in {row['Families']} families" if 'Families' in row else ''
+
+            with st.expander(f"**{ae}** - {row['Total']} accounts{families} | Avg: {row['Avg Score']:.0f} | T1: {row['Tier 1']} | T2: {row['Tier 2']}"):
+                display_cols = ['Account_Name', 'ICP_score', 'CXP_Swat_Tier']
+                if 'ICP_Reasoning' in ae_accounts.columns:
+                    display_cols.append('ICP_Reasoning')
             
-            st.dataframe(
-                ae_accounts[display_cols],
-                use_container_width=True,
-                hide_index=True
-            )
-
-    st.markdown("---")
-    st.subheader("📜 Draft History")
-    if st.session_state.draft_picks:
-        picks_df = pd.DataFrame(st.session_state.draft_picks)
-        st.dataframe(picks_df, use_container_width=True, hide_index=True)
+                st.dataframe(
+                    ae_accounts[display_cols],
+                    use_container_width=True,
+                    hide_index=True
+                )
 
-    st.markdown("---")
-    st.subheader("💾 Export")
+        st.markdown("---")
+        st.subheader("📜 Draft History")
+        if st.session_state.draft_picks:
+            st.dataframe(draft_history(picks), use_container_width=True, hide_index=True)
 
-    col1, col2 = st.columns(2)
+        st.markdown("---")
+        st.subheader("💾 Export")
 
-    with col1:
-        export_data = []
-        for ae in st.session_state.ae_list:
-            ae_ids = st.session_state.ae_books[ae]
-            ae_accounts = df[df['Account_ID'].isin(ae_ids)]
-            # Get Salesforce ID for this AE (if it exists in our mapping)
-            ae_sfdc_id = AE_SFDC_IDS.get(ae, '')
-            for _, row in ae_accounts.iterrows():
-                export_data.append({
-                    'Account_ID': row['Account_ID'],
-                    'Account_Name': row['Account_Name'],
-                    'New_Owner': ae,
-                    'Owner_SFDC_ID': ae_sfdc_id,
-                    'ICP_Score': row['ICP_score'],
-                    'CXP_Swat_Tier': row['CXP_Swat_Tier']
-                })
-        export_df = pd.DataFrame(export_data)
-        csv = export_df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Assignments (with SFDC IDs)",
-            data=csv,
-            file_name=f"draft_assignments_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
+    with perf_span('exports'):
+        formats = export_formats()
+        st.session_state.export_format = st.selectbox(
+            "Format", formats, index=formats.index(st.session_state.export_format),
+            help=f"Salesforce CSV splits: a zip of CSVs of up to {SALESFORCE_BULK_ROWS:,} rows, one per Bulk API batch"
         )
-
-    with col2:
-        if st.session_state.draft_picks:
-            draft_csv = pd.DataFrame(st.session_state.draft_picks).to_csv(index=False)
-            st.download_button(
-                label="📥 Download History",
-                data=draft_csv,
-                file_name=f"draft_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+        for name, (_, _, modules) in EXPORT_FORMATS.items():
+            if name not in formats:
+                st.caption(f"{name} export needs {' or '.join(modules)} installed")
+        col1, col2 = st.columns(2)
+
+        with col1:
+            if st.button("📦 Prepare Assignments (with SFDC IDs)"):
+                prepare_export('assignments', lambda: assignments_frame(accounts, st.session_state.ae_list))
+            export_download_button('assignments', "📥 Download Assignments")
+
+        with col2:
+            if st.session_state.draft_picks:
+                if st.button("📦 Prepare History"):
+                    prepare_export('history', lambda: draft_history(picks))
+                export_download_button('history', "📥 Download History")
 
     st.markdown("---")
     if st.button("🔄 New Draft"):
+        if st.session_state.draft_log is not None:
+            st.session_state.draft_log.close()
+        st.query_params.clear()
         for key in list(st.session_state.keys()):
             del st.session_state[key]
-        st.rerun()
+        rerun()
+
+# =============================================================================
+# PERFORMANCE PANEL (OPT-IN)
+# =============================================================================
+finish_profiling()
+with st.sidebar:
+    st.markdown("---")
+    st.session_state.perf_enabled = st.toggle(
+        "⏱ Performance", value=st.session_state.perf_enabled, help="Time each rerun's sections and count its widgets"
+    )
+    profiler = st.session_state.profiler
+    if st.session_state.perf_enabled and profiler is not None and profiler.reruns:
+        last = profiler.reruns[-1]
+        widgets = [rerun['widgets'] for rerun in profiler.reruns]
+        st.caption(
+            f"Last rerun {last['seconds'] * 1000:.0f} ms • {last['widgets']} widgets "
+            f"(p50 {np.median(widgets):.0f}, p95 {np.percentile(widgets, 95):.0f}) • {len(profiler.reruns)} reruns kept"
+        )
+        st.dataframe(profiler.stats(), use_container_width=True, hide_index=True)
+        col_json, col_trace = st.columns(2)
+        with col_json:
+            st.download_button("📥 JSON", profiler.to_json(), file_name="draft_performance.json", mime="application/json")
+        with col_trace:
+            st.download_button("📥 Trace", profiler.to_chrome_trace(), file_name="draft_trace.json", mime="application/json",
+                               help="Chrome trace format: open in chrome://tracing or Perfetto")
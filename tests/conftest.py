@@ -0,0 +1,40 @@
+"""Shared fixtures: the sample accounts, loaded the way the app and CLI load them"""
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import draft_engine  # noqa: E402
+from draft_engine import DEFAULT_EXTRA_COLUMNS, load_accounts  # noqa: E402
+
+SAMPLE_CSV = ROOT / 'sample_accounts_3000.csv'
+
+# Share of sample accounts given each CXP Swat Tier (the sample file has none)
+TIER_SHARES = {'Tier 1': 0.1, 'Tier 2': 0.2, '': 0.7}
+
+COLUMNS = {'Account_Name': 'Account_Name', 'Account_ID': 'Account_ID', 'ICP_score': 'Account_Score', 'CXP_Swat_Tier': 'CXP Swat Tier'}
+
+@pytest.fixture(scope='session')
+def sample_csv():
+    """The sample accounts file as uploaded bytes, with a seeded CXP Swat Tier column"""
+    frame = pd.read_csv(SAMPLE_CSV)
+    rng = np.random.default_rng(0)
+    frame['CXP Swat Tier'] = rng.choice(list(TIER_SHARES), len(frame), p=list(TIER_SHARES.values()))
+    return frame.to_csv(index=False).encode()
+
+@pytest.fixture(scope='session')
+def sample_accounts(sample_csv):
+    """The sample accounts after load_accounts, with every default extra column kept"""
+    return load_accounts(io.BytesIO(sample_csv), COLUMNS, {col: col for col in DEFAULT_EXTRA_COLUMNS})
+
+@pytest.fixture(autouse=True)
+def draft_log_dir(tmp_path, monkeypatch):
+    """Keep each test's draft logs out of drafts/"""
+    monkeypatch.setattr(draft_engine, 'DRAFT_LOG_DIR', tmp_path / 'drafts')
+    return tmp_path / 'drafts'
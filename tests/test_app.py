@@ -0,0 +1,154 @@
+"""Walk the Streamlit app through AppTest, with st.file_uploader stubbed to hand back a CSV"""
+import io
+import json
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from conftest import ROOT
+from draft_engine import DraftLog, DraftState, draft_config, set_stage, start_draft
+
+APP = str(ROOT / 'gtm_fantasy_draft.py')
+
+AE_LIST = ['Alexa Pass', 'Lindsay Kelvie']
+
+class UploadedCSV(io.BytesIO):
+    """The parts of st.file_uploader's UploadedFile the app uses"""
+
+    file_id = 'sample'
+    name = 'accounts.csv'
+
+    @property
+    def size(self):
+        return len(self.getbuffer())
+
+@pytest.fixture
+def app(sample_csv, monkeypatch):
+    """A fresh app session whose uploader always holds the sample accounts, under the headers the mapping guesses"""
+    csv = sample_csv.replace(b'Account_ID,Account_Name,', b'Salesforce ID,Company Name,', 1).replace(b'Account_Score', b'ICP Score', 1)
+    monkeypatch.setattr(st, 'file_uploader', lambda *args, **kwargs: UploadedCSV(csv))
+    st.cache_resource.clear()
+    return lambda: AppTest.from_file(APP, default_timeout=60)
+
+def next_button(at):
+    return next(b for b in at.button if b.label == "➡️ Next: Setup")
+
+def click(at, label):
+    """Click the button whose label contains label, and rerun"""
+    next(b for b in at.button if label in b.label).click().run()
+
+def logged_draft(accounts, upload_key=None):
+    """The id of a new logged draft of accounts, on the live draft page with no picks yet"""
+    state = DraftState(accounts, AE_LIST, 5, 'Snake')
+    start_draft(state, AE_LIST)
+    state.draft_log = DraftLog.create(accounts, draft_config(state, None, upload_key=upload_key))
+    set_stage(state, 'draft')
+    state.draft_log.close()
+    return state.draft_log.draft_id
+
+def resume(app, draft_id):
+    """A fresh app session opened on ?draft=draft_id"""
+    at = app()
+    at.query_params['draft'] = draft_id
+    at.run()
+    assert not at.exception
+    assert at.session_state.stage == 'draft'
+    return at
+
+def test_upload_reruns_and_reaches_setup(app):
+    at = app()
+    at.run()
+    assert not at.error
+    assert at.success[0].value == "✅ Loaded 3000 accounts"
+
+    # Every later rerun hits the parse cache
+    at.run()
+    assert not at.error
+    next_button(at).click().run()
+    assert not at.error
+    assert at.session_state.stage == 'setup'
+
+    # So does another session uploading the same file
+    other = app()
+    other.run()
+    assert not other.error
+    next_button(other).click().run()
+    assert other.session_state.stage == 'setup'
+
+def test_mapped_columns_are_not_kept_again_as_extras(app):
+    at = app()
+    at.run()
+    extras = next(m for m in at.multiselect if m.label.startswith("Extra columns"))
+    extras.set_value(extras.value + ['Salesforce_ID', 'ICP_Score', 'Sub_Industry']).run()
+    assert not at.error
+    columns = at.session_state.accounts_df.columns
+    assert 'Sub_Industry' in columns
+    assert 'Salesforce_ID' not in columns and 'ICP_Score' not in columns
+
+def test_a_resumed_draft_shares_the_uploaded_accounts(app):
+    at = app()
+    at.run()
+    next_button(at).click().run()
+    uploaded = at.session_state.accounts_df
+    draft_id = logged_draft(uploaded, at.session_state.upload_key)
+
+    # While the upload is cached its frame is used, not the log's copy
+    assert resume(app, draft_id).session_state.accounts_df is uploaded
+
+    # Once it is gone the log's copy is read, then shared in its place
+    st.cache_resource.clear()
+    restored = resume(app, draft_id).session_state.accounts_df
+    assert restored is not uploaded and restored.equals(uploaded)
+    assert resume(app, draft_id).session_state.accounts_df is restored
+
+def history_rows(at):
+    """(pick #, AE, account name) rows of the cached completed-rounds history table"""
+    table = at.session_state.history_cache['table']
+    return list(zip(table['#'], table['AE'], table['Account'].str.split(' ', n=1).str[1]))
+
+def test_history_table_grows_by_round_and_rebuilds_after_an_undo(app, sample_accounts):
+    at = resume(app, logged_draft(sample_accounts))
+
+    def expected():
+        state = at.session_state
+        done = len(state.draft_picks) // len(AE_LIST) * len(AE_LIST)
+        return [(pick + 1, state.draft_order[state.pick_owners[pick]],
+                 state.accounts_df['Account_Name'].iat[state.draft_picks[pick]]) for pick in reversed(range(done))]
+
+    for label in ['Auto-Best'] * 5 + ['Undo'] * 2 + ['Auto-Best'] * 3 + ['Undo']:
+        before = at.session_state.history_cache
+        click(at, label)
+        assert not at.exception
+        assert history_rows(at) == expected()
+        # A pick that completes no round leaves the completed rounds' table as it was
+        table = at.session_state.history_cache['table']
+        if label == 'Auto-Best' and before is not None and len(before['table']) == len(table):
+            assert table is before['table']
+    assert len(at.session_state.draft_picks) == 5 and len(history_rows(at)) == 4
+
+def test_performance_panel_times_each_rerun(app, sample_accounts):
+    at = resume(app, logged_draft(sample_accounts))
+    next(t for t in at.toggle if 'Performance' in t.label).set_value(True).run()
+    click(at, 'Auto-Best')
+    click(at, 'Auto-Best')
+    assert not at.exception
+
+    profiler = at.session_state.profiler
+    assert len(profiler.reruns) >= 2
+    for rerun in profiler.reruns:
+        assert rerun['widgets'] > 0
+        spans = {name: (offset, seconds, depth) for name, offset, seconds, depth in rerun['spans']}
+        assert spans['rerun'][2] == 0 and spans['draft_board'][2] > 0 and spans['search'][2] > spans['draft_board'][2]
+        assert all(offset >= 0 and offset + seconds <= rerun['seconds'] + 1e-6 for offset, seconds, _ in spans.values())
+
+    stats = profiler.stats().set_index('Span')
+    assert {'rerun', 'sidebar', 'stage:draft', 'draft_board', 'draft_history'} <= set(stats.index)
+    assert (stats['p50 ms'] <= stats['p95 ms']).all()
+    assert any(caption.value.startswith("Last rerun") for caption in at.sidebar.caption)
+
+    exported = json.loads(profiler.to_json())['reruns']
+    assert [rerun['widgets'] for rerun in exported] == [rerun['widgets'] for rerun in profiler.reruns]
+    events = json.loads(profiler.to_chrome_trace())['traceEvents']
+    assert len(events) == sum(len(rerun['spans']) for rerun in profiler.reruns)
+    assert {event['ph'] for event in events} == {'X'}
@@ -0,0 +1,594 @@
+"""Headless tests for draft_engine: drafts driven through its Python API and CLI, with no Streamlit session"""
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import draft_engine
+from conftest import COLUMNS
+from draft_engine import (
+    DEFAULT_EXTRA_COLUMNS, ROOM_COMMISSIONER, AccountFamilies, AccountPool, BookLimits, DraftLog, DraftLogConflict,
+    DraftRooms, DraftState, PickSchedule, SearchIndex, assignments_frame, auto_complete, autodraft_pick,
+    blacklist_accounts, draft_account, draft_config, draft_snapshot, exclusion_mask, export_formats, family_labels,
+    get_current_ae, handles_for_ids, iter_csv_chunks, load_accounts, main, parse_book_rules, parse_custom_slots,
+    picks_frame, redo_pick, restore_draft, run_draft, set_queue, set_stage, simulate_draft_orders, simulation_summary,
+    start_draft, tier_sort_order, undo_last_pick, write_export
+)
+
+AE_LIST = ['Alexa Pass', 'Lindsay Kelvie', 'Paul Kellum', 'Travis Pederson']
+
+def new_draft(accounts, accounts_per_ae=10, draft_type='Snake', rules='', custom_slots=None):
+    state = DraftState(accounts, AE_LIST, accounts_per_ae, draft_type)
+    if rules:
+        state.book_rules, errors = parse_book_rules(rules, AE_LIST, accounts.columns)
+        assert not errors
+    start_draft(state, AE_LIST, custom_slots)
+    return state
+
+def auto_best_until_done(state):
+    """Click Auto-Best until the draft ends"""
+    while state.current_pick < len(state.pick_schedule) and len(state.account_pool):
+        draft_account(state, autodraft_pick(state))
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+class SizedCSV(io.BytesIO):
+    """CSV bytes with the size an upload reports, so load_accounts can report progress"""
+
+    @property
+    def size(self):
+        return len(self.getbuffer())
+
+def test_load_accounts_streams_only_the_mapped_columns(monkeypatch):
+    monkeypatch.setattr(draft_engine, 'CSV_CHUNK_ROWS', 2)
+    csv = (b"Name,ID,Score,Tier,Industry,Unused\n"
+           b"Acme,001,10,Tier 1,Tech,x\nBad Score,002,n/a,Tier 1,Tech,y\nZenith,003,30,Tier 2,Retail,z\nNova,004,40,,Tech,w\n")
+    progress = []
+    columns = {'Account_Name': 'Name', 'Account_ID': 'ID', 'ICP_score': 'Score', 'CXP_Swat_Tier': 'Tier'}
+    accounts = load_accounts(SizedCSV(csv), columns, {'Industry': 'Industry'}, progress.append)
+
+    # Rows without a score are dropped; IDs stay text and unmapped columns are never read
+    assert accounts['Account_ID'].tolist() == ['001', '003', '004']
+    assert 'Unused' not in accounts.columns and accounts['ICP_Reasoning'].eq('').all()
+    assert accounts['ICP_score'].dtype == np.float32
+    # Each chunk saw other tier labels, and the categories are merged rather than dropped to object
+    assert isinstance(accounts['CXP_Swat_Tier'].dtype, pd.CategoricalDtype)
+    assert accounts['CXP_Swat_Tier'].tolist() == ['Tier 1', 'Tier 2', '']
+    assert accounts['tier_rank'].tolist() == [draft_engine.TIER_1, draft_engine.TIER_2, draft_engine.TIER_UNRANKED]
+    assert len(progress) == 2 and progress[-1] == 1.0
+
+def test_chunked_load_matches_a_single_chunk(sample_csv, sample_accounts, monkeypatch):
+    monkeypatch.setattr(draft_engine, 'CSV_CHUNK_ROWS', 700)
+    chunked = load_accounts(SizedCSV(sample_csv), COLUMNS, {col: col for col in DEFAULT_EXTRA_COLUMNS})
+    assert chunked['CXP_Swat_Tier'].cat.categories.tolist() == sample_accounts['CXP_Swat_Tier'].cat.categories.tolist()
+    pd.testing.assert_frame_equal(chunked, sample_accounts)
+
+# =============================================================================
+# POOL
+# =============================================================================
+
+def test_pool_best_take_and_undo(sample_accounts):
+    order = tier_sort_order(sample_accounts)
+    pool = AccountPool(sample_accounts)
+    assert pool.best() == order[0]
+    assert len(pool) == len(sample_accounts)
+
+    assert pool.remove(order[0])
+    assert not pool.remove(order[0])
+    assert order[0] not in pool
+    assert pool.best() == order[1]
+
+    taken = pool.take_best(5)
+    assert taken.tolist() == order[1:6].tolist()
+    assert pool.best() == order[6]
+    assert len(pool) == len(sample_accounts) - 6
+
+    pool.restore(order[3])
+    assert pool.best() == order[3]
+    pool.restore(order[0])
+    assert pool.best() == order[0]
+    assert pool.available_handles()[:3].tolist() == [order[0], order[3], order[6]]
+
+def test_pool_version_changes_with_every_change(sample_accounts):
+    pool = AccountPool(sample_accounts)
+    versions = [pool.version]
+    pool.remove(pool.best())
+    versions.append(pool.version)
+    pool.remove_many([10, 20])
+    versions.append(pool.version)
+    pool.restore(10)
+    versions.append(pool.version)
+    assert len(set(versions)) == len(versions)
+
+def test_book_stats_match_a_rescan_of_each_book(sample_accounts):
+    state = new_draft(sample_accounts, accounts_per_ae=8)
+    for _ in range(7):
+        draft_account(state, autodraft_pick(state))
+    undo_last_pick(state)
+    undo_last_pick(state)
+    redo_pick(state)
+    auto_complete(state)
+    undo_last_pick(state)
+
+    for ae in AE_LIST:
+        book = sample_accounts.take(state.ae_books[ae])
+        stats = state.ae_stats[ae]
+        assert stats.count == len(book)
+        assert stats.score_sum == pytest.approx(book['ICP_score'].astype(float).sum())
+        assert stats.avg == pytest.approx(book['ICP_score'].astype(float).mean())
+        assert stats.tier_counts == np.bincount(book['tier_rank'], minlength=3).tolist()
+        assert sorted(stats.handles().tolist()) == sorted(state.ae_books[ae])
+        top = book.sort_values('ICP_score', ascending=False, kind='stable').head(5)
+        assert [score for _, score, _ in stats.top(5)] == pytest.approx(top['ICP_score'].astype(float).tolist())
+
+# =============================================================================
+# SEARCH
+# =============================================================================
+
+def search_queries(names, ids, rng, count):
+    """Random substrings of names and IDs, plus strings that run from a name's end into its ID"""
+    queries = ['la', 'lacc', 'l acc', 'national', 'acc00001', 'zzz', 'é']
+    for _ in range(count):
+        row = int(rng.integers(len(names)))
+        text = rng.choice([names[row], ids[row], names[row] + ids[row]])
+        start = int(rng.integers(len(text)))
+        queries.append(text[start:start + int(rng.integers(1, 9))])
+    return queries
+
+@pytest.mark.parametrize('seed', range(2))
+def test_search_matches_str_contains(sample_accounts, seed):
+    index = SearchIndex(sample_accounts)
+    names = sample_accounts['Account_Name'].str.lower()
+    ids = sample_accounts['Account_ID'].str.lower()
+    rng = np.random.default_rng(seed)
+    for query in search_queries(names.tolist(), ids.tolist(), rng, 100):
+        contains = names.str.contains(query, regex=False) | ids.str.contains(query, regex=False)
+        assert index.search(query).tolist() == np.flatnonzero(contains).tolist(), query
+        starts = names.str.startswith(query) | ids.str.startswith(query)
+        assert index.search(query.upper(), prefix=True).tolist() == np.flatnonzero(starts).tolist(), query
+
+def test_search_returns_families():
+    accounts = pd.DataFrame({'Account_Name': ['Acme', 'Acme West', 'Zenith'], 'Account_ID': ['A1', 'A2', 'Z1']})
+    index = SearchIndex(accounts, unit_of=np.array([0, 0, 2]))
+    assert index.search('west').tolist() == [0]
+    assert index.search('a', prefix=True).tolist() == [0]
+    assert index.search('').tolist() == [0, 2]
+
+# =============================================================================
+# PICK SCHEDULE
+# =============================================================================
+
+@pytest.mark.parametrize('draft_type, expected', [
+    ('Snake', [0, 1, 2, 2, 1, 0, 0, 1, 2, 2, 1, 0]),
+    ('Linear', [0, 1, 2, 0, 1, 2, 0, 1, 2, 0, 1, 2]),
+    ('Third-Round Reversal', [0, 1, 2, 2, 1, 0, 2, 1, 0, 0, 1, 2]),
+])
+def test_schedule_orders(draft_type, expected):
+    schedule = PickSchedule(3, 4, draft_type)
+    assert schedule.ae_index.tolist() == expected
+    assert schedule.picks_per_ae().tolist() == [4, 4, 4]
+    assert schedule.ae_at(len(expected)) is None
+    for ae_idx in range(3):
+        assert schedule.picks_for(ae_idx).tolist() == [pick for pick, ae in enumerate(expected) if ae == ae_idx]
+
+def test_custom_slots_override_the_order():
+    slots, errors = parse_custom_slots("2: C\n0: A\n5: Nobody\n6: A", ['A', 'B', 'C'], 6)
+    assert slots == {1: 2, 5: 0}
+    assert len(errors) == 2
+
+    schedule = PickSchedule(3, 2, 'Snake', slots)
+    assert schedule.ae_index.tolist() == [0, 2, 2, 2, 1, 0]
+    assert schedule.picks_per_ae().tolist() == [2, 1, 3]
+    assert schedule.next_picks(4, 5)[1].tolist() == [1, 0]
+
+# =============================================================================
+# AUTO-COMPLETE
+# =============================================================================
+
+@pytest.mark.parametrize('draft_type', ['Snake', 'Linear', 'Third-Round Reversal'])
+def test_auto_complete_matches_clicking_auto_best(sample_accounts, draft_type):
+    picked = new_draft(sample_accounts, draft_type=draft_type, custom_slots={3: 0})
+    completed = new_draft(sample_accounts, draft_type=draft_type, custom_slots={3: 0})
+    for state in (picked, completed):
+        draft_account(state, autodraft_pick(state))
+    auto_best_until_done(picked)
+    assert auto_complete(completed) == len(completed.pick_schedule) - 1
+    assert list(completed.draft_picks) == list(picked.draft_picks)
+    assert list(completed.pick_owners) == list(picked.pick_owners)
+
+def test_balanced_auto_complete_drafts_the_same_accounts(sample_accounts):
+    greedy = new_draft(sample_accounts)
+    balanced = new_draft(sample_accounts)
+    auto_complete(greedy)
+    auto_complete(balanced, balanced=True)
+    assert sorted(balanced.draft_picks) == sorted(greedy.draft_picks)
+    assert all(len(balanced.ae_books[ae]) == 10 for ae in AE_LIST)
+
+# =============================================================================
+# QUEUES
+# =============================================================================
+
+def test_queues_lead_auto_best_and_auto_complete(sample_accounts):
+    best = int(tier_sort_order(sample_accounts)[0])
+    picked = new_draft(sample_accounts)
+    completed = new_draft(sample_accounts)
+    for state in (picked, completed):
+        # The third AE's first choice goes with the first pick, so their queue moves on to 500
+        set_queue(state, AE_LIST[2], [best, 500, 7, 500])
+        draft_account(state, autodraft_pick(state))
+    auto_best_until_done(picked)
+    auto_complete(completed)
+    assert list(completed.draft_picks) == list(picked.draft_picks)
+    assert list(picked.ae_books[AE_LIST[0]])[0] == best
+    assert list(picked.ae_books[AE_LIST[2]])[:2] == [500, 7]
+
+def test_handles_for_ids_match_duplicates_in_file_order():
+    accounts = pd.DataFrame({'Account_ID': ['A', 'B', 'A', 'C']})
+    assert handles_for_ids(accounts, ['C', 'A', 'X', 'A']).tolist() == [3, 0, 2]
+
+# =============================================================================
+# LOGS AND REPLAY
+# =============================================================================
+
+def play_logged_draft(state):
+    """A draft touching every event kind: blacklist, queue, picks, undo, redo, stage, auto_complete"""
+    set_stage(state, 'cleanup')
+    blacklist_accounts(state, [int(h) for h in tier_sort_order(state.accounts_df)[:3]])
+    set_stage(state, 'draft')
+    set_queue(state, AE_LIST[1], [40, 41, 42])
+    for _ in range(9):
+        draft_account(state, autodraft_pick(state))
+    undo_last_pick(state)
+    undo_last_pick(state)
+    redo_pick(state)
+    for _ in range(5):
+        draft_account(state, autodraft_pick(state))
+    undo_last_pick(state)
+
+def assert_same_draft(restored, state):
+    assert draft_snapshot(restored) == draft_snapshot(state)
+    assert restored.current_pick == state.current_pick
+    assert np.array_equal(restored.account_pool.available_mask(), state.account_pool.available_mask())
+    assert autodraft_pick(restored) == autodraft_pick(state)
+    for ae in AE_LIST:
+        assert list(restored.ae_books[ae]) == list(state.ae_books[ae])
+        assert restored.ae_stats[ae].score_sum == pytest.approx(state.ae_stats[ae].score_sum)
+
+@pytest.mark.parametrize('snapshot_every', [1, 4, 7, 1000])
+def test_log_replay_matches_the_draft(sample_accounts, monkeypatch, snapshot_every):
+    monkeypatch.setattr(draft_engine, 'SNAPSHOT_EVERY', snapshot_every)
+    state = new_draft(sample_accounts)
+    state.draft_log = DraftLog.create(sample_accounts, draft_config(state, None))
+    play_logged_draft(state)
+
+    restored = DraftState()
+    restore_draft(restored, DraftLog(state.draft_log.draft_id))
+    assert_same_draft(restored, state)
+
+    # And after finishing the draft both ways
+    auto_complete(state)
+    restored = DraftState()
+    restore_draft(restored, DraftLog(state.draft_log.draft_id))
+    assert_same_draft(restored, state)
+
+def test_a_stale_copy_of_a_draft_cannot_append(sample_accounts):
+    first = new_draft(sample_accounts)
+    first.draft_log = DraftLog.create(sample_accounts, draft_config(first, None))
+    draft_id = first.draft_log.draft_id
+    draft_account(first, autodraft_pick(first))
+    second = DraftState()
+    restore_draft(second, DraftLog(draft_id))
+
+    draft_account(first, autodraft_pick(first))
+    with pytest.raises(DraftLogConflict):
+        draft_account(second, autodraft_pick(second))
+    # Reloaded, the second copy moves the draft on and the first one is stale
+    restore_draft(second, DraftLog(draft_id))
+    draft_account(second, autodraft_pick(second))
+    with pytest.raises(DraftLogConflict):
+        undo_last_pick(first)
+
+    restored = DraftState()
+    restore_draft(restored, DraftLog(draft_id))
+    assert list(restored.draft_picks) == list(second.draft_picks)
+    assert len(set(restored.draft_picks)) == 3
+
+# =============================================================================
+# FAMILIES
+# =============================================================================
+
+def reference_labels(parents):
+    """Each account's family label (lowest handle reachable over links in either direction), by graph search"""
+    neighbours = [[] for _ in parents]
+    for child, parent in enumerate(parents):
+        if parent >= 0:
+            neighbours[child].append(parent)
+            neighbours[parent].append(child)
+    labels = [-1] * len(parents)
+    for start in range(len(parents)):
+        if labels[start] < 0:
+            stack, labels[start] = [start], start
+            while stack:
+                for other in neighbours[stack.pop()]:
+                    if labels[other] < 0:
+                        labels[other] = start
+                        stack.append(other)
+    return labels
+
+def test_family_labels_on_chains_and_cycles():
+    # 0 <- 1 <- 2 and a cycle 3 -> 4 -> 5 -> 3, plus a self-parent and a loner
+    parents = np.array([-1, 0, 1, 4, 5, 3, 6, -1])
+    assert family_labels(parents).tolist() == [0, 0, 0, 3, 3, 3, 6, 7]
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(5000)
+    chain = np.full(5000, -1)
+    chain[order[1:]] = order[:-1]
+    assert (family_labels(chain) == 0).all()
+
+    cycle = np.empty(5000, dtype=np.int64)
+    cycle[order] = np.roll(order, 1)
+    assert (family_labels(cycle) == 0).all()
+
+@pytest.mark.parametrize('seed', range(20))
+def test_family_labels_match_a_graph_search(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 300))
+    parents = np.where(rng.random(n) < 0.7, rng.integers(0, n, n), -1)
+    assert family_labels(parents).tolist() == reference_labels(parents)
+
+def test_parent_exclusion_covers_the_whole_subtree():
+    # A <- B <- C <- D, a cycle X -> Y -> X, and an orphan whose parent isn't uploaded
+    accounts = pd.DataFrame({
+        'Account_ID': ['A', 'B', 'C', 'D', 'E', 'X', 'Y', 'O'],
+        'Parent_Account_ID': [None, 'A', 'B', 'C', None, 'Y', 'X', 'GONE'],
+    })
+    matched, _ = exclusion_mask(accounts, [('Parent_Account_ID', ['B'])])
+    assert accounts['Account_ID'][matched].tolist() == ['B', 'C', 'D']
+    matched, _ = exclusion_mask(accounts, [('Parent_Account_ID', ['X', 'GONE'])])
+    assert accounts['Account_ID'][matched].tolist() == ['X', 'Y', 'O']
+
+def test_id_exclusions_match_families_through_any_member():
+    # Families {A, B, C} (headed by A) and {X, Y} (headed by X), and a loner E
+    accounts = pd.DataFrame({
+        'Account_Name': ['A', 'B', 'C', 'E', 'X', 'Y'],
+        'Account_ID': ['A', 'B', 'C', 'E', 'X', 'Y'],
+        'Parent_Account_ID': [None, 'A', 'B', None, None, 'X'],
+        'ICP_score': [50.0, 40.0, 30.0, 20.0, 10.0, 90.0],
+        'CXP_Swat_Tier': ['', '', '', 'Tier 1', '', ''],
+        'tier_rank': [0, 0, 0, 2, 0, 0],
+    })
+    families = AccountFamilies(accounts)
+    heads = families.frame['Account_ID']
+    assert heads.tolist() == ['A', 'E', 'X']
+    matched, per_rule = exclusion_mask(families.frame, [('Account_ID', ['C', 'Y']), ('Parent_Account_ID', ['B'])],
+                                       families)
+    assert heads[per_rule[0]].tolist() == ['A', 'X']
+    assert heads[per_rule[1]].tolist() == ['A']
+    assert heads[matched].tolist() == ['A', 'X']
+    # Other columns are still the head account's
+    matched, _ = exclusion_mask(families.frame, [('CXP_Swat_Tier', ['Tier 1'])], families)
+    assert heads[matched].tolist() == ['E']
+
+def test_family_simulations_count_member_accounts_like_the_standings(sample_accounts):
+    state = run_draft(sample_accounts, AE_LIST, 5, draft_order=AE_LIST, families=True)
+    families = state.families
+    sims = simulate_draft_orders(families.frame, AE_LIST, 5, num_sims=200, seed=0, families=families)
+    # A simulation that drew the order the draft ran in
+    in_order = sims.groupby('Sim')['Draft Slot'].transform(lambda slots: (slots == np.arange(1, 5)).all())
+    sim = sims[in_order].head(4).set_index('AE')
+    assert len(sim) == 4
+    tier_ranks = sample_accounts['tier_rank'].to_numpy()
+    for ae in AE_LIST:
+        members, _ = families.members(state.ae_books[ae])
+        assert sim.at[ae, 'Families'] == 5
+        assert sim.at[ae, 'Total'] == len(members)
+        assert sim.at[ae, 'Tier 1'] == (tier_ranks[members] == draft_engine.TIER_1).sum()
+        assert sim.at[ae, 'Tier 2'] == (tier_ranks[members] == draft_engine.TIER_2).sum()
+        assert sim.at[ae, 'Total Score'] == pytest.approx(state.ae_stats[ae].score_sum)
+
+# =============================================================================
+# BOOK RULES
+# =============================================================================
+
+def books_by(state, column):
+    """{AE: their book's values of column}"""
+    values = state.accounts_df[column].to_numpy()
+    return {ae: values[np.asarray(state.ae_books[ae], dtype=np.int64)] for ae in state.ae_list}
+
+def test_caps_and_quotas_hold_when_they_can(sample_accounts):
+    state = new_draft(sample_accounts, rules="Industry <= 2\nRevenue_Range in >$1B, $500M-$1B >= 3")
+    auto_complete(state)
+    for ae, industries in books_by(state, 'Industry').items():
+        assert len(industries) == 10
+        assert np.unique(industries, return_counts=True)[1].max() <= 2
+    for ranges in books_by(state, 'Revenue_Range').values():
+        assert np.isin(ranges, ['>$1B', '$500M-$1B']).sum() >= 3
+    assert not any('relaxed' in line for i in range(len(AE_LIST)) for line in state.book_limits.status(i))
+
+def test_an_unmeetable_rule_is_relaxed_on_its_own(sample_accounts):
+    # 12 industries but 20 picks each: the cap runs out, the state cap still holds
+    state = new_draft(sample_accounts, accounts_per_ae=20, rules="Industry <= 1\nBilling_State <= 3")
+    auto_complete(state)
+    assert all(len(state.ae_books[ae]) == 20 for ae in AE_LIST)
+    for industries in books_by(state, 'Industry').values():
+        assert len(np.unique(industries[:12])) == 12
+    for states in books_by(state, 'Billing_State').values():
+        assert np.unique(states, return_counts=True)[1].max() <= 3
+    assert "Industry ≤ 1 each: can't be met, relaxed" in state.book_limits.status(0)
+
+def test_quotas_yield_to_caps(sample_accounts):
+    state = new_draft(sample_accounts, rules="Industry <= 1\nIndustry in Healthcare >= 3")
+    auto_complete(state)
+    for industries in books_by(state, 'Industry').values():
+        assert (industries == 'Healthcare').sum() == 1
+        assert len(np.unique(industries)) == 10
+
+def test_auto_complete_matches_auto_best_under_book_rules(sample_accounts):
+    rules = "Industry <= 2\nRevenue_Range in >$1B >= 2"
+    picked = new_draft(sample_accounts, rules=rules)
+    completed = new_draft(sample_accounts, rules=rules)
+    auto_best_until_done(picked)
+    auto_complete(completed)
+    assert list(completed.draft_picks) == list(picked.draft_picks)
+
+def test_book_limits_follow_undo(sample_accounts):
+    state = new_draft(sample_accounts, rules="Industry <= 1")
+    limits = state.book_limits
+    assert isinstance(limits, BookLimits)
+    industry = sample_accounts['Industry'].to_numpy()
+    first = autodraft_pick(state)
+    draft_account(state, first)
+    for _ in range(len(AE_LIST) * 2 - 1):
+        draft_account(state, autodraft_pick(state))
+    # Back on the first AE's clock: nothing from their industry is allowed
+    ae_idx = state.pick_schedule.ae_at(state.current_pick)
+    assert state.draft_order[ae_idx] == AE_LIST[0]
+    handles = state.account_pool.available_handles()
+    same = handles[industry[handles] == industry[first]]
+    assert not limits.allowed_mask(same, ae_idx).any()
+
+    while state.current_pick > 1:
+        undo_last_pick(state)
+    undo_last_pick(state)
+    assert limits.best(0) == first == state.account_pool.best()
+    assert limits.allowed_mask(same, 0).all()
+
+# =============================================================================
+# DRAFT ROOMS
+# =============================================================================
+
+def test_a_room_reloads_when_another_copy_wrote_first(sample_accounts):
+    state = new_draft(sample_accounts)
+    state.draft_log = DraftLog.create(sample_accounts, draft_config(state, None))
+    set_stage(state, 'draft')
+    room = DraftRooms().open(DraftLog(state.draft_log.draft_id), sample_accounts)
+    seat = DraftState()
+    subscription = room.join(seat)
+    commissioner = room.tokens[ROOM_COMMISSIONER]
+
+    # The session that resumed the draft before the room opened still writes to the log
+    draft_account(state, autodraft_pick(state))
+    assert room.submit(commissioner, draft_account, room.state.account_pool.best()) == (False, None)
+    assert list(room.state.draft_picks) == list(state.draft_picks)
+    room.sync(seat, subscription)
+    assert list(seat.draft_picks) == list(state.draft_picks)
+    assert seat.draft_log is None
+
+    assert room.submit(commissioner, draft_account, room.state.account_pool.best())[0] is True
+    room.sync(seat, subscription)
+    assert list(seat.draft_picks) == list(room.state.draft_picks)
+    assert len(seat.draft_picks) == 2
+
+def test_room_seats_act_only_through_their_tokens(sample_accounts):
+    state = new_draft(sample_accounts)
+    state.draft_log = DraftLog.create(sample_accounts, draft_config(state, None))
+    set_stage(state, 'draft')
+    rooms = DraftRooms()
+    room = rooms.open(state.draft_log, sample_accounts)
+    seat = DraftState()
+    subscription = room.join(seat)
+
+    on_clock = get_current_ae(room.state)
+    off_clock = next(ae for ae in AE_LIST if ae != on_clock)
+    best = room.state.account_pool.best()
+    assert room.seat_for('forged') is None
+    assert room.submit('forged', draft_account, best) == (False, None)
+    assert room.submit(room.tokens[off_clock], draft_account, best)[0] is False
+    assert room.submit(room.tokens[on_clock], draft_account, best)[0] is True
+    assert room.submit(room.tokens[on_clock], undo_last_pick)[0] is False
+    assert room.submit(room.tokens[ROOM_COMMISSIONER], set_stage, 'setup')[0] is False
+
+    room.sync(seat, subscription)
+    assert list(seat.draft_picks) == [best]
+    assert room.submit(room.tokens[ROOM_COMMISSIONER], undo_last_pick)[0] is True
+    room.sync(seat, subscription)
+    assert list(seat.draft_picks) == []
+
+    # Tokens outlive the room
+    tokens = room.tokens
+    room.close()
+    assert DraftLog(state.draft_log.draft_id).seat_tokens([ROOM_COMMISSIONER] + AE_LIST) == tokens
+
+# =============================================================================
+# HEADLESS RUNS
+# =============================================================================
+
+def test_run_draft_takes_the_best_available_in_order(sample_accounts):
+    state = run_draft(sample_accounts, AE_LIST, accounts_per_ae=5, draft_order=AE_LIST)
+    assert state.stage == 'results'
+    assert list(state.draft_picks) == tier_sort_order(sample_accounts)[:20].tolist()
+    assert [len(state.ae_books[ae]) for ae in AE_LIST] == [5, 5, 5, 5]
+
+@pytest.mark.parametrize('draft_type', ['Snake', 'Third-Round Reversal'])
+def test_simulations_match_drafts_run_in_their_orders(sample_accounts, draft_type):
+    # Pick 2 stays with Paul Kellum, whatever slot he draws
+    custom_slots = {2: AE_LIST.index('Paul Kellum')}
+    sims = simulate_draft_orders(sample_accounts, AE_LIST, 6, draft_type, custom_slots, num_sims=40, seed=1)
+    assert len(sims) == 40 * len(AE_LIST)
+    for _, sim in list(sims.groupby('Sim'))[:5]:
+        order = sim.sort_values('Draft Slot')['AE'].tolist()
+        state = run_draft(sample_accounts, AE_LIST, 6, draft_type, order, {2: order.index('Paul Kellum')})
+        for row in sim.to_dict('records'):
+            stats = state.ae_stats[row['AE']]
+            assert row['Total'] == stats.count
+            assert row['Tier 1'] == stats.tier_counts[draft_engine.TIER_1]
+            assert row['Tier 2'] == stats.tier_counts[draft_engine.TIER_2]
+            assert row['Total Score'] == pytest.approx(stats.score_sum)
+            assert row['Avg Score'] == pytest.approx(stats.avg)
+
+    summary = simulation_summary(sims, by='Draft Slot')
+    assert summary['Draft Slot'].tolist() == [1, 2, 3, 4]
+    assert (summary['Avg Score p5'] <= summary['Avg Score p95']).all()
+
+def test_cli_writes_the_assignments(sample_csv, tmp_path):
+    csv, out = tmp_path / 'accounts.csv', tmp_path / 'assignments.csv'
+    csv.write_bytes(sample_csv)
+    main([str(csv), '--ae', AE_LIST[0], '--ae', AE_LIST[1], '--keep-order', '--accounts-per-ae', '3',
+          '--column', 'ICP_score=Account_Score', '--column', 'CXP_Swat_Tier=CXP Swat Tier', '--out', str(out)])
+    assignments = pd.read_csv(out)
+    assert assignments['New_Owner'].tolist() == [AE_LIST[0]] * 3 + [AE_LIST[1]] * 3
+    assert assignments['Account_ID'].is_unique
+
+def read_export(data, fmt):
+    """An export read back as text columns, whatever its format"""
+    if fmt == 'CSV':
+        return pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    if fmt == 'Salesforce CSV splits':
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            names = archive.namelist()
+            assert names == sorted(names)
+            parts = [pd.read_csv(archive.open(name), dtype=str, keep_default_na=False) for name in names]
+        return pd.concat(parts, ignore_index=True)
+    if fmt == 'Parquet':
+        return pd.read_parquet(io.BytesIO(data)).astype(str)
+    return pd.read_excel(io.BytesIO(data), dtype=str, keep_default_na=False)
+
+@pytest.mark.parametrize('fmt', list(draft_engine.EXPORT_FORMATS))
+def test_exports_round_trip(sample_accounts, monkeypatch, fmt):
+    if fmt not in export_formats():
+        pytest.skip(f"no {fmt} writer installed")
+    monkeypatch.setattr(draft_engine, 'SALESFORCE_BULK_ROWS', 7)
+    state = run_draft(sample_accounts, AE_LIST, accounts_per_ae=5, draft_order=AE_LIST[::-1])
+    assignments = assignments_frame(picks_frame(state), AE_LIST)
+    # Grouped by AE in roster order, each book in file order
+    assert assignments['New_Owner'].tolist() == [ae for ae in AE_LIST for _ in range(5)]
+    assert assignments['Account_ID'].tolist() == [
+        sample_accounts['Account_ID'].iat[handle] for ae in AE_LIST for handle in sorted(state.ae_books[ae])
+    ]
+
+    out = io.BytesIO()
+    write_export(assignments, fmt, out)
+    exported = read_export(out.getvalue(), fmt)
+    pd.testing.assert_frame_equal(exported.drop(columns='ICP_Score'), assignments.drop(columns='ICP_Score').astype(str))
+    np.testing.assert_allclose(exported['ICP_Score'].astype(float), assignments['ICP_Score'], rtol=1e-6)
+    if fmt == 'Salesforce CSV splits':
+        assert len(zipfile.ZipFile(out).namelist()) == 3
+
+def test_csv_chunks_join_up_to_the_whole_file(sample_accounts):
+    frame = sample_accounts.head(23)
+    assert b''.join(iter_csv_chunks(frame, chunk_rows=5)) == frame.to_csv(index=False).encode()